@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import psutil
+
+import constants
+import ipc
+import plan
+import scheduler
+import utils
+
+# Type alias for JSON
+JSON = utils.JSON
+
+SAVE_SCRIPT = Path(__file__).parent / "i3_save.py"
+
+logger = utils.get_logger()
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Save the session automatically until i3 exits. Saves run at idle priority, are deferred while
+    the system is busy, and are spaced out based on how much the session changes.
+    """
+    args = parse_args(argv)
+    lower_priority()
+
+    logger.info("Starting automatic saving on an interval of %s seconds", args.interval)
+    try:
+        AutoSaver(args.interval).run()
+    except ipc.IPCError as err:
+        logger.info("Lost the connection to i3 (%s). Exiting automatic saving", err)
+
+
+def parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="auto_save.py",
+        description="Automatically save the session until i3 exits. This is run by i3-restore",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=constants.AUTO_SAVE_DEFAULT_INTERVAL,
+        metavar="<seconds>",
+        help="The time between saves. Saves are spaced further apart while nothing changes and "
+        "happen sooner after many windows change",
+    )
+
+    return parser.parse_args(argv)
+
+
+def lower_priority() -> None:
+    """
+    Run at idle CPU and IO priority so saving never competes with other programs. The save
+    processes (and everything they run) inherit the priority.
+    """
+    try:
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    except OSError:
+        logger.debug("Can't use the idle CPU scheduling policy. Using the lowest niceness instead")
+        os.setpriority(os.PRIO_PROCESS, 0, 19)
+
+    try:
+        psutil.Process().ionice(psutil.IOPRIO_CLASS_IDLE)
+    except (OSError, psutil.Error):
+        logger.debug("Can't set the idle IO priority", exc_info=True)
+
+
+def is_system_busy() -> bool:
+    load, pressure = scheduler.get_system_load()
+    logger.debug("Load: %.2f per CPU, pressure: %.2f%%", load, pressure)
+    return load >= constants.AUTO_SAVE_DEFER_LOAD or pressure >= constants.AUTO_SAVE_DEFER_PRESSURE
+
+
+def get_workspace_hashes() -> dict[str, str | None]:
+    """Get the hash of each workspace in the saved restore plan"""
+    try:
+        workspaces = plan.load_plan()["workspaces"]
+    except ValueError:
+        return {}
+
+    return {workspace["name"]: workspace.get("hash") for workspace in workspaces}
+
+
+def count_changed_workspaces(
+    previous_hashes: dict[str, str | None], hashes: dict[str, str | None]
+) -> int:
+    """
+    Count the workspaces that were added, removed, or saved with a different hash. Workspaces
+    without a hash (such as ones with web browsers) can't be compared, so they aren't counted.
+    """
+    changed_workspaces = 0
+    for name in previous_hashes.keys() | hashes.keys():
+        if name not in previous_hashes or name not in hashes:
+            changed_workspaces += 1
+        elif None not in (previous_hashes[name], hashes[name]):
+            changed_workspaces += previous_hashes[name] != hashes[name]
+
+    return changed_workspaces
+
+
+class AutoSaver:
+    """
+    Saves the session on an interval that adapts to how much the session changes. The interval
+    doubles (up to constants.AUTO_SAVE_MAX_BACKOFF times) each time a save finds nothing changed.
+    A burst of window and workspace events makes the next save happen once the events settle,
+    though never sooner than constants.AUTO_SAVE_MIN_INTERVAL seconds or
+    constants.AUTO_SAVE_DURATION_FACTOR times the last save's duration after the last save.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.current_interval = interval
+        self.last_save = time.monotonic()
+        self.save_duration = 0.0
+        # The window and workspace events that changed the session since the last save
+        self.events = 0
+        self.last_event = 0.0
+        # When saving was first deferred because the system was busy and until when it is deferred
+        self.deferred_since: float | None = None
+        self.deferred_until = 0.0
+
+    def run(self) -> None:
+        """Save the session whenever a save is due until i3 exits"""
+        connection = ipc.connect()
+        try:
+            connection.subscribe(["window", "workspace", "shutdown"])
+            while True:
+                timeout = max(self.get_next_save() - time.monotonic(), 0)
+                event = connection.receive_event(timeout)
+                if event is None:
+                    self.try_save()
+                    continue
+
+                event_type, event_payload = event
+                if event_type != ipc.SHUTDOWN_EVENT:
+                    self.add_event(event_payload)
+                    continue
+
+                if event_payload["change"] != "restart":
+                    logger.info("i3 exited. Exiting automatic saving")
+                    return
+
+                # i3 closes every IPC connection when it restarts
+                logger.info("i3 restarted. Reconnecting to keep saving automatically")
+                connection.close()
+                connection = ipc.connect()
+                connection.subscribe(["window", "workspace", "shutdown"])
+        finally:
+            connection.close()
+
+    def get_next_save(self) -> float:
+        """Get the time (from time.monotonic) the next save is due"""
+        next_save = self.last_save + self.current_interval
+        if self.events >= constants.AUTO_SAVE_BURST_EVENTS:
+            min_interval = max(
+                constants.AUTO_SAVE_MIN_INTERVAL,
+                self.save_duration * constants.AUTO_SAVE_DURATION_FACTOR,
+            )
+            settled = self.last_event + constants.AUTO_SAVE_SETTLE_TIME
+            next_save = min(next_save, max(settled, self.last_save + min_interval))
+
+        return max(next_save, self.deferred_until)
+
+    def add_event(self, event: JSON) -> None:
+        if event.get("change") in constants.AUTO_SAVE_IGNORED_CHANGES:
+            return
+
+        self.events += 1
+        self.last_event = time.monotonic()
+        # The session is changing again, so the interval doesn't need to back off anymore
+        self.current_interval = self.interval
+
+    def try_save(self) -> None:
+        """Save the session unless the system is busy, in which case the save is deferred"""
+        now = time.monotonic()
+        if is_system_busy():
+            if self.deferred_since is None:
+                self.deferred_since = now
+
+            if now - self.deferred_since < self.interval:
+                logger.info(
+                    "The system is busy. Deferring the automatic save by %s seconds",
+                    constants.AUTO_SAVE_DEFER_TIME,
+                )
+                self.deferred_until = now + constants.AUTO_SAVE_DEFER_TIME
+                return
+
+            logger.info("The system has been busy for a whole interval. Saving anyway")
+
+        self.deferred_since = None
+        self.save()
+
+    def save(self) -> None:
+        """
+        Save the session and adapt the interval to how much changed since the last save. Events
+        received while saving are counted towards the next save.
+        """
+        logger.info("Automatically saving current i3wm session")
+        previous_hashes = get_workspace_hashes()
+        events = self.events
+        self.events = 0
+
+        start = time.monotonic()
+        result = subprocess.run([sys.executable, str(SAVE_SCRIPT)], check=False)
+        self.last_save = time.monotonic()
+        self.save_duration = self.last_save - start
+
+        if result.returncode != 0:
+            # Try again after the configured interval
+            logger.error("An error occurred automatically saving the session")
+            self.current_interval = self.interval
+            return
+
+        changed_workspaces = count_changed_workspaces(previous_hashes, get_workspace_hashes())
+        if events == 0 and changed_workspaces == 0:
+            self.current_interval = min(
+                self.current_interval * 2, self.interval * constants.AUTO_SAVE_MAX_BACKOFF
+            )
+        else:
+            self.current_interval = self.interval
+
+        logger.info(
+            "Saved in %.2f seconds. %s workspaces changed and %s events were received since the "
+            "last save. The interval is now %s seconds",
+            self.save_duration,
+            changed_workspaces,
+            events,
+            self.current_interval,
+        )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as err:
+        logger.exception(err)
+        sys.exit(1)
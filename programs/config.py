@@ -3,6 +3,7 @@ import os
 import sys
 
 import constants
+import plugins as plugins_registry
 import utils
 
 # Type alias for JSON
@@ -18,6 +19,8 @@ class Config:
         self.subprocesses = []
         self.web_browsers = []
         self.enabled_plugins = {}
+        self.launch_limits = {}
+        self.metrics_dir = None
 
         config = self._read_config()
 
@@ -64,6 +67,14 @@ class Config:
             if not isinstance(self.terminals, list):
                 raise TypeError("'terminals' must be a list")
 
+            for terminal in self.terminals:
+                for key in ["client_command", "server_command"]:
+                    if key in terminal and not isinstance(terminal[key], str):
+                        raise TypeError(f"'terminals': '{key}' must be a string")
+
+                if "server_command" in terminal and "client_command" not in terminal:
+                    raise TypeError("'terminals': 'server_command' needs a 'client_command'")
+
         if "web_browsers" in config:
             self.web_browsers = config["web_browsers"]
             logger.info("Web browsers configuration: %s", self.web_browsers)
@@ -79,38 +90,48 @@ class Config:
             self.enabled_plugins = self._parse_plugins(enabled_plugins)
             logger.info("Enabled plugins: %s", self.enabled_plugins)
 
+        if "launch_limits" in config:
+            self.launch_limits = config["launch_limits"]
+            logger.info("Launch limits: %s", self.launch_limits)
+
+            if not isinstance(self.launch_limits, dict):
+                raise TypeError("'launch_limits' must be a dictionary")
+
+            for window_class, limit in self.launch_limits.items():
+                if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+                    raise TypeError(f"'launch_limits': '{window_class}' must be a positive integer")
+
+        if "metrics_dir" in config:
+            self.metrics_dir = config["metrics_dir"]
+            logger.info("Metrics directory: %s", self.metrics_dir)
+
+            if not isinstance(self.metrics_dir, str):
+                raise TypeError("'metrics_dir' must be a string")
+
     def _parse_plugins(self, plugins: JSON) -> JSON:
-        # Available plugin parsers. The key is the plugin name and the value is the
-        # function used to parse the plugin.
+        """
+        Keep the configuration of the available plugins. Each plugin parses the rest of its
+        configuration when it is loaded (see plugins.load_plugin), so plugins are only imported when
+        they are used.
+        """
         # The plugin name is the same as the program's class name in i3 which is how the script
         # knows which plugin to use for which program.
-        plugin_parsers = {constants.KITTY_CLASS: parse_kitty_plugin}
+        available_plugins = plugins_registry.get_available_plugins()
 
         parsed_plugins = {}
 
-        for name, parser in plugin_parsers.items():
-            if name in plugins:
-                parsed_plugins[name] = parser(plugins[name])
-
-        return parsed_plugins
-
-
-def parse_kitty_plugin(plugin: JSON) -> JSON:
-    if not isinstance(plugin, dict):
-        raise TypeError(f"'{constants.KITTY_CLASS}' plugin must be a dictionary")
+        for name, plugin in plugins.items():
+            if name not in available_plugins:
+                logger.error("Plugin not supported: %s. Skipping...", name)
+                continue
 
-    if "listen_socket" not in plugin:
-        raise TypeError("kitty plugin: 'listen_socket' must be included")
+            if not isinstance(plugin, dict):
+                raise TypeError(f"'{name}' plugin must be a dictionary")
 
-    plugin_config = {
-        "listen_socket": plugin["listen_socket"],
-        "scrollback": plugin.get("scrollback", "none"),
-    }
+            timeout = plugin.get("timeout", constants.PLUGIN_TIMEOUT)
+            if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0:
+                raise TypeError(f"'{name}' plugin: 'timeout' must be a positive number")
 
-    if plugin_config["scrollback"] not in constants.KITTY_PLUGIN_SCROLLBACK_OPTIONS:
-        raise TypeError(
-            "kitty plugin: 'scrollback' must be one of: "
-            f"{constants.KITTY_PLUGIN_SCROLLBACK_OPTIONS}"
-        )
+            parsed_plugins[name] = {**plugin, "timeout": timeout}
 
-    return plugin_config
+        return parsed_plugins
@@ -1,10 +1,146 @@
 CONFIG_FILE_NAME = "config.json"
+VERSION_FILE_NAME = "VERSION"
+
+# The programs that need to be installed to save a session
+SAVE_DEPENDENCIES = ["i3-msg", "xdotool"]
+
+# The restore plan compiled when saving. It contains every IPC command needed to restore the session
+RESTORE_PLAN_FILE_NAME = "restore_plan.json"
+# Incremented whenever the restore plan's format changes
+RESTORE_PLAN_VERSION = 1
+# The workspaces that are still waiting to be restored lazily (when they are first focused)
+LAZY_WORKSPACES_FILE_NAME = "lazy_workspaces.json"
+# The progress of the last restore, which i3-restore --resume continues from
+RESTORE_JOURNAL_FILE_NAME = "restore_journal.json"
+# Locked by the running save, so overlapping saves never write the same files at the same time. It
+# contains the status of the recent saves by their number.
+SAVE_LOCK_FILE_NAME = "save.lock"
+# The number of recent saves whose status is kept in the save lock
+SAVE_RESULTS_KEPT = 16
+# Locked by the save queued behind the running one. It contains the number of the last queued save
+# and the workspaces it saves.
+SAVE_QUEUE_FILE_NAME = "save_queue.lock"
+# The time (in seconds) between attempts to lock the save lock or queue while another save holds it
+SAVE_LOCK_RETRY_INTERVAL = 0.05
+
+# The number of files read into the page cache at once before and while programs are launched
+PREFETCH_THREADS = 4
+
+# The time (in seconds) a launched container counts as in flight when its window doesn't appear and
+# how long its programs take to start is unknown
+LAUNCH_TIMEOUT = 5
+# The time each program takes from being launched until its window appears is learned on every
+# restore (per window class) and kept in this file in i3_PATH
+STARTUP_TIMES_FILE_NAME = "startup_times.json"
+# How much each new measurement counts towards a program's learned startup time. The rest is the
+# previously learned time, so a single slow start doesn't throw it off.
+STARTUP_TIME_WEIGHT = 0.3
+# A launched container of a program with a learned startup time counts as in flight for this many
+# times as long as the program takes to start, but at least LAUNCH_TIMEOUT_MIN and at most
+# LAUNCH_TIMEOUT_MAX seconds
+LAUNCH_TIMEOUT_FACTOR = 3
+LAUNCH_TIMEOUT_MIN = 2
+LAUNCH_TIMEOUT_MAX = 30
+# The time (in seconds) web browsers' windows are given to be swallowed into the layouts. Browsers
+# restore their own windows, so there are no launches to wait for.
+BROWSER_SWALLOW_TIME = 2
+# The time (in seconds) to wait at the end of the restore for the windows of the launches that
+# timed out, before the placeholders that are still empty are removed
+LATE_WINDOW_TIMEOUT = 2
+# The load average (per CPU) and pressure stall percentages (avg10 of /proc/pressure/cpu and io)
+# at which fewer containers are launched at once. Under moderate load, half as many containers as
+# there are CPUs are launched at once. Under high load, containers are launched one at a time.
+LAUNCH_LOAD_MODERATE = 1.0
+LAUNCH_LOAD_HIGH = 2.0
+LAUNCH_PRESSURE_MODERATE = 10.0
+LAUNCH_PRESSURE_HIGH = 40.0
+PRESSURE_DIR = "/proc/pressure"
+# The number of containers of the same window class (or of an unknown class) that are launched at
+# once, unless launch_limits sets another limit for the class. Launching them one at a time means
+# each new window belongs to the only launch of its class in flight, so it is mapped into that
+# launch's placeholder.
+LAUNCH_CLASS_LIMIT = 1
+
+# The interval (in seconds) between automatic saves when nothing is known about the session yet. Set
+# with --save-interval in i3-restore.
+AUTO_SAVE_DEFAULT_INTERVAL = 600
+# Each automatic save that finds nothing changed doubles the interval, up to this many times the
+# configured interval
+AUTO_SAVE_MAX_BACKOFF = 4
+# After this many window and workspace events, the session is saved once no more events arrive for
+# AUTO_SAVE_SETTLE_TIME seconds instead of waiting for the interval
+AUTO_SAVE_BURST_EVENTS = 5
+AUTO_SAVE_SETTLE_TIME = 10
+# Saves triggered by events are at least this many seconds apart, and at least this many times as
+# long as the last save took, so saving never takes more than a small share of the time
+AUTO_SAVE_MIN_INTERVAL = 60
+AUTO_SAVE_DURATION_FACTOR = 20
+# Automatic saves are deferred by AUTO_SAVE_DEFER_TIME seconds while the load average (per CPU) or
+# pressure stall percentage is at least this high. They are deferred for at most one interval.
+AUTO_SAVE_DEFER_LOAD = 1.0
+AUTO_SAVE_DEFER_PRESSURE = 10.0
+AUTO_SAVE_DEFER_TIME = 30
+# Window and workspace changes that don't change the saved session
+AUTO_SAVE_IGNORED_CHANGES = ("focus", "title", "mark", "urgent", "reload")
+
+# The time (in seconds) to wait for the terminal servers to fork into the background (which they do
+# once they accept clients) before the terminals' clients are launched
+SERVER_START_TIMEOUT = 5
+
+# The time (in seconds) to wait for i3's IPC socket to accept connections again, such as after i3
+# is restarted
+IPC_CONNECT_TIMEOUT = 10
+IPC_CONNECT_INTERVAL = 0.1
+
+# The mark placed on the focused window so focus can be restored to it
+FOCUS_MARK = "_i3_restore_focus"
 
 DEFAULT_LOG_FILE = "logs/i3-restore.log"
+DEFAULT_OLD_LOG_FILE = "logs/i3-restore-old.log"
+# The size (in bytes) the log file can grow to before it is rotated. This must match LOG_FILE_SIZE
+# in utils/common.bash so both sides rotate the log at the same point.
+LOG_FILE_MAX_BYTES = 262144
+# The maximum number of characters a single debug payload (e.g. a workspace tree) is logged with
+LOG_PAYLOAD_MAX_CHARS = 4096
+
+# The optional work i3-save skips when saving with --deadline. Each kind of work is skipped once
+# less than this fraction of the deadline is left, so the files to prefetch are dropped first, then
+# scrollback, then plugin sessions, and then subprocess detection. Layouts and the programs'
+# commands are always saved.
+BUDGET_TIERS = {
+    "prefetch files": 0.6,
+    "scrollback": 0.5,
+    "plugin sessions": 0.3,
+    "subprocess detection": 0.15,
+}
+
+# The time (in seconds) i3-save waits for the commands it can't skip (retrieving the i3 tree and
+# container PIDs) when saving with --deadline
+ESSENTIAL_COMMAND_TIMEOUT = 2
+
+# The time (in seconds) a plugin can take to save a container before the container is saved
+# normally instead. Can be configured for each plugin with its 'timeout' option.
+PLUGIN_TIMEOUT = 5
+
+# The name of i3's process and where i3 creates its IPC socket (named after its PID), in
+# $XDG_RUNTIME_DIR or in a temporary directory when XDG_RUNTIME_DIR isn't set. Used by
+# i3-save --fleet to find every i3 session on the machine.
+I3_PROCESS_NAME = "i3"
+I3_SOCKET_PATTERNS = ["{runtime_dir}/i3/ipc-socket.{pid}", "/tmp/i3-*/ipc-socket.{pid}"]
 
 # The class name used to identify Kitty windows in i3 (also the name of the plugin)
 KITTY_CLASS = "kitty"
+# The instance group Kitty windows are restored into with the 'single_instance' option, so they
+# don't join Kitty instances started in other ways
+KITTY_INSTANCE_GROUP = "i3-restore"
 # The Kitty scrollback options available in the plugin configuration
 KITTY_PLUGIN_SCROLLBACK_OPTIONS = ["all", "screen", "none"]
 # The Kitty scrollback options that trigger saving scrollback
 KITTY_SCROLLBACK_ACTION_OPTIONS = ["all", "screen"]
+
+# The name of the tmux program, which is also the name of the plugin
+TMUX_NAME = "tmux"
+# The tmux scrollback options available in the plugin configuration
+TMUX_PLUGIN_SCROLLBACK_OPTIONS = ["all", "screen", "none"]
+# The window tmux sessions are created with when restoring. It is replaced by the saved windows.
+TMUX_PLACEHOLDER_WINDOW = "i3-restore-placeholder"
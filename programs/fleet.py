@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import glob
+import os
+import pwd
+from typing import TYPE_CHECKING
+
+import psutil
+
+import constants
+import utils
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+logger = utils.get_logger()
+
+
+class Session:
+    """An i3 session running on the machine, found from its i3 process"""
+
+    def __init__(self, process: psutil.Process) -> None:
+        self.pid = process.pid
+        self.uid = process.uids().real
+        self.gid = process.gids().real
+        environment = process.environ()
+
+        self.user = pwd.getpwuid(self.uid)
+        self.display = environment.get("DISPLAY")
+        # The authorization file of the display, for displays that require one (such as xvfb-run's)
+        self.xauthority = environment.get("XAUTHORITY")
+        self.socket_path = get_socket_path(self.pid, environment)
+
+        # Save where the session's own i3-restore restores from
+        home = environment.get("HOME", self.user.pw_dir)
+        self.i3_path = environment.get("i3_PATH", f"{home}/.config/i3")
+
+    def __repr__(self) -> str:
+        return f"Session(pid={self.pid}, user={self.user.pw_name!r}, display={self.display!r})"
+
+    def enter(self) -> None:
+        """
+        Make this process save the session: connect to the session's i3 and X display, write to its
+        i3_PATH, and run as the user the session belongs to (when running as root).
+        """
+        if os.getuid() == 0 and self.uid != 0:
+            os.setgid(self.gid)
+            os.initgroups(self.user.pw_name, self.gid)
+            os.setuid(self.uid)
+            os.environ["HOME"] = self.user.pw_dir
+
+        os.environ["I3SOCK"] = self.socket_path
+        if self.display is not None:
+            os.environ["DISPLAY"] = self.display
+
+        # Without its own authorization file, the session uses the default one in the user's home
+        if self.xauthority is not None:
+            os.environ["XAUTHORITY"] = self.xauthority
+        else:
+            os.environ.pop("XAUTHORITY", None)
+
+        utils.i3_PATH = self.i3_path
+
+
+def get_socket_path(pid: int, environment: dict[str, str]) -> str:
+    """Get the path of the IPC socket an i3 process created"""
+    runtime_dir = glob.escape(environment.get("XDG_RUNTIME_DIR", ""))
+    for pattern in constants.I3_SOCKET_PATTERNS:
+        paths = glob.glob(pattern.format(runtime_dir=runtime_dir, pid=pid))
+        if paths:
+            return paths[0]
+
+    raise FileNotFoundError(f"No IPC socket found for the i3 process {pid}")
+
+
+def find_sessions(processes: list[psutil.Process]) -> list[Session]:
+    """
+    Find the i3 sessions running on the machine in a snapshot of the process table. Sessions that
+    can't be accessed (such as other users' sessions when not running as root) or that save into
+    the same i3_PATH as another session are skipped.
+    """
+    sessions = []
+    i3_paths = set()
+    for process in processes:
+        if process.info["name"] != constants.I3_PROCESS_NAME:
+            continue
+
+        try:
+            session = Session(process)
+        except (psutil.Error, OSError, KeyError) as err:
+            logger.info("Skipping the i3 process %s: %s", process.pid, err)
+            continue
+
+        if session.i3_path in i3_paths:
+            logger.error(
+                "%s saves into the same i3_PATH as another session (%s). Set i3_PATH differently "
+                "for each session to save it. Skipping...",
+                session,
+                session.i3_path,
+            )
+            continue
+
+        i3_paths.add(session.i3_path)
+        sessions.append(session)
+
+    logger.info("Found %s i3 sessions: %s", len(sessions), sessions)
+    return sessions
+
+
+def save_sessions(sessions: list[Session], save: Callable[[], None]) -> list[Session]:
+    """
+    Save every session concurrently, each in a process forked from this one so the modules are
+    shared without starting Python again. At most one session per CPU is saved at once. The forked
+    processes send their log records to this process, which writes them to the log file. Returns
+    the sessions that failed to save.
+    """
+    max_saves = os.cpu_count() or 1
+    running = {}
+    failed_sessions = []
+
+    log_queue = utils.start_forked_log_listener()
+    for session in sessions:
+        if len(running) >= max_saves:
+            failed_sessions += wait_for_session(running)
+
+        pid = os.fork()
+        if pid == 0:
+            utils.log_to_queue(log_queue)
+            os._exit(save_session(session, save))
+
+        running[pid] = session
+
+    while running:
+        failed_sessions += wait_for_session(running)
+
+    utils.stop_forked_log_listener()
+    for session in failed_sessions:
+        logger.error("Failed to save %s", session)
+
+    return failed_sessions
+
+
+def wait_for_session(running: dict[int, Session]) -> list[Session]:
+    """Wait for one of the running saves to finish. Returns its session if it failed"""
+    pid, status = os.wait()
+    session = running.pop(pid)
+    return [session] if os.waitstatus_to_exitcode(status) != 0 else []
+
+
+def save_session(session: Session, save: Callable[[], None]) -> int:
+    """Save a session in the forked process. Returns the process's exit code"""
+    try:
+        session.enter()
+        logger.info("Saving %s into %s", session, session.i3_path)
+        save()
+    except Exception:
+        logger.exception("An error occurred saving %s", session)
+        return 1
+
+    return 0
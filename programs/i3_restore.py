@@ -0,0 +1,586 @@
+from __future__ import annotations
+
+import argparse
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import config
+import constants
+import ipc
+import journal
+import metrics
+import plan
+import prefetch
+import scheduler
+import tree
+import utils
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+# Type alias for JSON
+JSON = utils.JSON
+
+logger = utils.get_logger()
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Restore the workspaces in the restore plan compiled by i3-save. Every command is taken from the
+    plan as-is, so nothing about the session needs to be derived again while restoring.
+    """
+    args = parse_args(argv)
+    if args.watch_lazy:
+        watch_lazy_workspaces()
+        return
+
+    start = time.time()
+    restore_plan = plan.load_plan()
+    restore_journal = journal.start_journal(args.resume)
+    if restore_journal.finished:
+        logger.info("The last restore already finished. Nothing to resume")
+        return
+
+    restore_config = config.Config()
+    connection = ipc.Connection()
+    launch_scheduler = scheduler.LaunchScheduler(restore_config.launch_limits)
+    success = False
+    try:
+        restore_workspaces(
+            connection,
+            launch_scheduler,
+            restore_plan,
+            args.workspaces,
+            lazy=args.lazy,
+            batch_layouts=args.batch_layouts,
+            restore_journal=restore_journal,
+        )
+        launch_scheduler.save_startup_times()
+        success = True
+    finally:
+        launch_scheduler.close()
+        connection.close()
+        metrics.write_metrics(restore_config.metrics_dir, "restore", success, start, utils.i3_PATH)
+
+
+def parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="i3_restore.py",
+        description="Restore the workspaces in the saved restore plan. This is run by i3-restore",
+    )
+    parser.add_argument(
+        "--workspace",
+        action="append",
+        dest="workspaces",
+        metavar="<name>",
+        help="Only restore the given workspace. Can be passed multiple times",
+    )
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Only restore the visible workspaces. The rest are restored by --watch-lazy",
+    )
+    parser.add_argument(
+        "--batch-layouts",
+        action="store_true",
+        help="Launch the programs of every workspace first and then append all their layouts with "
+        "a single i3 command",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last restore of the same restore plan from its journal. Restored "
+        "workspaces are skipped and launched programs aren't launched again",
+    )
+    parser.add_argument(
+        "--watch-lazy",
+        action="store_true",
+        help="Append the layouts of the lazy workspaces and restore their programs when each one "
+        "is first focused",
+    )
+
+    return parser.parse_args(argv)
+
+
+def restore_workspaces(
+    connection: ipc.Connection,
+    launch_scheduler: scheduler.LaunchScheduler,
+    restore_plan: JSON,
+    workspace_names: list[str] | None = None,
+    lazy: bool = False,
+    batch_layouts: bool = False,
+    restore_journal: journal.RestoreJournal | None = None,
+) -> None:
+    """
+    Restore every workspace in the plan, or only the selected workspaces if any are provided. The
+    workspaces that were focused and visible when the session was saved are restored first. When
+    restoring lazily, only those and the currently visible workspaces are restored and the rest are
+    saved as lazy workspaces for watch_lazy_workspaces to restore when they are focused. When
+    batching layouts, the layouts are appended together after every workspace's programs are
+    launched (see restore_workspaces_batched). The progress is recorded in the restore journal, so
+    the workspaces it already records as restored are skipped. The programs' files are read into
+    the page cache in the background before and while their programs are launched. The web
+    browsers are restored last, and only when the whole session is restored.
+    """
+    restore_journal = restore_journal or journal.RestoreJournal()
+
+    visible_workspaces = set()
+    if lazy:
+        visible_workspaces = {ws["name"] for ws in connection.get_workspaces() if ws["visible"]}
+
+    lazy_workspaces = []
+    restored_workspaces = []
+    for workspace in get_restore_order(restore_plan["workspaces"]):
+        name = workspace["name"]
+        if workspace_names is not None and name not in workspace_names:
+            logger.info("Skipping Workspace %s as it was not selected", name)
+            continue
+
+        if lazy and name not in visible_workspaces and not workspace.get("visible"):
+            logger.info("Workspace %s will be restored when it is first focused", name)
+            lazy_workspaces.append(name)
+            continue
+
+        if restore_journal.is_restored(name):
+            logger.info("Workspace %s was already restored. Skipping...", name)
+            metrics.increment("workspaces_skipped")
+            continue
+
+        restored_workspaces.append(workspace)
+
+    # Plans saved before prefetching was added have no prefetch files
+    prefetcher = prefetch.start_prefetch(
+        [file for ws in restored_workspaces for file in ws.get("prefetch_files", [])]
+    )
+
+    if not restore_journal.servers_started:
+        with metrics.phase("servers"):
+            start_terminal_servers(
+                [
+                    ws
+                    for ws in restore_plan["workspaces"]
+                    if workspace_names is None or ws["name"] in workspace_names
+                ]
+            )
+        restore_journal.set_servers_started()
+
+    if not batch_layouts:
+        for workspace in restored_workspaces:
+            restore_workspace(connection, launch_scheduler, workspace, restore_journal)
+    elif restored_workspaces:
+        restore_workspaces_batched(
+            connection, launch_scheduler, restored_workspaces, restore_journal
+        )
+
+    # Every program is launched, so the files that weren't prefetched yet are no longer needed
+    prefetcher.shutdown(wait=False, cancel_futures=True)
+
+    # Programs that were slower than their timeout are given a last chance to fill their
+    # placeholders before i3-restore removes the empty ones
+    with metrics.phase("windows"):
+        launch_scheduler.wait_for_late_windows()
+
+    # Browsers restore all of their windows, so they are only restored with the whole session
+    if workspace_names is None and not restore_journal.browsers_restored:
+        restore_browsers(connection, restore_journal)
+
+    # Restoring the whole session replaces the lazy workspaces left from a previous restore
+    if lazy or workspace_names is None:
+        plan.save_lazy_workspaces(lazy_workspaces)
+
+    restore_journal.finish()
+
+
+def restore_browsers(connection: ipc.Connection, restore_journal: journal.RestoreJournal) -> None:
+    """
+    Restore the web browsers saved with the session. Browsers restore their own windows, which
+    can't be waited for, so their windows are given constants.BROWSER_SWALLOW_TIME seconds to be
+    swallowed into the layouts. The restore journal records that they were restored, so resuming
+    the restore doesn't open them again.
+    """
+    browser_file = Path(utils.i3_PATH) / "web_browsers.sh"
+    if not browser_file.exists():
+        return
+
+    logger.info("Restoring web browsers")
+    browser_file.chmod(browser_file.stat().st_mode | 0o111)
+    run_command(connection, f"exec {ipc.quote(shlex.quote(str(browser_file)))}")
+    restore_journal.set_browsers_restored()
+
+    time.sleep(constants.BROWSER_SWALLOW_TIME)
+
+
+def get_restore_order(workspaces: list[JSON]) -> list[JSON]:
+    """
+    Order the workspaces so the focused workspace is restored first, followed by the rest of the
+    visible workspaces. The other workspaces keep the order they were saved in.
+    """
+    return sorted(workspaces, key=lambda ws: (not ws.get("focused"), not ws.get("visible")))
+
+
+def start_terminal_servers(workspaces: list[JSON]) -> None:
+    """
+    Start the servers of the terminals whose windows are opened through a client. Each server is
+    only started once for all workspaces (including lazy ones), before any program is launched.
+    Server commands fork into the background once the server accepts clients, so the servers are
+    waited for (up to constants.SERVER_START_TIMEOUT seconds) before any client is launched. A
+    client that still can't connect to its server starts its terminal normally instead.
+    """
+    # Plans saved before terminal servers were added have no server commands
+    server_commands = dict.fromkeys(
+        command for workspace in workspaces for command in workspace.get("server_commands", [])
+    )
+    if not server_commands:
+        return
+
+    logger.info("Starting terminal servers: %s", list(server_commands))
+    servers = {
+        command: subprocess.Popen(
+            command,
+            shell=True,
+            start_new_session=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        for command in server_commands
+    }
+
+    deadline = time.monotonic() + constants.SERVER_START_TIMEOUT
+    for command, server in servers.items():
+        try:
+            returncode = server.wait(max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            logger.warning("Terminal server didn't fork into the background in time: %s", command)
+            continue
+
+        if returncode != 0:
+            logger.warning("Terminal server exited with code %s: %s", returncode, command)
+
+
+def restore_workspace(
+    connection: ipc.Connection,
+    launch_scheduler: scheduler.LaunchScheduler,
+    workspace: JSON,
+    restore_journal: journal.RestoreJournal,
+) -> None:
+    """
+    Restore the programs and layout of a workspace. The windows are unmapped while the layout is
+    appended and mapped again in the order of the layout's placeholders (see get_map_order) so each
+    one is swallowed into its own placeholder. Focus is restored as soon as the layout is appended
+    (see restore_focus).
+    """
+    name = workspace["name"]
+    launch_programs(connection, launch_scheduler, workspace, restore_journal)
+
+    # Wait for the windows to appear so they are all swallowed when the layout is appended
+    with metrics.phase("windows"):
+        launch_scheduler.wait_for_all()
+
+    window_ids = get_map_order(
+        workspace,
+        get_window_ids_on_workspace(connection.get_tree(), name),
+        launch_scheduler.windows,
+    )
+
+    logger.info("Unmapping windows for Workspace %s", name)
+    set_windows_mapped(window_ids, mapped=False)
+
+    logger.info("Restoring layout for Workspace %s", name)
+    with metrics.phase("layouts"):
+        append_layouts(connection, [workspace])
+
+    logger.info("Mapping windows for Workspace %s", name)
+    set_windows_mapped(window_ids, mapped=True)
+    restore_focus(connection)
+    restore_journal.set_restored([name])
+    metrics.increment("workspaces")
+
+
+def restore_workspaces_batched(
+    connection: ipc.Connection,
+    launch_scheduler: scheduler.LaunchScheduler,
+    workspaces: list[JSON],
+    restore_journal: journal.RestoreJournal,
+) -> None:
+    """
+    Restore the programs of every workspace and then all their layouts at once. The output moves
+    and layouts of all workspaces are sent in a single i3 command, so i3 only switches workspaces
+    and renders the tree once instead of twice for each workspace.
+    """
+    for workspace in workspaces:
+        launch_programs(connection, launch_scheduler, workspace, restore_journal)
+
+    # Wait for the windows to appear so they are all swallowed when the layouts are appended
+    with metrics.phase("windows"):
+        launch_scheduler.wait_for_all()
+
+    # The layouts are appended in the same order, so the windows are mapped in the order of all
+    # the placeholders
+    root = connection.get_tree()
+    window_ids = [
+        window_id
+        for workspace in workspaces
+        for window_id in get_map_order(
+            workspace,
+            get_window_ids_on_workspace(root, workspace["name"]),
+            launch_scheduler.windows,
+        )
+    ]
+
+    logger.info("Unmapping windows for %s workspaces", len(workspaces))
+    set_windows_mapped(window_ids, mapped=False)
+
+    logger.info("Restoring layouts for %s workspaces", len(workspaces))
+    with metrics.phase("layouts"):
+        append_layouts(connection, workspaces)
+
+    logger.info("Mapping windows for %s workspaces", len(workspaces))
+    set_windows_mapped(window_ids, mapped=True)
+    restore_focus(connection)
+    restore_journal.set_restored([workspace["name"] for workspace in workspaces])
+    metrics.increment("workspaces", len(workspaces))
+
+
+def get_map_order(
+    workspace: JSON, window_ids: list[int], launched_windows: dict[scheduler.LaunchID, int]
+) -> list[int]:
+    """
+    Order the windows of a workspace to map them after its layout is appended. i3 swallows a window
+    into the first placeholder it matches, and windows of the same class match each other's
+    placeholders. So the launched windows are mapped one at a time in the order of their
+    containers, which is the order of their placeholders, and each one fills its own placeholder.
+    The other windows on the workspace are mapped afterwards in tree order.
+    """
+    launched = [
+        launched_windows.get((workspace["name"], i))
+        for i in range(len(workspace["launch_commands"]))
+    ]
+    ordered = [window_id for window_id in launched if window_id in window_ids]
+    return ordered + [window_id for window_id in window_ids if window_id not in ordered]
+
+
+def restore_focus(connection: ipc.Connection) -> None:
+    """
+    Focus the window that was focused when the session was saved. Its placeholder has the focus
+    mark once the layout of its workspace is appended, so focus is restored right after the focused
+    workspace (which is restored first) instead of at the end of the restore. Launching the
+    programs of each later workspace focuses that workspace, so focus is restored again after each
+    one. The mark is removed by i3-restore once every workspace is restored.
+    """
+    if constants.FOCUS_MARK not in connection.get_marks():
+        return
+
+    logger.info("Restoring focus from previous session")
+    run_command(connection, f"[con_mark={ipc.quote(constants.FOCUS_MARK)}] focus")
+
+
+def append_layouts(connection: ipc.Connection, workspaces: list[JSON]) -> bool:
+    """Move the workspaces to their outputs and append their layouts with a single i3 command"""
+    commands = []
+    for workspace in workspaces:
+        commands += [workspace["output_command"], workspace["layout_command"]]
+
+    # Moving a workspace fails when the display no longer exists, which is fine as i3 chooses a
+    # display instead
+    output_commands = {workspace["output_command"] for workspace in workspaces}
+    return run_commands(connection, commands, optional_commands=output_commands)
+
+
+def launch_programs(
+    connection: ipc.Connection,
+    launch_scheduler: scheduler.LaunchScheduler,
+    workspace: JSON,
+    restore_journal: journal.RestoreJournal | None = None,
+) -> None:
+    """
+    Launch the programs of a workspace, starting with the programs the scheduler learned are the
+    slowest to start. The scheduler limits how many are launched at once based on the system load
+    and the configured limit for each window class. Each launch is recorded in the restore journal,
+    and the programs it records as launched aren't launched again.
+    """
+    name = workspace["name"]
+    restore_journal = restore_journal or journal.RestoreJournal()
+    launch_commands = workspace["launch_commands"]
+    logger.info("Restoring programs for Workspace %s", name)
+    logger.info("Number of containers: %s", len(launch_commands))
+
+    # Plans saved before window classes were recorded have no launch classes
+    launch_classes = workspace.get("launch_classes") or [None] * len(launch_commands)
+
+    launched = restore_journal.get_launched(name)
+    if launched:
+        logger.info("Skipping %s programs that were already launched", len(launched))
+
+    for i in launch_scheduler.get_launch_order(launch_classes):
+        if i in launched:
+            continue
+
+        with metrics.phase("programs"):
+            launch_scheduler.wait_for_slot(launch_classes[i])
+            run_command(connection, launch_commands[i])
+            launch_scheduler.add(launch_classes[i], (name, i))
+
+        restore_journal.set_launched(name, i)
+        metrics.increment("containers")
+
+
+def watch_lazy_workspaces() -> None:
+    """
+    Append the layouts of the lazy workspaces, then launch each workspace's programs when i3 reports
+    it was focused for the first time. The programs are swallowed directly into the placeholders of
+    the layout. This runs until every lazy workspace is restored or i3 exits.
+    """
+    lazy_names = plan.load_lazy_workspaces()
+    workspaces = {
+        ws["name"]: ws for ws in plan.load_plan()["workspaces"] if ws["name"] in lazy_names
+    }
+    if not workspaces:
+        logger.info("No lazy workspaces to restore")
+        return
+
+    class_limits = config.Config().launch_limits
+    connection = ipc.connect()
+    launch_scheduler = scheduler.LaunchScheduler(class_limits)
+    try:
+        append_lazy_layouts(connection, list(workspaces.values()))
+        connection.subscribe(["workspace", "shutdown"])
+
+        # Visible workspaces won't be focused again, so they are restored right away
+        for workspace in connection.get_workspaces():
+            if workspace["visible"] and workspace["name"] in workspaces:
+                restore_lazy_workspace(connection, launch_scheduler, workspaces, workspace["name"])
+
+        while workspaces:
+            event_type, event = connection.receive_event()
+            if event_type == ipc.WORKSPACE_EVENT and event["change"] == "focus":
+                name = event["current"]["name"]
+                if name in workspaces:
+                    restore_lazy_workspace(connection, launch_scheduler, workspaces, name)
+            elif event_type == ipc.SHUTDOWN_EVENT:
+                if event["change"] != "restart":
+                    logger.info("i3 exited before every lazy workspace was restored")
+                    break
+
+                # i3 closes every IPC connection when it restarts
+                logger.info("i3 restarted. Reconnecting to keep watching the lazy workspaces")
+                launch_scheduler.save_startup_times()
+                launch_scheduler.close()
+                connection.close()
+                connection = ipc.connect()
+                launch_scheduler = scheduler.LaunchScheduler(class_limits)
+                connection.subscribe(["workspace", "shutdown"])
+    finally:
+        launch_scheduler.save_startup_times()
+        launch_scheduler.close()
+        connection.close()
+        plan.save_lazy_workspaces(list(workspaces))
+
+
+def append_lazy_layouts(connection: ipc.Connection, workspaces: list[JSON]) -> None:
+    """
+    Append the layouts of the lazy workspaces so their placeholders are in place before any of
+    their programs are launched. Focus is restored afterwards as each workspace is focused to
+    append its layout.
+    """
+    focused_workspace = next(ws["name"] for ws in connection.get_workspaces() if ws["focused"])
+
+    logger.info("Restoring layouts for lazy Workspaces %s", [ws["name"] for ws in workspaces])
+    append_layouts(connection, workspaces)
+
+    # The focused window from the previous session may be in one of the lazy layouts
+    if constants.FOCUS_MARK in connection.get_marks():
+        logger.info("Restoring focus from previous session")
+        run_command(
+            connection,
+            f"[con_mark={ipc.quote(constants.FOCUS_MARK)}] focus; unmark {constants.FOCUS_MARK}",
+        )
+    else:
+        run_command(
+            connection, f"workspace --no-auto-back-and-forth {ipc.quote(focused_workspace)}"
+        )
+
+
+def restore_lazy_workspace(
+    connection: ipc.Connection,
+    launch_scheduler: scheduler.LaunchScheduler,
+    workspaces: dict[str, JSON],
+    workspace_name: str,
+) -> None:
+    """Launch the programs of a lazy workspace and remove it from the remaining lazy workspaces"""
+    workspace = workspaces.pop(workspace_name)
+    launch_programs(connection, launch_scheduler, workspace)
+    plan.save_lazy_workspaces(list(workspaces))
+
+
+def run_command(connection: ipc.Connection, command: str) -> bool:
+    """Run an i3 command. Every part of the command that fails is logged"""
+    return run_commands(connection, [command])
+
+
+def run_commands(
+    connection: ipc.Connection, commands: list[str], optional_commands: Collection[str] = ()
+) -> bool:
+    """
+    Run i3 commands in a single message. i3 replies with a result for every part of every command,
+    so the results are matched back to the commands they belong to. Every part that fails is
+    logged, but only failures of the commands that aren't optional make this return false.
+    """
+    results = connection.command("; ".join(commands))
+
+    success = True
+    position = 0
+    for command in commands:
+        num_parts = len(ipc.split_commands(command))
+        command_results = results[position : position + num_parts]
+        position += num_parts
+
+        # i3 stops running commands when one can't be parsed, so the rest have no results
+        num_missing = num_parts - len(command_results)
+        command_results += [{"success": False, "error": "Not run"}] * num_missing
+
+        for result in command_results:
+            if result.get("success"):
+                continue
+
+            if command in optional_commands:
+                logger.info("Optional i3 command '%s' failed: %s", command, result.get("error"))
+            else:
+                logger.error("i3 command '%s' failed: %s", command, result.get("error"))
+                success = False
+
+    return success
+
+
+def get_window_ids_on_workspace(root: tree.Node, workspace_name: str) -> list[int]:
+    """Get the IDs of all windows on a workspace in the i3 tree"""
+    for node in tree.iter_nodes(root):
+        if node.type == "workspace" and node.name == workspace_name:
+            return [con.window for con in tree.iter_nodes(node) if con.window is not None]
+
+    return []
+
+
+def set_windows_mapped(window_ids: list[int], mapped: bool) -> None:
+    """Map or unmap windows. All windows are handled by a single xdotool process"""
+    if not window_ids:
+        return
+
+    action = "windowmap" if mapped else "windowunmap"
+    args = ["xdotool"]
+    for window_id in window_ids:
+        args += [action, str(window_id)]
+
+    subprocess.check_call(args)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as err:
+        logger.exception(err)
+        sys.exit(1)
@@ -1,19 +1,42 @@
 from __future__ import annotations
 
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
 import subprocess
 import sys
+import time
 from pathlib import Path
 
 import psutil
 
 import config
 import constants
-import plugins.kitty
+import fleet
+import layout
+import metrics
+import plan
+import plugins
+import save_lock
+import tree
 import utils
 
-# Plugins that are supported to have custom save algorithms. The key is the window class and the
-# value is the module to use to save the container (the module's 'main' function will be called).
-SUPPORTED_PLUGINS = {constants.KITTY_CLASS: plugins.kitty}
+# Files from the previous saved session. These are removed before a new session is saved.
+SESSION_FILE_PATTERNS = [
+    constants.RESTORE_PLAN_FILE_NAME,
+    "*_layout.json",
+    "*_container_*.sh",
+    # Programs files are only saved by versions before restore plans were added
+    "*_programs.sh",
+    "*_subprocess_*.sh",
+    "web_browsers.sh",
+    "kitty-session-*",
+    "kitty-scrollback-*",
+    "tmux-scrollback-*",
+]
 
 # Type alias for JSON
 JSON = utils.JSON
@@ -25,12 +48,452 @@ WEB_BROWSERS_DICT = dict.fromkeys(CONFIG.web_browsers, False)
 
 logger = utils.get_logger()
 
+# The PIDs of the windows retrieved during this save
+_window_pids: dict[int, int | None] = {}
 
-def main() -> None:
-    workspaces = utils.get_workspaces()
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Save the layouts and programs of the current i3 session (or of every i3 session on the machine
+    with --fleet). The i3 tree is only retrieved once and everything is saved from it in this
+    process.
+    """
+    args = parse_args(argv)
+    set_verbosity(args.verbose)
+    check_dependencies()
+
+    logger.info(utils.get_version())
+    start = time.time()
+
+    def save_and_write_metrics() -> None:
+        success = False
+        try:
+            # The process table is read once this save holds the lock, right before the i3 tree is
+            # read, so it contains the processes of every window in the tree
+            with metrics.phase("processes"):
+                utils.snapshot_processes()
+
+            # The time spent waiting for other saves counts towards the deadline
+            with utils.budget(utils.get_timeout()):
+                save_session(args.workspaces, args.force)
+            success = True
+        finally:
+            metrics.write_metrics(CONFIG.metrics_dir, "save", success, start, utils.i3_PATH)
+
+    def save() -> None:
+        # Overlapping saves (such as a manual save during an automatic one) are coalesced
+        with utils.deadline(args.deadline):
+            save_lock.single_flight(save_and_write_metrics, args.workspaces, args.force)
+
+    if not args.fleet:
+        save()
+        return
+
+    failed_sessions = fleet.save_sessions(fleet.find_sessions(utils.snapshot_processes()), save)
+    if failed_sessions:
+        sys.exit(1)
+
+
+def save_session(workspace_names: list[str] | None = None, force: bool = False) -> None:
+    """
+    Save the layouts and programs of the workspaces in the current i3 session. If workspace names
+    are provided, only those workspaces are saved and the rest of the saved session is kept.
+    Workspaces that haven't changed since the last save keep their saved session, unless saving is
+    forced.
+    """
+    logger.info("Saving current i3wm session")
+    _window_pids.clear()
+    with metrics.phase("tree"):
+        workspaces = utils.get_workspaces()
+
+    Path(utils.i3_PATH).mkdir(parents=True, exist_ok=True)
+
+    # Workspaces that are restored lazily only contain placeholders until they are focused, so their
+    # previous saved session is kept instead
+    lazy_workspaces = plan.load_lazy_workspaces()
+    if lazy_workspaces:
+        logger.info("Keeping the saved session of lazy Workspaces %s", lazy_workspaces)
+        workspaces = [ws for ws in workspaces if ws.name not in lazy_workspaces]
+        if workspace_names is not None:
+            workspace_names = [name for name in workspace_names if name not in lazy_workspaces]
+
+    if workspace_names is not None:
+        workspaces = select_workspaces(workspaces, workspace_names)
+
+    with metrics.phase("hashes"):
+        workspace_hashes = {ws.name: get_workspace_hash(ws) for ws in workspaces}
+    unchanged_workspaces = {} if force else get_unchanged_workspaces(workspace_hashes)
+
+    if workspace_names is None:
+        remove_previous_session(lazy_workspaces + list(unchanged_workspaces))
+    else:
+        for workspace in workspaces:
+            if workspace.name not in unchanged_workspaces:
+                remove_workspace_session(workspace.name)
+
+        mark_saved_web_browsers()
+
+    plan_workspaces = []
     for workspace in workspaces:
-        logger.debug("Workspace tree: %s", workspace)
-        Workspace(workspace)
+        if workspace.name in unchanged_workspaces:
+            logger.info(
+                "Workspace %s hasn't changed since the last save. Skipping...", workspace.name
+            )
+            plan_workspace = unchanged_workspaces[workspace.name]
+            # The restore order depends on which workspaces are currently visible
+            plan_workspace["focused"] = workspace.focused_workspace
+            plan_workspace["visible"] = workspace.visible
+            plan_workspaces.append(plan_workspace)
+            metrics.increment("workspaces_skipped")
+            continue
+
+        logger.debug("Workspace tree: %s", utils.LogPayload(workspace))
+        with metrics.phase("containers"):
+            saved_workspace = Workspace(workspace)
+
+        with metrics.phase("layouts"):
+            layout_file = layout.save_workspace_layout(workspace, saved_workspace.launched_windows)
+
+        metrics.increment("workspaces")
+        metrics.increment("containers", len(saved_workspace.containers))
+
+        # A workspace saved without some of its optional work has to be saved again next time
+        workspace_hash = None if utils.has_skipped_work() else workspace_hashes[workspace.name]
+
+        if layout_file is not None:
+            plan_workspaces.append(
+                plan.compile_workspace(
+                    workspace,
+                    layout_file,
+                    saved_workspace.launch_scripts,
+                    saved_workspace.launch_classes,
+                    workspace_hash,
+                    saved_workspace.server_commands,
+                    saved_workspace.prefetch_files,
+                )
+            )
+
+    with metrics.phase("plan"):
+        plan.save_plan(plan_workspaces, workspace_names, lazy_workspaces)
+
+    logger.info("Finished saving current i3wm session")
+
+
+def get_unchanged_workspaces(workspace_hashes: dict[str, str | None]) -> dict[str, JSON]:
+    """
+    Get the workspaces whose hash is the same as when they were last saved, along with their entries
+    in the restore plan
+    """
+    try:
+        saved_workspaces = plan.load_plan()["workspaces"]
+    except ValueError as err:
+        logger.info("Saving every workspace: %s", err)
+        return {}
+
+    return {
+        workspace["name"]: workspace
+        for workspace in saved_workspaces
+        if workspace.get("hash") is not None
+        and workspace_hashes.get(workspace["name"]) == workspace["hash"]
+    }
+
+
+def get_workspace_hash(workspace: tree.Node) -> str | None:
+    """
+    Get a hash of everything a workspace's saved session is built from: its layout, the windows in
+    it, the processes running in each window (with their creation times and working directories),
+    the configuration, and the version of i3-restore. Each container's hash covers the hashes of
+    its children (a Merkle tree), so the workspace's hash changes whenever anything in it changes.
+
+    None is returned for workspaces that must always be saved. This is the case for workspaces with
+    web browsers, as only one instance of each web browser is saved for the whole session, and for
+    workspaces with programs saved by a plugin, as their state (such as a tmux server's panes or
+    Kitty's scrollback) isn't part of the window's processes.
+    """
+    processes = {}
+    for container in tree.iter_leaves(workspace):
+        if container.window is None or len(container.swallows) != 0:
+            continue
+
+        if container.window_properties.get("class") in CONFIG.enabled_plugins:
+            return None
+
+        pid = get_window_pid(container.window)
+        if pid is None:
+            continue
+
+        try:
+            process = psutil.Process(pid)
+            command = " ".join(process.cmdline())
+            if any(web_browser in command for web_browser in CONFIG.web_browsers):
+                return None
+
+            children = utils.get_children(process, recursive=True)
+            if any(get_program_name(child) in CONFIG.enabled_plugins for child in children):
+                return None
+
+            processes[container.window] = [
+                [proc.pid, proc.create_time(), proc.cwd()] for proc in [process, *children]
+            ]
+        except psutil.Error:
+            # The process exited or can't be accessed, so the container is saved without it too
+            processes[container.window] = None
+
+    def get_content(node: tree.Node) -> bytes:
+        content = [getattr(node, key) for key in layout.LAYOUT_KEYS]
+        content += [node.focused, node.window, node.window_properties, processes.get(node.window)]
+        return json.dumps(content).encode("utf-8")
+
+    session_key = json.dumps([utils.get_version(), workspace.output, vars(CONFIG)], sort_keys=True)
+    workspace_hash = tree.merkle_hash(workspace, get_content)
+    return hashlib.sha256(f"{session_key}:{workspace_hash}".encode()).hexdigest()
+
+
+def get_program_name(process: psutil.Process) -> str:
+    """
+    Get the name of the program a process runs. Some programs change their process name (tmux's is
+    'tmux: client'), so the name of the program that was run is used instead.
+    """
+    cmdline = process.cmdline()
+    return Path(cmdline[0]).name if cmdline else process.name()
+
+
+def get_prefetch_files(pid: int) -> list[str]:
+    """
+    Get the executable and the shared libraries a process has mapped, so i3-restore can read them
+    into the page cache before the program is launched again. Only executable mappings are used, as
+    those are the files every launch has to load.
+    """
+    files = []
+    try:
+        files.append(os.readlink(f"/proc/{pid}/exe"))
+        maps = Path(f"/proc/{pid}/maps").read_text()
+    except OSError as err:
+        logger.debug("Can't get the mapped files of process %s: %s", pid, err)
+        return files
+
+    for line in maps.splitlines():
+        # Each line is: address perms offset device inode path
+        fields = line.split(maxsplit=5)
+        if len(fields) < 6 or "x" not in fields[1]:
+            continue
+
+        path = fields[5]
+        # Anonymous mappings (such as [vdso]) and deleted files can't be read again
+        if path.startswith("/") and not path.endswith(" (deleted)"):
+            files.append(path)
+
+    return list(dict.fromkeys(files))
+
+
+def get_window_pid(window_id: int) -> int | None:
+    """
+    Get the PID of the process that owns a window. The PID is only retrieved once for each window
+    during a save, as both hashing the workspace and saving the container need it.
+    """
+    if window_id in _window_pids:
+        return _window_pids[window_id]
+
+    try:
+        pid_info = subprocess.check_output(
+            ["xdotool", "getwindowpid", str(window_id)],
+            stderr=subprocess.DEVNULL,
+            timeout=utils.get_essential_timeout(),
+        ).decode("utf-8")
+        pid = int(pid_info)
+    except subprocess.CalledProcessError:
+        logger.info("No PID associated with container. Skipping...")
+        pid = None
+    except subprocess.TimeoutExpired:
+        logger.warning("Timed out getting the PID of the container. Skipping...")
+        pid = None
+
+    _window_pids[window_id] = pid
+    return pid
+
+
+def parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="i3-save",
+        description="Save your current i3 session",
+        epilog="For more information, check out https://github.com/jdholtz/i3-restore#readme",
+    )
+    parser.add_argument(
+        "-v",
+        action="count",
+        default=0,
+        dest="verbose",
+        help="Increase the verbosity of the script. One v prints info messages and two v's print "
+        "debug messages too",
+    )
+    parser.add_argument(
+        "--workspace",
+        action="append",
+        dest="workspaces",
+        metavar="<name>",
+        help="Only save the given workspace, keeping the rest of the saved session. Can be passed "
+        "multiple times",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=positive_float,
+        metavar="<seconds>",
+        help="Finish saving within the given time. Scrollback, plugin sessions, and subprocesses "
+        "are skipped (in that order) as the time runs out, but layouts and the programs' commands "
+        "are always saved. Only the commands i3-save runs are stopped at the deadline",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Save every workspace, even the ones that haven't changed since the last save",
+    )
+    parser.add_argument(
+        "--fleet",
+        action="store_true",
+        help="Save every i3 session running on the machine (such as one for each display) at once, "
+        "each into the i3_PATH it was started with. Other users' sessions are only saved when run "
+        "as root",
+    )
+    parser.add_argument("-V", "--version", action="version", version=utils.get_version())
+
+    return parser.parse_args(argv)
+
+
+def positive_float(value: str) -> float:
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+
+    # Written this way so NaN is rejected too
+    if number is None or not number > 0:
+        raise argparse.ArgumentTypeError(f"must be a positive number: '{value}'")
+
+    return number
+
+
+def set_verbosity(verbose: int) -> None:
+    """Reconfigure the logger (shared by every module) with the verbosity from the command line"""
+    if verbose == 0:
+        return
+
+    os.environ["I3_RESTORE_VERBOSE"] = str(min(verbose, 2))
+    utils.get_logger()
+
+
+def check_dependencies() -> None:
+    """Ensure the programs needed to save a session are installed"""
+    for dependency in constants.SAVE_DEPENDENCIES:
+        if shutil.which(dependency) is None:
+            logger.error("%s is required for i3-restore!", dependency)
+            utils.display_error(f"{dependency} is required for i3-restore!")
+            sys.exit(1)
+
+
+def remove_previous_session(keep_workspaces: list[str] | None = None) -> None:
+    """
+    Remove the session files from the previous saved session. The files of the workspaces to keep
+    (and the restore plan, which is merged instead) are not removed.
+    """
+    keep_files = set()
+    for workspace_name in keep_workspaces or []:
+        keep_files |= get_workspace_session_files(workspace_name)
+
+    if keep_files:
+        keep_files.add(plan.get_plan_file())
+
+    for pattern in SESSION_FILE_PATTERNS:
+        for file in Path(utils.i3_PATH).glob(pattern):
+            if file not in keep_files:
+                file.unlink(missing_ok=True)
+
+
+def select_workspaces(workspaces: list[tree.Node], workspace_names: list[str]) -> list[tree.Node]:
+    """Select only the workspaces with the provided names"""
+    selected_workspaces = [ws for ws in workspaces if ws.name in workspace_names]
+
+    found_names = {ws.name for ws in selected_workspaces}
+    for name in workspace_names:
+        if name not in found_names:
+            logger.error("Workspace %s not found. Skipping...", name)
+
+    return selected_workspaces
+
+
+def remove_workspace_session(workspace_name: str) -> None:
+    """
+    Remove the saved files of a single workspace. Its entry in the restore plan is replaced when the
+    plan is saved.
+    """
+    logger.info("Removing previous session files for Workspace %s", workspace_name)
+    for file in get_workspace_session_files(workspace_name):
+        file.unlink(missing_ok=True)
+
+
+def get_workspace_session_files(workspace_name: str) -> set[Path]:
+    """
+    Get the saved files of a single workspace: its layout, launch scripts, subprocesses, and any
+    Kitty sessions and Kitty or tmux scrollback its programs restore.
+    """
+    i3_path = Path(utils.i3_PATH)
+    files = set()
+
+    # Layout files contain the display in their name, so they need to be matched exactly
+    layout_name = workspace_name.replace("/", "{slash}")
+    for file in i3_path.glob("workspace_*_layout.json"):
+        file_ws_name = file.name.removeprefix("workspace_").removesuffix("_layout.json")
+        if file_ws_name.rsplit("_", 1)[0] == layout_name:
+            files.add(file)
+
+    sanitized_name = sanitize_workspace_name(workspace_name)
+    # Programs files are only saved by versions before restore plans were added
+    script_regex = re.compile(
+        rf"workspace_{re.escape(sanitized_name)}_(programs|(container|subprocess)_\d+)\.sh"
+    )
+    for file in i3_path.glob("workspace_*.sh"):
+        if not script_regex.fullmatch(file.name):
+            continue
+
+        contents = file.read_text()
+
+        # Kitty session files are named by window ID, so find them through the launch scripts. Other
+        # options (such as --single-instance) can come before the session.
+        for session_file in re.findall(r"--session '([^']+)'", contents):
+            session_path = Path(session_file)
+            window_id = session_path.name.removeprefix("kitty-session-")
+            files.update(i3_path.glob(f"kitty-scrollback-{window_id}-*"))
+            files.add(session_path)
+
+        # tmux scrollback is restored by the subprocess scripts of the terminals tmux runs in
+        for scrollback_file in re.findall(r"tmux-scrollback-[\w-]+", contents):
+            files.add(i3_path / scrollback_file)
+
+        files.add(file)
+
+    return files
+
+
+def mark_saved_web_browsers() -> None:
+    """
+    Mark the web browsers that are already saved in the session so they aren't saved again when
+    only some workspaces are saved.
+    """
+    browser_file = Path(utils.i3_PATH) / "web_browsers.sh"
+    if not browser_file.exists():
+        return
+
+    saved_commands = browser_file.read_text()
+    for web_browser in WEB_BROWSERS_DICT:
+        if web_browser in saved_commands:
+            WEB_BROWSERS_DICT[web_browser] = True
+
+
+def sanitize_workspace_name(workspace_name: str) -> str:
+    """
+    For some reason, i3 doesn't execute scripts with a space in the name correctly, so this is used
+    for script file names
+    """
+    return workspace_name.replace("/", "{slash}").replace(" ", "{space}")
 
 
 class Workspace:
@@ -39,35 +502,41 @@ class Workspace:
     startup commands to a file so they can be restored
     """
 
-    def __init__(self, properties: JSON) -> None:
-        self.name = properties["name"]
+    def __init__(self, properties: tree.Node) -> None:
+        self.name = properties.name
 
-        # For some reason, i3 doesn't execute scripts with a space in the name correctly
-        # so this will be used when for script file names
-        self.sanitized_name = self.name.replace("/", "{slash}").replace(" ", "{space}")
+        self.sanitized_name = sanitize_workspace_name(self.name)
         self.containers = []
+        # The launch script and window class of each container, in the order they are restored
+        self.launch_scripts = []
+        self.launch_classes = []
+        # The servers of the terminals restored through a client, started once before restoring
+        self.server_commands = []
+        # The executables and libraries of the programs, read into the page cache when restoring
+        self.prefetch_files = []
 
         logger.info("Saving programs for Workspace %s", self.name)
         self._get_containers(properties)
+        # The windows whose programs are launched when restoring
+        self.launched_windows = {container.window_id for container in self.containers}
         self._save()
 
-    def _get_containers(self, properties: JSON) -> None:
-        """Recursive function to get all containers in a workspace"""
-        containers = properties["nodes"]
-        for container in containers:
-            if len(container["nodes"]) == 0:
-                # Make sure it isn't a template window and it actually has a program running
-                if len(container["swallows"]) != 0:
-                    continue
+    def _get_containers(self, properties: tree.Node) -> None:
+        """Get all containers in a workspace"""
+        for container in tree.iter_leaves(properties):
+            # Make sure it isn't a template window and it actually has a program running
+            if len(container.swallows) != 0:
+                continue
 
-                con = Container(container)
-                if con.command is not None:
-                    self.containers.append(con)
-            else:
-                self._get_containers(container)
+            con = Container(container)
+            if con.command is not None:
+                self.containers.append(con)
 
     def _save(self) -> None:
-        """Save all the containers' commands in a file"""
+        """
+        Save each container's command in its own launch script. This way, restoring a container
+        only runs the command for that container.
+        """
 
         # Don't save if there are no containers in the workspace
         if len(self.containers) == 0:
@@ -76,9 +545,6 @@ class Workspace:
 
         logger.info("Number of containers: %s", len(self.containers))
 
-        file = Path(utils.i3_PATH) / f"workspace_{self.sanitized_name}_programs.sh"
-
-        program_commands = "#!/usr/bin/env bash\n"
         for i, container in enumerate(self.containers):
             logger.info(
                 "Saving container with command %s and working directory %s",
@@ -86,22 +552,30 @@ class Workspace:
                 container.working_directory,
             )
 
-            # Each command is prefixed with a selection statement so we have control
-            # to restore only one container at a time. This ensures the containers restore
-            # reliably in the correct order.
-            program_commands += f'[[ $1 == {i} ]] && cd "{container.working_directory}" && '
+            file = Path(utils.i3_PATH) / f"workspace_{self.sanitized_name}_container_{i}.sh"
+            command = f'cd "{container.working_directory}" && '
 
             # Containers with subprocess commands need to save where they stored the
-            # subprocess command so it could be executed correctly when restored
+            # subprocess command so it could be executed correctly when restored. It is exported
+            # so a terminal started when its client can't connect to a server gets it too.
             if container.subprocess_command:
                 subprocess_file = self._save_subprocess(container, i)
-                program_commands += f"I3_RESTORE_SUBPROCESS_SCRIPT={subprocess_file} "
+                command += f"export I3_RESTORE_SUBPROCESS_SCRIPT={subprocess_file} && "
+
+            command += f"{container.command}\n"
+
+            logger.debug("File: %s. Launch command: %s", file, command)
+            utils.write_script(file, command)
+            self.launch_scripts.append(file)
+            self.launch_classes.append(container.window_class)
 
-            program_commands += f"{container.command}\n"
+            server_command = container.server_command
+            if server_command is not None and server_command not in self.server_commands:
+                self.server_commands.append(server_command)
 
-        logger.debug("File: %s. Program commands: %s", file, program_commands)
-        with file.open("w") as f:
-            f.write(program_commands)
+            self.prefetch_files += [
+                file for file in container.prefetch_files if file not in self.prefetch_files
+            ]
 
     def _save_subprocess(self, container: Container, container_num: int) -> Path:
         """
@@ -112,9 +586,7 @@ class Workspace:
             Path(utils.i3_PATH) / f"workspace_{self.sanitized_name}_subprocess_{container_num}.sh"
         )
         logger.debug("File: %s. Subprocess command: %s", file, container.subprocess_command)
-        subprocess_cmd = "#!/usr/bin/env bash\n" + container.subprocess_command
-        with file.open("w") as f:
-            f.write(subprocess_cmd)
+        utils.write_script(file, container.subprocess_command)
 
         return file
 
@@ -125,12 +597,14 @@ class Container:
     of the container.
     """
 
-    def __init__(self, properties: JSON) -> None:
+    def __init__(self, properties: tree.Node) -> None:
         self.command = None
         self.subprocess_command = None
         self.working_directory = None
-        self.window_class = properties["window_properties"].get("class")
-        self.window_id = properties["window"]
+        self.server_command = None
+        self.prefetch_files = []
+        self.window_class = properties.window_properties.get("class")
+        self.window_id = properties.window
 
         self.pid = self._get_pid()
 
@@ -149,18 +623,12 @@ class Container:
             # Don't save the container if it fails to access all of its attributes
             self.command = None
 
+        if self.command is not None and not utils.should_skip("prefetch files"):
+            self.prefetch_files = get_prefetch_files(self.pid)
+
     def _get_pid(self) -> int | None:
         """Get the PID of the current container"""
-        try:
-            pid_info = subprocess.check_output(
-                ["xdotool", "getwindowpid", str(self.window_id)], stderr=subprocess.DEVNULL
-            ).decode("utf-8")
-            pid = int(pid_info)
-        except subprocess.CalledProcessError:
-            logger.info("No PID associated with container. Skipping...")
-            pid = None
-
-        return pid
+        return get_window_pid(self.window_id)
 
     def _get_cmdline_options(self) -> None:
         """Set the command and working directory of the container"""
@@ -168,8 +636,12 @@ class Container:
             return
 
         # Use a custom save plugin to save this container. The container will be saved normally if
-        # the plugin is not enabled or the plugin fails to save it.
-        if self.window_class in CONFIG.enabled_plugins and self._save_with_plugin():
+        # the plugin is not enabled, the plugin fails to save it, or there is no time left for it.
+        if (
+            self.window_class in CONFIG.enabled_plugins
+            and not utils.should_skip("plugin sessions")
+            and self._save_with_plugin(self.window_class)
+        ):
             return
 
         process = psutil.Process(self.pid)
@@ -182,13 +654,23 @@ class Container:
                 # The terminal command is set here manually so the custom command used to restore
                 # the subprocess works as expected and doesn't store "[terminal] -e bash -c ..."
                 self.command = terminal["command"]
+                if "client_command" in terminal:
+                    # Open the window through the terminal's server. The terminal is started
+                    # normally when the client can't connect to a server.
+                    self.command = f"{terminal['client_command']} || {terminal['command']}"
+                    self.server_command = terminal.get("server_command")
+
+                # Programs running in the terminal (such as tmux) can have plugins too
+                if self._save_terminal_program_with_plugin(process):
+                    return
 
                 self.check_if_subprocess(process)
 
                 # Get the working directory of the last process because some terminals
                 # store working directories different than others (which is why it can't
                 # just be grabbed from the main process)
-                self.working_directory = process.children()[-1].cwd()
+                children = utils.get_children(process)
+                self.working_directory = (children[-1] if children else process).cwd()
                 return
 
         self.command = " ".join(process.cmdline())
@@ -199,24 +681,57 @@ class Container:
         # restoring every instance.
         self._handle_web_browser()
 
-    def _save_with_plugin(self) -> bool:
+    def _save_terminal_program_with_plugin(self, process: psutil.Process) -> bool:
+        """
+        Save the container using the plugin of a program running in the terminal. Returns true when
+        the container is successfully saved, false if no enabled plugin supports the programs in the
+        terminal or the plugin failed to save the container.
         """
-        Save the container using a supported plugin. Returns true when the container is successfully
-        saved, false if an error occurred or if no plugin supports saving this window. This function
-        assumes that the plugin is enabled in the user config.
+        for child in utils.get_children(process, recursive=True):
+            program_name = get_program_name(child)
+            if program_name in CONFIG.enabled_plugins and not utils.should_skip("plugin sessions"):
+                return self._save_with_plugin(program_name)
+
+        return False
+
+    def _save_with_plugin(self, plugin_name: str) -> bool:
         """
-        if self.window_class not in SUPPORTED_PLUGINS:
-            logger.error("Plugin not supported: %s. Saving container regularly", self.window_class)
+        Save the container using a plugin. Returns true when the container is successfully saved,
+        false if an error occurred, the plugin took longer than its timeout, or if the plugin's
+        configuration is invalid. This function assumes that the plugin is enabled in the user
+        config.
+        """
+        logger.info("Saving container with plugin: %s", plugin_name)
+
+        try:
+            plugin, plugin_config = plugins.load_plugin(
+                plugin_name, CONFIG.enabled_plugins[plugin_name]
+            )
+        except TypeError as err:
+            logger.error("Error in %s plugin configuration: %s", plugin_name, err)
+            metrics.increment("plugin_failures")
             return False
 
-        logger.info("Saving container with plugin: %s", self.window_class)
-        plugin_config = CONFIG.enabled_plugins[self.window_class]
+        # The plugin may partially save the container before failing, so the container's
+        # attributes are reset when it does
+        attributes = (self.command, self.subprocess_command, self.working_directory)
 
         try:
-            SUPPORTED_PLUGINS[self.window_class].main(self, plugin_config)
+            with utils.deadline(plugin_config["timeout"]):
+                plugin.main(self, plugin_config)
             return True
+        except subprocess.TimeoutExpired:
+            logger.error(
+                "Plugin %s took longer than %ss. Saving container regularly",
+                plugin_name,
+                plugin_config["timeout"],
+            )
         except utils.PluginSaveError:
-            return False
+            pass
+
+        metrics.increment("plugin_failures")
+        self.command, self.subprocess_command, self.working_directory = attributes
+        return False
 
     def check_if_subprocess(
         self, process: psutil.Process, default_launch_command: str = "{command}"
@@ -229,9 +744,12 @@ class Container:
         Since the subprocesses are retrieved recursively, the newest subprocess
         will be saved and restored.
         """
+        if utils.should_skip("subprocess detection"):
+            return
+
         # Prepending the current process is useful when the process is not a terminal (which can
         # happen when some plugins use it)
-        processes = [process, *process.children(True)]
+        processes = [process, *utils.get_children(process, recursive=True)]
 
         for child in reversed(processes):
             child_name = child.name()
@@ -312,4 +830,8 @@ if __name__ == "__main__":
         main()
     except Exception as err:
         logger.exception(err)
+        utils.display_error(
+            "An error occurred saving the session. View the logs for more details",
+            show_log_buttons=True,
+        )
         sys.exit(1)
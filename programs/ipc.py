@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+import os
+import select
+import socket
+import struct
+import subprocess
+import time
+from typing import TYPE_CHECKING, Any
+
+import constants
+import tree
+import utils
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+# Type alias for JSON
+JSON = utils.JSON
+
+# The i3 IPC message header is the magic string followed by the payload length and message type
+MAGIC = b"i3-ipc"
+HEADER = struct.Struct(f"={len(MAGIC)}sII")
+
+# Message types. See https://i3wm.org/docs/ipc.html
+RUN_COMMAND = 0
+GET_WORKSPACES = 1
+SUBSCRIBE = 2
+GET_TREE = 4
+GET_MARKS = 5
+
+# Replies to events have the highest bit of the message type set
+EVENT_MASK = 1 << 31
+
+# Event types (without the event bit)
+WORKSPACE_EVENT = 0
+WINDOW_EVENT = 3
+SHUTDOWN_EVENT = 6
+
+
+class IPCError(Exception):
+    pass
+
+
+def get_socket_path() -> str:
+    """Get the path of the i3 IPC socket. I3SOCK is used if it is set to save a process"""
+    socket_path = os.getenv("I3SOCK")
+    if socket_path:
+        return socket_path
+
+    return subprocess.check_output(["i3", "--get-socketpath"]).decode("utf-8").strip()
+
+
+def connect(timeout: float = constants.IPC_CONNECT_TIMEOUT) -> Connection:
+    """Connect to i3, retrying until the timeout while i3 is (re)starting"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return Connection()
+        except (OSError, subprocess.CalledProcessError):
+            if time.monotonic() >= deadline:
+                raise
+
+            time.sleep(constants.IPC_CONNECT_INTERVAL)
+
+
+class Connection:
+    """
+    A connection to i3's IPC socket. This is used instead of calling i3-msg so that restoring
+    doesn't need to start a new process for every message sent to i3.
+    """
+
+    def __init__(self, socket_path: str | None = None) -> None:
+        self.socket_path = socket_path or get_socket_path()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(self.socket_path)
+
+    def close(self) -> None:
+        self.socket.close()
+
+    def send(self, message_type: int, payload: str = "") -> None:
+        data = payload.encode("utf-8")
+        self.socket.sendall(HEADER.pack(MAGIC, len(data), message_type) + data)
+
+    def receive(
+        self, object_hook: Callable[[JSON], Any] | None = None
+    ) -> tuple[int, JSON | list[JSON]]:
+        """
+        Receive the next message from i3. Returns the message type and its payload. The object hook
+        is passed to json.loads to decode the objects in the payload.
+        """
+        magic, length, message_type = HEADER.unpack(self._receive_bytes(HEADER.size))
+        if magic != MAGIC:
+            raise IPCError(f"Invalid i3 IPC magic string: {magic!r}")
+
+        return message_type, json.loads(self._receive_bytes(length), object_hook=object_hook)
+
+    def request(
+        self,
+        message_type: int,
+        payload: str = "",
+        object_hook: Callable[[JSON], Any] | None = None,
+    ) -> Any:
+        """Send a message and wait for its reply. Events received in the meantime are skipped"""
+        self.send(message_type, payload)
+        while True:
+            reply_type, reply = self.receive(object_hook)
+            if reply_type == message_type:
+                return reply
+
+    def command(self, payload: str) -> list[JSON]:
+        """
+        Run one or more commands (separated with ';'). Returns i3's reply, which contains whether
+        each command succeeded.
+        """
+        return self.request(RUN_COMMAND, payload)
+
+    def get_tree(self) -> tree.Node:
+        return self.request(GET_TREE, object_hook=tree.to_node)
+
+    def get_workspaces(self) -> list[JSON]:
+        return self.request(GET_WORKSPACES)
+
+    def get_marks(self) -> list[str]:
+        return self.request(GET_MARKS)
+
+    def subscribe(self, events: list[str]) -> JSON:
+        return self.request(SUBSCRIBE, json.dumps(events))
+
+    def receive_event(self, timeout: float | None = None) -> tuple[int, JSON] | None:
+        """
+        Wait for the next event. Returns the event type (without the event bit) and the event, or
+        None if no event was received before the timeout.
+        """
+        while True:
+            if timeout is not None:
+                readable, _, _ = select.select([self.socket], [], [], timeout)
+                if not readable:
+                    return None
+
+            message_type, message = self.receive()
+            if message_type & EVENT_MASK:
+                return message_type & ~EVENT_MASK, message
+
+    def _receive_bytes(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.socket.recv(size - len(data))
+            if not chunk:
+                raise IPCError("The i3 IPC socket was closed")
+
+            data += chunk
+
+        return data
+
+
+def quote(value: str) -> str:
+    """Quote a value so it is parsed as a single argument in an i3 command"""
+    escaped_value = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped_value}"'
+
+
+def split_commands(payload: str) -> list[str]:
+    """
+    Split a command payload into its commands. Commands are separated by semicolons and commas that
+    are not quoted, and i3 replies with a result for each of them.
+    """
+    commands = []
+    current = ""
+    quoted = escaped = False
+    for char in payload:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char in ";," and not quoted:
+            commands.append(current.strip())
+            current = ""
+            continue
+
+        current += char
+
+    commands.append(current.strip())
+    return [command for command in commands if command]
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import constants
+import plan
+import utils
+
+# Type alias for JSON
+JSON = utils.JSON
+
+logger = utils.get_logger()
+
+
+def get_journal_file() -> Path:
+    return Path(utils.i3_PATH) / constants.RESTORE_JOURNAL_FILE_NAME
+
+
+def get_plan_hash() -> str | None:
+    """Get the hash of the saved restore plan, which identifies the restore a journal belongs to"""
+    try:
+        return hashlib.sha256(plan.get_plan_file().read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def start_journal(resume: bool) -> RestoreJournal:
+    """
+    Start the journal of a restore. When resuming, the progress recorded by the last restore of the
+    same restore plan is continued from. Otherwise, the restore starts from the beginning.
+    """
+    plan_hash = get_plan_hash()
+    if resume:
+        restore_journal = RestoreJournal.load(plan_hash)
+        if restore_journal is not None:
+            logger.info("Resuming the last restore from its journal")
+            return restore_journal
+
+        logger.info("No journal of the last restore found. Restoring from the beginning")
+
+    restore_journal = RestoreJournal(plan_hash)
+    restore_journal.save()
+    return restore_journal
+
+
+class RestoreJournal:
+    """
+    Records the progress of restoring a restore plan: whether the terminal servers were started,
+    which programs of each workspace were launched, which workspaces were restored (their
+    layouts were appended, so their windows were swallowed), and whether the web browsers were
+    restored. The journal is saved after every step,
+    so an interrupted restore can be resumed without launching any program twice. A journal
+    without a plan hash is only kept in memory.
+    """
+
+    def __init__(self, plan_hash: str | None = None) -> None:
+        self.plan_hash = plan_hash
+        self.servers_started = False
+        # The indexes of the launched containers and whether the layout was appended for each
+        # workspace. Indexes are recorded rather than a count, as the launch order depends on the
+        # startup times, which may have changed by the time the restore is resumed.
+        self.workspaces: dict[str, JSON] = {}
+        self.browsers_restored = False
+        self.finished = False
+
+    @classmethod
+    def load(cls, plan_hash: str | None) -> RestoreJournal | None:
+        """
+        Load the journal of the last restore. None is returned when there is no journal for the
+        restore plan, such as when the session was saved again after the last restore.
+        """
+        try:
+            with get_journal_file().open() as f:
+                journal = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if plan_hash is None or journal.get("plan_hash") != plan_hash:
+            return None
+
+        restore_journal = cls(plan_hash)
+        restore_journal.servers_started = journal["servers_started"]
+        restore_journal.workspaces = journal["workspaces"]
+        restore_journal.browsers_restored = journal["browsers_restored"]
+        restore_journal.finished = journal["finished"]
+        return restore_journal
+
+    def save(self) -> None:
+        """Save the journal. It is replaced atomically so an interrupted save never corrupts it"""
+        if self.plan_hash is None:
+            return
+
+        journal = {
+            "plan_hash": self.plan_hash,
+            "servers_started": self.servers_started,
+            "workspaces": self.workspaces,
+            "browsers_restored": self.browsers_restored,
+            "finished": self.finished,
+        }
+
+        journal_file = get_journal_file()
+        temp_file = journal_file.with_name(f"{journal_file.name}.tmp")
+        with temp_file.open("w") as f:
+            json.dump(journal, f)
+
+        os.replace(temp_file, journal_file)
+
+    def get_launched(self, workspace_name: str) -> set[int]:
+        """Get the indexes of the containers of a workspace whose programs were launched"""
+        return set(self.workspaces.get(workspace_name, {}).get("launched", []))
+
+    def set_launched(self, workspace_name: str, index: int) -> None:
+        self.workspaces.setdefault(workspace_name, {}).setdefault("launched", []).append(index)
+        self.save()
+
+    def is_restored(self, workspace_name: str) -> bool:
+        return self.workspaces.get(workspace_name, {}).get("restored", False)
+
+    def set_restored(self, workspace_names: list[str]) -> None:
+        for name in workspace_names:
+            self.workspaces.setdefault(name, {})["restored"] = True
+
+        self.save()
+
+    def set_servers_started(self) -> None:
+        self.servers_started = True
+        self.save()
+
+    def set_browsers_restored(self) -> None:
+        self.browsers_restored = True
+        self.save()
+
+    def finish(self) -> None:
+        """Record that every workspace was restored, so resuming has nothing left to do"""
+        self.finished = True
+        self.save()
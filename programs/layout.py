@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import constants
+import tree
+import utils
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+# Type alias for JSON
+JSON = utils.JSON
+
+logger = utils.get_logger()
+
+# The container keys that are kept in a saved layout. These are the same keys i3-save-tree keeps.
+LAYOUT_KEYS = (
+    "type",
+    "fullscreen_mode",
+    "layout",
+    "border",
+    "current_border_width",
+    "floating",
+    "percent",
+    "name",
+    "geometry",
+    "marks",
+    "rect",
+)
+
+# The window properties that are used as swallow criteria for each window
+SWALLOW_PROPERTIES = tree.WINDOW_PROPERTIES
+# The swallow criteria of windows that are launched again when restoring. Their titles usually
+# change while they start (e.g. a terminal's title is set by its shell), so matching the saved title
+# would leave their placeholders empty. Windows restored by their own program (such as web
+# browsers) keep matching their title, which is what tells their windows apart.
+LAUNCHED_SWALLOW_PROPERTIES = tuple(prop for prop in SWALLOW_PROPERTIES if prop != "title")
+
+
+def save_workspace_layout(
+    workspace: tree.Node, launched_windows: Collection[int] = ()
+) -> Path | None:
+    """
+    Save the layout of a workspace so it can be restored with append_layout. The layout is built
+    from the workspace's tree directly, so no separate i3-save-tree call is needed for each
+    workspace. The launched windows are the windows whose programs are launched when restoring.
+    Returns the path of the layout file or None if the workspace is empty.
+    """
+    name = workspace.name
+    logger.info("Saving layout for Workspace %s", name)
+
+    containers = workspace.nodes + workspace.floating_nodes
+    if len(containers) == 0:
+        logger.info("Empty layout for Workspace %s. Skipping...", name)
+        return None
+
+    # Replace slash in workspace name as file names cannot have slashes
+    sanitized_name = name.replace("/", "{slash}")
+    file = Path(utils.i3_PATH) / f"workspace_{sanitized_name}_{workspace.output}_layout.json"
+
+    # append_layout accepts multiple top-level containers in a single file
+    layout = "\n\n".join(
+        json.dumps(strip_container(con, launched_windows), indent=4) for con in containers
+    )
+    logger.debug("File: %s. Layout: %s", file, utils.LogPayload(layout))
+    with file.open("w") as f:
+        f.write(layout + "\n")
+
+    return file
+
+
+def strip_container(container: tree.Node, launched_windows: Collection[int] = ()) -> JSON:
+    """
+    Strip a container down to what append_layout needs, the same way i3-save-tree does. Windows are
+    replaced with swallow criteria matching their window properties (see
+    LAUNCHED_SWALLOW_PROPERTIES for the launched windows), and the focused window is marked so
+    focus can be restored to it.
+
+    The tree is walked iteratively, so deeply nested containers can't hit the recursion limit.
+    """
+    layout = _strip_node(container, launched_windows)
+
+    # Each child is stripped and added to its parent's nodes in the same order as in the tree
+    pending = [(layout, node) for node in reversed(container.nodes)]
+    while pending:
+        parent_layout, node = pending.pop()
+        node_layout = _strip_node(node, launched_windows)
+        parent_layout["nodes"].append(node_layout)
+        pending.extend((node_layout, child) for child in reversed(node.nodes))
+
+    return layout
+
+
+def _strip_node(container: tree.Node, launched_windows: Collection[int]) -> JSON:
+    """Strip a single container. Its children are added to the 'nodes' key by strip_container"""
+    layout = {
+        key: getattr(container, key) for key in LAYOUT_KEYS if getattr(container, key) is not None
+    }
+
+    # Only workspaces have floating nodes, and they are saved as top-level containers
+    if container.nodes:
+        layout["nodes"] = []
+    else:
+        # The layout is not relevant for a leaf container
+        layout.pop("layout", None)
+
+    if layout.get("fullscreen_mode") == 0:
+        layout.pop("fullscreen_mode")
+
+    # Names of containers without windows are generated by i3
+    if not container.window:
+        layout.pop("name", None)
+
+    if not any((layout.get("geometry") or {}).values()):
+        layout.pop("geometry", None)
+
+    if layout.get("current_border_width") == -1:
+        layout.pop("current_border_width")
+
+    window_properties = container.window_properties
+    if window_properties:
+        swallow_properties = SWALLOW_PROPERTIES
+        if container.window in launched_windows:
+            swallow_properties = LAUNCHED_SWALLOW_PROPERTIES
+
+        layout["swallows"] = [
+            {
+                prop: "^" + re.escape(window_properties[prop]) + "$"
+                for prop in swallow_properties
+                if window_properties.get(prop) is not None
+            }
+        ]
+
+    if container.focused:
+        layout["marks"] = [*layout.get("marks", []), constants.FOCUS_MARK]
+
+    return layout
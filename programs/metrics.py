@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import contextlib
+import os
+import pwd
+import re
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import utils
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+# The prefix of every metric's name
+PREFIX = "i3_restore"
+
+# The counters of the current run and their descriptions
+COUNTERS = {
+    "workspaces": "Workspaces saved or restored",
+    "workspaces_skipped": "Workspaces skipped because they were unchanged or already restored",
+    "containers": "Containers saved or launched",
+    "plugin_failures": "Containers a plugin failed to save",
+    "subprocesses": "Subprocesses started",
+}
+
+# The time (in seconds) spent in each phase of the current run
+_phases: dict[str, float] = {}
+_counters = dict.fromkeys(COUNTERS, 0)
+
+logger = utils.get_logger()
+
+
+def _count_subprocesses(event: str, _args: tuple[Any, ...]) -> None:
+    if event == "subprocess.Popen":
+        _counters["subprocesses"] += 1
+
+
+# Every subprocess is counted, including the ones started by plugins
+sys.addaudithook(_count_subprocesses)
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Add the time spent inside the context to a phase of the run"""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _phases[name] = _phases.get(name, 0) + time.monotonic() - start
+
+
+def increment(counter: str, value: int = 1) -> None:
+    _counters[counter] += value
+
+
+def get_bytes_written(directory: str, since: float) -> int:
+    """Get the size of the files in a directory that were written since a time (from time.time)"""
+    bytes_written = 0
+    with contextlib.suppress(FileNotFoundError):
+        for file in Path(directory).iterdir():
+            with contextlib.suppress(FileNotFoundError):
+                stat = file.stat()
+                if stat.st_mtime >= since:
+                    bytes_written += stat.st_size
+
+    return bytes_written
+
+
+def get_user() -> str:
+    return pwd.getpwuid(os.getuid()).pw_name
+
+
+def get_metrics_file(metrics_dir: str, program: str) -> Path:
+    """
+    Get the file the metrics of a program are written to. Each user and display has their own
+    file, so sessions saved with i3-save --fleet don't overwrite each other's metrics.
+    """
+    display = re.sub(r"\W", "", os.getenv("DISPLAY", ""))
+    return Path(metrics_dir) / f"{PREFIX}_{program}_{get_user()}_{display}.prom"
+
+
+def get_last_success(metrics_file: Path) -> float | None:
+    """Get the time of the last successful run from the metrics it wrote"""
+    try:
+        lines = metrics_file.read_text().splitlines()
+    except FileNotFoundError:
+        return None
+
+    for line in lines:
+        if line.startswith(f"{PREFIX}_last_success_timestamp_seconds"):
+            return float(line.rsplit(" ", 1)[1])
+
+    return None
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    escaped_labels = []
+    for name, value in labels.items():
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped_labels.append(f'{name}="{escaped}"')
+
+    return "{" + ",".join(escaped_labels) + "}"
+
+
+def write_metrics(
+    metrics_dir: str | None, program: str, success: bool, start: float, i3_path: str
+) -> None:
+    """
+    Write the metrics of the run in the format of node_exporter's textfile collector. start is when
+    the run started (from time.time). The file is replaced atomically, so the collector never reads
+    a partially written file. The time of the last successful run is kept from the previous metrics
+    when the run failed. Nothing is written when no metrics directory is configured.
+    """
+    if metrics_dir is None:
+        return
+
+    now = time.time()
+    metrics_file = get_metrics_file(metrics_dir, program)
+    last_success = now if success else get_last_success(metrics_file)
+
+    labels = {
+        "program": program,
+        "user": get_user(),
+        "display": os.getenv("DISPLAY", ""),
+    }
+
+    metrics = [
+        ("success", "Whether the last run succeeded", [(labels, int(success))]),
+        ("duration_seconds", "Duration of the last run", [(labels, now - start)]),
+        (
+            "phase_duration_seconds",
+            "Duration of each phase of the last run",
+            [({**labels, "phase": name}, duration) for name, duration in _phases.items()],
+        ),
+        (
+            "bytes_written",
+            "Bytes of the saved session written in the last run",
+            [(labels, get_bytes_written(i3_path, start))],
+        ),
+    ]
+    metrics += [
+        (counter, f"{description} in the last run", [(labels, _counters[counter])])
+        for counter, description in COUNTERS.items()
+    ]
+    metrics.append(("last_run_timestamp_seconds", "Time of the last run", [(labels, now)]))
+    if last_success is not None:
+        metrics.append(
+            (
+                "last_success_timestamp_seconds",
+                "Time of the last successful run",
+                [(labels, last_success)],
+            )
+        )
+
+    lines = []
+    for name, description, samples in metrics:
+        lines += [f"# HELP {PREFIX}_{name} {description}", f"# TYPE {PREFIX}_{name} gauge"]
+        lines += [
+            f"{PREFIX}_{name}{format_labels(sample_labels)} {value}"
+            for sample_labels, value in samples
+        ]
+
+    temp_file = metrics_file.with_name(f"{metrics_file.name}.{os.getpid()}.tmp")
+    try:
+        Path(metrics_dir).mkdir(parents=True, exist_ok=True)
+        temp_file.write_text("\n".join(lines) + "\n")
+        os.replace(temp_file, metrics_file)
+    except OSError as err:
+        # Metrics are never worth failing the run over
+        logger.error("Failed to write metrics to %s: %s", metrics_file, err)
+        return
+
+    logger.info("Wrote metrics to %s", metrics_file)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import json
+import shlex
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import constants
+import ipc
+import utils
+
+if TYPE_CHECKING:
+    import tree
+
+# Type alias for JSON
+JSON = utils.JSON
+
+logger = utils.get_logger()
+
+
+def get_plan_file() -> Path:
+    return Path(utils.i3_PATH) / constants.RESTORE_PLAN_FILE_NAME
+
+
+def get_lazy_workspaces_file() -> Path:
+    return Path(utils.i3_PATH) / constants.LAZY_WORKSPACES_FILE_NAME
+
+
+def compile_workspace(
+    workspace: tree.Node,
+    layout_file: Path,
+    launch_scripts: list[Path],
+    launch_classes: list[str | None],
+    workspace_hash: str | None = None,
+    server_commands: list[str] | None = None,
+    prefetch_files: list[str] | None = None,
+) -> JSON:
+    """
+    Compile everything needed to restore a workspace into its entry in the restore plan. All IPC
+    commands are built here so the restore only has to send them in order. The launch command and
+    window class of a container are at its container index. The workspace's hash is stored so the
+    next save can skip the workspace if it hasn't changed. The server commands are the servers of
+    the terminals whose windows are opened through a client. The prefetch files are the executables
+    and libraries of the workspace's programs.
+    """
+    focus_command = f"workspace --no-auto-back-and-forth {ipc.quote(workspace.name)}"
+    output = ipc.quote(workspace.output)
+
+    return {
+        "name": workspace.name,
+        "output": workspace.output,
+        # Used to restore the workspaces the user was looking at first
+        "focused": workspace.focused_workspace,
+        "visible": workspace.visible,
+        # Moving the workspace to the display it was on may fail if the display no longer exists.
+        # In that case, the workspace is restored on the display i3 chose.
+        "output_command": f"{focus_command}; move workspace to output {output}",
+        "layout_command": f"{focus_command}; append_layout {ipc.quote(str(layout_file))}",
+        # Focus on the workspace before each container to make sure the program opens in the
+        # correct workspace
+        "launch_commands": [
+            f"{focus_command}; exec {ipc.quote(shlex.quote(str(script)))}"
+            for script in launch_scripts
+        ],
+        # Used to limit how many containers of each window class are launched at once
+        "launch_classes": launch_classes,
+        # Started once before any program is launched (see i3_restore.start_terminal_servers)
+        "server_commands": server_commands or [],
+        # Read into the page cache before the programs are launched (see prefetch.start_prefetch)
+        "prefetch_files": prefetch_files or [],
+        "hash": workspace_hash,
+    }
+
+
+def save_plan(
+    workspaces: list[JSON],
+    workspace_names: list[str] | None = None,
+    keep_workspaces: list[str] | None = None,
+) -> Path:
+    """
+    Save the restore plan. When only some workspaces were saved, their entries replace the entries
+    from the existing plan and the rest of the plan is kept. The entries of the workspaces to keep
+    are always kept from the existing plan.
+    """
+    plan_file = get_plan_file()
+    keep_workspaces = keep_workspaces or []
+
+    if workspace_names is not None or keep_workspaces:
+        saved_workspaces = {
+            workspace["name"]: workspace
+            for workspace in workspaces
+            if workspace["name"] not in keep_workspaces
+        }
+
+        merged_workspaces = []
+        for workspace in load_plan()["workspaces"]:
+            name = workspace["name"]
+            if name in keep_workspaces or (
+                workspace_names is not None and name not in workspace_names
+            ):
+                merged_workspaces.append(workspace)
+            elif name in saved_workspaces:
+                # Keep the workspace in the same place in the plan
+                merged_workspaces.append(saved_workspaces.pop(name))
+
+        workspaces = merged_workspaces + list(saved_workspaces.values())
+
+    plan = {"version": constants.RESTORE_PLAN_VERSION, "workspaces": workspaces}
+    logger.info("Saving restore plan with %s workspaces to %s", len(workspaces), plan_file)
+    logger.debug("Restore plan: %s", utils.LogPayload(plan))
+
+    with plan_file.open("w") as f:
+        json.dump(plan, f, indent=4)
+
+    return plan_file
+
+
+def load_plan() -> JSON:
+    """Load the saved restore plan. An empty plan is returned if none was saved"""
+    plan_file = get_plan_file()
+
+    try:
+        with plan_file.open() as f:
+            plan = json.load(f)
+    except FileNotFoundError:
+        logger.info("No restore plan found at %s", plan_file)
+        return {"version": constants.RESTORE_PLAN_VERSION, "workspaces": []}
+
+    if plan.get("version") != constants.RESTORE_PLAN_VERSION:
+        raise ValueError(
+            f"Restore plan version {plan.get('version')} is not supported. Save your session again"
+        )
+
+    return plan
+
+
+def save_lazy_workspaces(workspace_names: list[str]) -> None:
+    """
+    Save the workspaces that are waiting to be restored lazily. i3-save keeps their saved session
+    until they are restored. The file is removed once no workspaces are left.
+    """
+    lazy_workspaces_file = get_lazy_workspaces_file()
+    if not workspace_names:
+        lazy_workspaces_file.unlink(missing_ok=True)
+        return
+
+    with lazy_workspaces_file.open("w") as f:
+        json.dump(workspace_names, f)
+
+
+def load_lazy_workspaces() -> list[str]:
+    """Load the workspaces that are waiting to be restored lazily"""
+    try:
+        with get_lazy_workspaces_file().open() as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
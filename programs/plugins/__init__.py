@@ -0,0 +1,51 @@
+"""
+The plugin registry. Each module in this package is a plugin, and the module's name is the window
+class of the containers it saves. A plugin module must have these functions:
+- parse_config(plugin_config): parse and validate the plugin's configuration
+- main(container, plugin_config): save the container
+
+Plugins are only imported when the first container with their window class is saved.
+"""
+
+from __future__ import annotations
+
+import importlib
+import pkgutil
+from typing import TYPE_CHECKING
+
+import utils
+
+if TYPE_CHECKING:
+    from types import ModuleType
+
+# Type alias for JSON
+JSON = utils.JSON
+
+logger = utils.get_logger()
+
+# The plugins that were imported, with their parsed configuration
+_loaded_plugins: dict[str, tuple[ModuleType, JSON]] = {}
+
+
+def get_available_plugins() -> set[str]:
+    """Get the names of all plugins without importing them"""
+    return {module.name for module in pkgutil.iter_modules(__path__)}
+
+
+def load_plugin(name: str, plugin_config: JSON) -> tuple[ModuleType, JSON]:
+    """
+    Import a plugin and parse its configuration. This is only done the first time the plugin is
+    loaded. A TypeError is raised if the plugin's configuration is invalid.
+    """
+    if name not in _loaded_plugins:
+        logger.info("Loading plugin: %s", name)
+        plugin = importlib.import_module(f"{__name__}.{name}")
+
+        parsed_config = plugin.parse_config(plugin_config)
+        # The timeout is handled by the registry, so it applies to every plugin
+        parsed_config["timeout"] = plugin_config["timeout"]
+        logger.info("Plugin %s configuration: %s", name, parsed_config)
+
+        _loaded_plugins[name] = (plugin, parsed_config)
+
+    return _loaded_plugins[name]
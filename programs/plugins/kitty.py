@@ -22,6 +22,32 @@ KITTY_UNSERIALIZE_DATA_KEY = "kitty-unserialize-data="
 USE_OLD_SESSION_SAVING = None
 KITTY_NEW_SESSION_VERSION = (0, 43, 0)
 
+# The container trees already retrieved while saving. The key is the listen socket, so a Kitty
+# instance with multiple OS windows is only queried once.
+_container_trees: dict[str, JSON] = {}
+
+
+def parse_config(plugin: JSON) -> JSON:
+    if "listen_socket" not in plugin:
+        raise TypeError("kitty plugin: 'listen_socket' must be included")
+
+    plugin_config = {
+        "listen_socket": plugin["listen_socket"],
+        "scrollback": plugin.get("scrollback", "none"),
+        "single_instance": plugin.get("single_instance", False),
+    }
+
+    if plugin_config["scrollback"] not in constants.KITTY_PLUGIN_SCROLLBACK_OPTIONS:
+        raise TypeError(
+            "kitty plugin: 'scrollback' must be one of: "
+            f"{constants.KITTY_PLUGIN_SCROLLBACK_OPTIONS}"
+        )
+
+    if not isinstance(plugin_config["single_instance"], bool):
+        raise TypeError("kitty plugin: 'single_instance' must be true or false")
+
+    return plugin_config
+
 
 def should_use_old_session_saving() -> bool:
     """
@@ -30,7 +56,9 @@ def should_use_old_session_saving() -> bool:
     0.43.0, while the new method is used for Kitty 0.43.0 and above.
     """
     try:
-        output = subprocess.check_output(["kitty", "--version"]).decode("utf-8")
+        output = subprocess.check_output(
+            ["kitty", "--version"], timeout=utils.get_timeout()
+        ).decode("utf-8")
         # The version is the second word in the output
         version_str = output.strip().split()[1]
         version_parts = version_str.split(".")
@@ -55,17 +83,22 @@ def get_listen_socket(listen_socket: str, pid: int) -> str:
 def get_container_tree(listen_socket: str) -> JSON:
     """
     Use Kitty's remote control feature to get the container tree that listens on the provided
-    listen_socket.
+    listen_socket. The tree is only retrieved the first time the socket is needed.
     """
+    if listen_socket in _container_trees:
+        return _container_trees[listen_socket]
+
     try:
         output = subprocess.check_output(
-            ["kitty", "@", "--to", listen_socket, "ls", "--all-env-vars"]
+            ["kitty", "@", "--to", listen_socket, "ls", "--all-env-vars"],
+            timeout=utils.get_timeout(),
         ).decode("utf-8")
     except subprocess.CalledProcessError as err:
         logger.error("Failed retrieving Kitty container tree")
         raise utils.PluginSaveError from err
 
-    return json.loads(output)
+    _container_trees[listen_socket] = json.loads(output)
+    return _container_trees[listen_socket]
 
 
 def save_scrollback(window_id: int, os_window_id: int, plugin_config: JSON) -> Path | None:
@@ -85,6 +118,9 @@ def save_scrollback(window_id: int, os_window_id: int, plugin_config: JSON) -> P
         logger.debug("Skipping saving scrollback due to value being '%s'", scrollback_extent)
         return None
 
+    if utils.should_skip("scrollback"):
+        return None
+
     logger.info("Saving scrollback for Kitty window")
     try:
         subprocess.check_call(
@@ -101,6 +137,7 @@ def save_scrollback(window_id: int, os_window_id: int, plugin_config: JSON) -> P
                 f"--extent={scrollback_extent}",
             ],
             stdout=scrollback_file.open("w"),
+            timeout=utils.get_timeout(),
         )
     except subprocess.CalledProcessError as err:
         logger.error(
@@ -186,19 +223,34 @@ def parse_tree_to_session(container: Container, os_window_tree: JSON, plugin_con
         for window in tab["windows"]:
             output += get_window_launch_command(container, window, plugin_config)
 
-    logger.debug("Kitty session output:\n%s", output)
+    logger.debug("Kitty session output:\n%s", utils.LogPayload(output))
     return output
 
 
-def get_session_contents(listen_socket: str) -> str:
+def get_session_contents(listen_socket: str, os_window_tree: JSON) -> str:
     """
     Get the Kitty container's session contents using the session output format in kitty @ ls (only
-    in Kitty 0.43.0+)
+    in Kitty 0.43.0+). Only the windows of the container's OS window are matched, as a single Kitty
+    instance can have multiple OS windows.
     """
     logger.info("Retrieving Kitty session contents")
+    window_match = " or ".join(
+        f"id:{window['id']}" for tab in os_window_tree["tabs"] for window in tab["windows"]
+    )
     try:
         output = subprocess.check_output(
-            ["kitty", "@", "--to", listen_socket, "ls", "--all-env-vars", "--output-format=session"]
+            [
+                "kitty",
+                "@",
+                "--to",
+                listen_socket,
+                "ls",
+                "--all-env-vars",
+                "--output-format=session",
+                "--match",
+                window_match,
+            ],
+            timeout=utils.get_timeout(),
         ).decode("utf-8")
     except subprocess.CalledProcessError as err:
         logger.error("Failed retrieving Kitty session")
@@ -283,7 +335,7 @@ def create_session_file(container: Container, tree: JSON, plugin_config: JSON) -
         # below 0.43.0
         session_contents = parse_tree_to_session(container, os_window, plugin_config)
     else:
-        session_contents = get_session_contents(plugin_config["listen_socket"])
+        session_contents = get_session_contents(plugin_config["listen_socket"], os_window)
         session_contents = replace_launch_commands(
             container, os_window, plugin_config, session_contents
         )
@@ -311,13 +363,20 @@ def main(container: Container, config: JSON) -> None:
     logger.info("Kitty container listening on socket %s", plugin_config["listen_socket"])
 
     container_tree = get_container_tree(plugin_config["listen_socket"])
-    logger.debug("Kitty container tree: %s", container_tree)
+    logger.debug("Kitty container tree: %s", utils.LogPayload(container_tree))
 
     session_file = create_session_file(container, container_tree, plugin_config)
     logger.info("Kitty session file created at %s", session_file)
 
     # Update the container's attributes so the Kitty session will be restored correctly
     container.command = f"kitty --session '{session_file}'"
+    if plugin_config["single_instance"]:
+        # Every saved OS window is opened in the first Kitty instance restored, so Kitty only starts
+        # once no matter how many OS windows are restored
+        container.command = (
+            f"kitty --single-instance --instance-group={constants.KITTY_INSTANCE_GROUP} "
+            f"--session '{session_file}'"
+        )
     # The working directory is already set in the Kitty session, so this value can be any valid
     # directory. / is used as it is guaranteed to exist.
     container.working_directory = "/"
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import shlex
+import subprocess
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import psutil
+
+import constants
+import utils
+
+if TYPE_CHECKING:
+    from .. import JSON, Container
+
+
+logger = utils.get_logger()
+
+# The formats used to list a tmux server's clients and panes in a single query. The names are last
+# so they can contain the separator.
+CLIENT_FORMAT = "client\t#{client_pid}\t#{session_name}"
+PANE_FORMAT = (
+    "pane\t#{base-index}\t#{window_index}\t#{window_active}\t#{window_layout}\t#{pane_index}\t"
+    "#{pane_active}\t#{pane_id}\t#{pane_pid}\t#{pane_current_path}\t#{window_name}\t#{session_name}"
+)
+
+# The tmux servers already queried while saving. The key is the arguments that select the server's
+# socket, so each server is only queried once no matter how many terminals are attached to it.
+_servers: dict[tuple[str, ...], JSON] = {}
+
+
+def parse_config(plugin: JSON) -> JSON:
+    plugin_config = {"scrollback": plugin.get("scrollback", "none")}
+
+    if plugin_config["scrollback"] not in constants.TMUX_PLUGIN_SCROLLBACK_OPTIONS:
+        raise TypeError(
+            f"tmux plugin: 'scrollback' must be one of: {constants.TMUX_PLUGIN_SCROLLBACK_OPTIONS}"
+        )
+
+    return plugin_config
+
+
+def get_client_process(container: Container) -> psutil.Process:
+    """Get the tmux client running in the container's terminal"""
+    for child in utils.get_children(psutil.Process(container.pid), recursive=True):
+        cmdline = child.cmdline()
+        if cmdline and Path(cmdline[0]).name == constants.TMUX_NAME:
+            return child
+
+    logger.error("No tmux client found in the container")
+    raise utils.PluginSaveError
+
+
+def get_socket_args(cmdline: list[str]) -> list[str]:
+    """
+    Get the arguments that select the tmux server's socket (-L or -S) from the command line of a
+    tmux client. An empty list is returned when the client uses the default socket.
+    """
+    args = cmdline[1:]
+    i = 0
+    while i < len(args) and args[i].startswith("-") and args[i] != "--":
+        flag = args[i][:2]
+        # These options take a value, which is either attached (-Lname) or the next argument
+        if flag in ["-L", "-S", "-c", "-f", "-T"]:
+            value = args[i][2:]
+            if not value and i + 1 < len(args):
+                i += 1
+                value = args[i]
+
+            if flag in ["-L", "-S"]:
+                return [flag, value]
+
+        i += 1
+
+    return []
+
+
+def get_server(socket_args: list[str]) -> JSON:
+    """
+    Get the clients and sessions of a tmux server. Every client and pane on the server is listed in
+    a single tmux command, which is only run the first time the server is needed.
+    """
+    key = tuple(socket_args)
+    if key in _servers:
+        return _servers[key]
+
+    logger.info("Retrieving the panes of tmux server %s", socket_args or "default")
+    try:
+        output = subprocess.check_output(
+            [
+                constants.TMUX_NAME,
+                *socket_args,
+                "list-clients",
+                "-F",
+                CLIENT_FORMAT,
+                ";",
+                "list-panes",
+                "-a",
+                "-F",
+                PANE_FORMAT,
+            ],
+            timeout=utils.get_timeout(),
+        ).decode("utf-8")
+    except subprocess.CalledProcessError as err:
+        logger.error("Failed retrieving the panes of tmux server %s", socket_args or "default")
+        raise utils.PluginSaveError from err
+
+    server = {"number": len(_servers), "clients": {}, "sessions": {}, "scrollback": None}
+    for line in output.splitlines():
+        if line.startswith("client\t"):
+            _, pid, session_name = line.split("\t", 2)
+            server["clients"][int(pid)] = session_name
+        else:
+            add_pane(server["sessions"], line.split("\t", 11)[1:])
+
+    logger.debug("tmux server: %s", utils.LogPayload(server))
+    _servers[key] = server
+    return server
+
+
+def add_pane(sessions: JSON, fields: list[str]) -> None:
+    """Add a pane listed with PANE_FORMAT to its session and window"""
+    (
+        base_index,
+        window_index,
+        window_active,
+        window_layout,
+        pane_index,
+        pane_active,
+        pane_id,
+        pane_pid,
+        pane_cwd,
+        window_name,
+        session_name,
+    ) = fields
+
+    session = sessions.setdefault(session_name, {"base_index": base_index, "windows": {}})
+    window = session["windows"].setdefault(
+        window_index,
+        {
+            "index": window_index,
+            "name": window_name,
+            "active": window_active == "1",
+            "layout": window_layout,
+            "panes": [],
+        },
+    )
+    window["panes"].append(
+        {
+            "index": pane_index,
+            "active": pane_active == "1",
+            "id": pane_id,
+            "pid": int(pane_pid),
+            "cwd": pane_cwd,
+        }
+    )
+
+
+def save_scrollback(socket_args: list[str], server: JSON, plugin_config: JSON) -> dict[str, Path]:
+    """
+    Save the scrollback of every pane on the tmux server. Each pane is captured into a buffer and
+    saved to a file, with the commands for all panes run in a single tmux command. This is only done
+    the first time the server's scrollback is needed.
+
+    Returns the scrollback file of each pane ID. No files are returned when saving the scrollback is
+    skipped or the command to save it fails.
+    """
+    if server["scrollback"] is not None:
+        return server["scrollback"]
+
+    server["scrollback"] = {}
+    if plugin_config["scrollback"] == "none" or utils.should_skip("scrollback"):
+        return server["scrollback"]
+
+    # The whole history is captured with '-S -'. Otherwise, only the visible screen is captured.
+    extent_args = ["-S", "-"] if plugin_config["scrollback"] == "all" else []
+
+    commands = []
+    scrollback_files = {}
+    for session in server["sessions"].values():
+        for window in session["windows"].values():
+            for pane in window["panes"]:
+                pane_number = pane["id"].removeprefix("%")
+                scrollback_file = (
+                    Path(utils.i3_PATH) / f"tmux-scrollback-{server['number']}-{pane_number}"
+                )
+                buffer = f"i3-restore-{pane_number}"
+
+                # -e keeps the colors in the scrollback
+                commands += ["capture-pane", "-e", "-t", pane["id"], "-b", buffer, *extent_args]
+                commands += [";", "save-buffer", "-b", buffer, str(scrollback_file)]
+                commands += [";", "delete-buffer", "-b", buffer, ";"]
+                scrollback_files[pane["id"]] = scrollback_file
+
+    logger.info("Saving the scrollback of %s tmux panes", len(scrollback_files))
+    try:
+        subprocess.check_call(
+            [constants.TMUX_NAME, *socket_args, *commands[:-1]], timeout=utils.get_timeout()
+        )
+    except subprocess.CalledProcessError as err:
+        logger.error("Failed saving tmux scrollback: %s", err)
+        return server["scrollback"]
+
+    server["scrollback"] = scrollback_files
+    return server["scrollback"]
+
+
+def get_pane_command(container: Container, pane: JSON, scrollback_file: Path | None) -> list[str]:
+    """
+    Get the shell command a pane is restored with. The pane restores the subprocess running in it
+    (using the subprocess configuration) or its scrollback. An empty list is returned when the pane
+    only needs a shell.
+    """
+    shell_command = None
+
+    try:
+        process = psutil.Process(pane["pid"])
+        # The pane should return to the shell after the subprocess exits
+        container.check_if_subprocess(process, '{command} && exec "${SHELL:-sh}"')
+    except psutil.Error:
+        logger.info("The process of tmux pane %s no longer exists", pane["id"])
+
+    if container.subprocess_command:
+        shell_command = container.subprocess_command
+        # Overwrite this so the main script doesn't save the container's subprocess too
+        container.subprocess_command = None
+    elif scrollback_file is not None:
+        shell_command = f'cat {shlex.quote(str(scrollback_file))}; exec "${{SHELL:-sh}}"'
+
+    return [shell_command] if shell_command else []
+
+
+def create_restore_script(
+    container: Container,
+    socket_args: list[str],
+    session_name: str,
+    session: JSON,
+    scrollback: dict[str, Path],
+) -> str:
+    """
+    Create the script that rebuilds the tmux session (when it doesn't exist already) and attaches to
+    it. The session, its windows, and their panes are rebuilt with a single tmux command.
+    """
+    tmux = shlex.join([constants.TMUX_NAME, *socket_args])
+    session_target = f"={session_name}"
+
+    # The session needs a window to be created. The saved windows are created at their saved
+    # indexes, so the placeholder (created at the base index) is replaced by the window at the base
+    # index or killed if there isn't one.
+    commands = [
+        ["new-session", "-d", "-s", session_name, "-n", constants.TMUX_PLACEHOLDER_WINDOW],
+    ]
+    windows = list(session["windows"].values())
+    active_window = f"{session_target}:{windows[0]['index']}"
+    for window in windows:
+        window_target = f"{session_target}:{window['index']}"
+        first_pane, *other_panes = window["panes"]
+
+        commands.append(
+            [
+                *["new-window", "-d", "-k", "-t", window_target, "-n", window["name"]],
+                *["-c", first_pane["cwd"]],
+                *get_pane_command(container, first_pane, scrollback.get(first_pane["id"])),
+            ]
+        )
+        # Splitting the newest pane each time keeps the panes in their saved order
+        for pane in other_panes:
+            commands.append(
+                [
+                    *["split-window", "-t", window_target, "-c", pane["cwd"]],
+                    *get_pane_command(container, pane, scrollback.get(pane["id"])),
+                ]
+            )
+
+        commands.append(["select-layout", "-t", window_target, window["layout"]])
+        for pane in window["panes"]:
+            if pane["active"]:
+                commands.append(["select-pane", "-t", f"{window_target}.{pane['index']}"])
+
+        if window["active"]:
+            active_window = window_target
+
+    commands.append(["select-window", "-t", active_window])
+
+    if session["base_index"] not in session["windows"]:
+        placeholder_target = f"{session_target}:{constants.TMUX_PLACEHOLDER_WINDOW}"
+        commands.append(["kill-window", "-t", placeholder_target])
+
+    restore_command = " \\; \\\n    ".join(shlex.join(command) for command in commands)
+    quoted_target = shlex.quote(session_target)
+    return (
+        f"{tmux} has-session -t {quoted_target} 2>/dev/null || {tmux} {restore_command}\n"
+        f"{tmux} attach-session -t {quoted_target}\n"
+    )
+
+
+def main(container: Container, config: JSON) -> None:
+    logger.info("Saving tmux container")
+
+    client = get_client_process(container)
+    socket_args = get_socket_args(client.cmdline())
+    server = get_server(socket_args)
+
+    session_name = server["clients"].get(client.pid)
+    if session_name not in server["sessions"]:
+        logger.error("No tmux session found for client %s", client.pid)
+        raise utils.PluginSaveError
+
+    logger.info("tmux client %s is attached to session %s", client.pid, session_name)
+    scrollback = save_scrollback(socket_args, server, config)
+    session = server["sessions"][session_name]
+
+    # Update the container's attributes so the terminal rebuilds the tmux session when it's restored
+    container.subprocess_command = create_restore_script(
+        container, socket_args, session_name, session, scrollback
+    )
+    container.working_directory = client.cwd()
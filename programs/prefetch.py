@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import constants
+import utils
+
+logger = utils.get_logger()
+
+
+def start_prefetch(files: list[str]) -> ThreadPoolExecutor:
+    """
+    Start reading files into the page cache in the background. Programs launched while restoring
+    then load their executables and libraries from memory instead of all reading them from a cold
+    disk at once. Files are prefetched in the order they are given, so pass the files of the
+    programs launched first first. Shut the returned executor down once every program is launched.
+    """
+    files = list(dict.fromkeys(files))
+    logger.info("Prefetching %s files into the page cache", len(files))
+
+    executor = ThreadPoolExecutor(constants.PREFETCH_THREADS, thread_name_prefix="prefetch")
+    for file in files:
+        executor.submit(prefetch_file, file)
+
+    return executor
+
+
+def prefetch_file(file: str) -> None:
+    """Ask the kernel to read a whole file into the page cache"""
+    try:
+        fd = os.open(file, os.O_RDONLY)
+    except OSError as err:
+        # The program may have been updated or removed since the session was saved
+        logger.debug("Can't prefetch %s: %s", file, err)
+        return
+
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
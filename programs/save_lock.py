@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import time
+from pathlib import Path
+from typing import IO, TYPE_CHECKING
+
+import constants
+import utils
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+# Type alias for JSON
+JSON = utils.JSON
+
+logger = utils.get_logger()
+
+
+class SaveError(Exception):
+    pass
+
+
+def single_flight(
+    save: Callable[[], None], workspace_names: list[str] | None = None, force: bool = False
+) -> None:
+    """
+    Save the session in i3_PATH without overlapping any other save of it (such as a manual save
+    during an automatic one), so the saved files are never written by two saves at once.
+
+    A save requested while another is running waits for it and then saves once more, as the session
+    may have changed since the running save started. Saves requested while one is already queued
+    like this share the queued save's result instead of saving again, as long as the queued save
+    covers the same workspaces. Saves are numbered in the order they are queued and the result of
+    each is recorded by its number, so a save that joined the queued save reads that save's result
+    even when newer saves ran since. If the queued save was killed before it finished, the save
+    that joined it saves the session itself.
+
+    Waiting for other saves is bounded by the deadline (see utils.deadline), so a save with a
+    deadline can't wait forever behind a save that is stuck or starved of CPU time. SaveError is
+    raised once the deadline passes.
+    """
+    i3_path = Path(utils.i3_PATH)
+    i3_path.mkdir(parents=True, exist_ok=True)
+    request = {"workspaces": workspace_names, "force": force}
+
+    with (i3_path / constants.SAVE_QUEUE_FILE_NAME).open("a+") as queue_file:
+        while True:
+            queued, generation = join_queue(queue_file, request)
+            if queued:
+                break
+
+            if wait_for_queued_save(queue_file, generation):
+                return
+
+        with (i3_path / constants.SAVE_LOCK_FILE_NAME).open("a+") as lock_file:
+            if not try_lock(lock_file, fcntl.LOCK_EX):
+                logger.info("Another save is running. Saving again once it finishes")
+                wait_for_lock(lock_file, fcntl.LOCK_EX)
+
+            results = read_results(lock_file)
+            results[str(generation)] = "running"
+            write_file(lock_file, json.dumps(results))
+
+            # This save has started, so the next save can queue up behind it
+            write_file(queue_file, json.dumps({"generation": generation, "request": None}))
+            fcntl.flock(queue_file, fcntl.LOCK_UN)
+
+            status = "failed"
+            try:
+                save()
+                status = "succeeded"
+            finally:
+                results[str(generation)] = status
+                kept_results = list(results.items())[-constants.SAVE_RESULTS_KEPT :]
+                write_file(lock_file, json.dumps(dict(kept_results)))
+
+
+def join_queue(queue_file: IO[str], request: JSON) -> tuple[bool, int]:
+    """
+    Queue a save behind the running one. Returns whether the save was queued and the number of the
+    queued save. A save isn't queued when a save that covers the request is already queued, so the
+    request is coalesced with that save instead.
+    """
+    if not try_lock(queue_file, fcntl.LOCK_EX):
+        queued_save = read_queue(queue_file)
+        if (
+            queued_save is not None
+            and queued_save["request"] is not None
+            and covers_request(queued_save["request"], request)
+        ):
+            logger.info("A save is already queued. Waiting for its result instead of saving again")
+            return False, queued_save["generation"]
+
+        logger.info("A save of other workspaces is already queued. Saving once it finishes")
+        wait_for_lock(queue_file, fcntl.LOCK_EX)
+
+    # The queue keeps the number of the last queued save after it starts
+    previous_save = read_queue(queue_file)
+    generation = previous_save["generation"] + 1 if previous_save is not None else 1
+    write_file(queue_file, json.dumps({"generation": generation, "request": request}))
+    return True, generation
+
+
+def wait_for_queued_save(queue_file: IO[str], generation: int) -> bool:
+    """
+    Wait for the queued save with the number to finish. Returns true when it succeeded and false
+    when it didn't finish (it was killed), so the session still needs to be saved. An error is
+    raised when it failed.
+    """
+    # The queued save releases the queue once it starts saving
+    wait_for_lock(queue_file, fcntl.LOCK_SH)
+    fcntl.flock(queue_file, fcntl.LOCK_UN)
+
+    with (Path(queue_file.name).parent / constants.SAVE_LOCK_FILE_NAME).open("a+") as lock_file:
+        wait_for_lock(lock_file, fcntl.LOCK_SH)
+        status = read_results(lock_file).get(str(generation))
+
+    if status == "failed":
+        raise SaveError("The save this save was coalesced with failed")
+
+    if status != "succeeded":
+        # No save holds the lock anymore, so the queued save exited without recording its result
+        logger.info("The queued save didn't finish. Saving instead")
+        return False
+
+    logger.info("Saved by the queued save")
+    return True
+
+
+def try_lock(file: IO[str], operation: int) -> bool:
+    """Lock a file without waiting. Returns whether the lock was acquired"""
+    try:
+        fcntl.flock(file, operation | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+
+    return True
+
+
+def wait_for_lock(file: IO[str], operation: int) -> None:
+    """
+    Lock a file once the other saves release it. The lock is retried every
+    constants.SAVE_LOCK_RETRY_INTERVAL seconds until the deadline, at which point SaveError is
+    raised.
+    """
+    while not try_lock(file, operation):
+        timeout = utils.get_timeout()
+        if timeout == 0:
+            raise SaveError("Timed out waiting for another save to finish")
+
+        interval = constants.SAVE_LOCK_RETRY_INTERVAL
+        time.sleep(interval if timeout is None else min(interval, timeout))
+
+
+def read_queue(queue_file: IO[str]) -> JSON | None:
+    """
+    Read the number and request of the last queued save. The request is None once the save has
+    started. None is returned when nothing has been queued yet (or it is still being written).
+    """
+    queue_file.seek(0)
+    try:
+        return json.loads(queue_file.read())
+    except json.JSONDecodeError:
+        return None
+
+
+def read_results(lock_file: IO[str]) -> JSON:
+    """Read the result of each recent save by its number"""
+    lock_file.seek(0)
+    try:
+        return json.loads(lock_file.read())
+    except json.JSONDecodeError:
+        return {}
+
+
+def covers_request(queued_request: JSON, request: JSON) -> bool:
+    """Check if a queued save saves everything a request would"""
+    if request["force"] and not queued_request["force"]:
+        return False
+
+    if queued_request["workspaces"] is None:
+        return True
+
+    return request["workspaces"] is not None and set(request["workspaces"]) <= set(
+        queued_request["workspaces"]
+    )
+
+
+def write_file(file: IO[str], contents: str) -> None:
+    file.seek(0)
+    file.truncate()
+    file.write(contents)
+    file.flush()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+import constants
+import ipc
+import utils
+
+# Type alias for JSON
+JSON = utils.JSON
+# A launch is identified by its workspace's name and its container's index in the workspace
+LaunchID = tuple[str, int]
+
+logger = utils.get_logger()
+
+
+def get_pressure(resource: str) -> float | None:
+    """
+    Get the percentage of time (over the last 10 seconds) some tasks were stalled waiting for a
+    resource. Returns None if pressure stall information is not available on this system.
+    """
+    try:
+        pressure = (Path(constants.PRESSURE_DIR) / resource).read_text()
+    except OSError:
+        return None
+
+    match = re.search(r"^some avg10=([\d.]+)", pressure, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def get_system_load() -> tuple[float, float]:
+    """
+    Get the load average per CPU and the highest CPU or IO pressure stall percentage. The pressure
+    is 0 if pressure stall information is not available.
+    """
+    load = os.getloadavg()[0] / (os.cpu_count() or 1)
+    pressures = [get_pressure("cpu"), get_pressure("io")]
+    pressure = max((p for p in pressures if p is not None), default=0.0)
+    return load, pressure
+
+
+def get_launch_limit() -> int:
+    """
+    Get how many containers can be launched at once based on the current load average and CPU and
+    IO pressure. Fewer containers are launched at once the more loaded the system is.
+    """
+    cpus = os.cpu_count() or 1
+    load, pressure = get_system_load()
+
+    if load >= constants.LAUNCH_LOAD_HIGH or pressure >= constants.LAUNCH_PRESSURE_HIGH:
+        limit = 1
+    elif load >= constants.LAUNCH_LOAD_MODERATE or pressure >= constants.LAUNCH_PRESSURE_MODERATE:
+        limit = max(cpus // 2, 1)
+    else:
+        limit = cpus
+
+    logger.debug("Load: %.2f per CPU, pressure: %.2f%%. Launch limit: %s", load, pressure, limit)
+    return limit
+
+
+def get_startup_times_file() -> Path:
+    return Path(utils.i3_PATH) / constants.STARTUP_TIMES_FILE_NAME
+
+
+def load_startup_times() -> dict[str, float]:
+    """Load the learned startup time (in seconds) of each window class"""
+    try:
+        with get_startup_times_file().open() as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+class LaunchScheduler:
+    """
+    Limits how many containers are launched at once. A launch is in flight from when its container
+    is launched until a window with its class appears (or it times out). The number of launches in
+    flight is limited by the system load and by the limit for each window class. Containers of the
+    same class are launched one at a time unless a higher limit is configured, so they are restored
+    in order. Containers of an unknown class (such as from plans saved before window classes were
+    recorded) are launched one at a time too, and any new window finishes their launch.
+
+    How long each window class takes to start is learned from the launches, so programs that are
+    slow to start get more time before they time out and are launched first. The window that
+    finished each launch is recorded by its launch ID, so the restore knows which placeholder each
+    window belongs in.
+    """
+
+    def __init__(self, class_limits: dict[str, int]) -> None:
+        self.class_limits = class_limits
+        # The class, launch time, deadline, and launch ID of each launch in flight, oldest first
+        self.in_flight: list[tuple[str | None, float, float, LaunchID | None]] = []
+        # The launches that timed out before their window appeared
+        self.expired: list[tuple[str | None, float, float, LaunchID | None]] = []
+        # The window ID of each finished launch by its launch ID
+        self.windows: dict[LaunchID, int] = {}
+        self.startup_times = load_startup_times()
+
+        # Window events are received on their own connection so they aren't skipped while waiting
+        # for the replies to commands
+        self.events = ipc.Connection()
+        self.events.subscribe(["window"])
+
+    def close(self) -> None:
+        self.events.close()
+
+    def save_startup_times(self) -> None:
+        """Save the learned startup times for the next restore"""
+        startup_times_file = get_startup_times_file()
+        temp_file = startup_times_file.with_name(f"{startup_times_file.name}.tmp")
+        with temp_file.open("w") as f:
+            json.dump(self.startup_times, f)
+
+        os.replace(temp_file, startup_times_file)
+
+    def get_launch_order(self, window_classes: list[str | None]) -> list[int]:
+        """
+        Get the order to launch containers in (as indexes into the window classes). Programs that
+        take longer to start are launched first so they start while the faster ones are launched.
+        Containers of the same class keep their order, so their windows fill the layout's
+        placeholders in order.
+        """
+        return sorted(
+            range(len(window_classes)),
+            key=lambda i: -self.startup_times.get(window_classes[i], 0),
+        )
+
+    def get_launch_timeout(self, window_class: str | None) -> float:
+        """Get how long to wait for the window of a launched container"""
+        startup_time = self.startup_times.get(window_class)
+        if startup_time is None:
+            return constants.LAUNCH_TIMEOUT
+
+        timeout = startup_time * constants.LAUNCH_TIMEOUT_FACTOR
+        return min(max(timeout, constants.LAUNCH_TIMEOUT_MIN), constants.LAUNCH_TIMEOUT_MAX)
+
+    def wait_for_slot(self, window_class: str | None) -> None:
+        """Wait until a container with the window class can be launched"""
+        while not self._can_launch(window_class):
+            self._wait_for_window()
+
+    def add(self, window_class: str | None, launch_id: LaunchID | None = None) -> None:
+        """Track a container that was just launched. Its window is recorded by the launch ID"""
+        now = time.monotonic()
+        deadline = now + self.get_launch_timeout(window_class)
+        self.in_flight.append((window_class, now, deadline, launch_id))
+
+    def wait_for_all(self) -> None:
+        """Wait until every launched container's window appeared (or timed out)"""
+        while self.in_flight:
+            self._wait_for_window()
+
+    def wait_for_late_windows(self) -> None:
+        """
+        Wait up to constants.LATE_WINDOW_TIMEOUT seconds for the windows of the launches that timed
+        out. Their placeholders are still empty, so the windows that appear are swallowed by them
+        instead of the placeholders being removed as empty.
+        """
+        if not self.expired:
+            return
+
+        logger.info("Waiting for the windows of %s launches that timed out", len(self.expired))
+        deadline = time.monotonic() + constants.LATE_WINDOW_TIMEOUT
+        self.in_flight += [
+            (window_class, launched_at, deadline, launch_id)
+            for window_class, launched_at, _, launch_id in self.expired
+        ]
+        self.expired = []
+        self.wait_for_all()
+
+    def _can_launch(self, window_class: str | None) -> bool:
+        self._expire_launches()
+
+        if len(self.in_flight) >= get_launch_limit():
+            return False
+
+        class_limit = self.class_limits.get(window_class, constants.LAUNCH_CLASS_LIMIT)
+        launches = sum(1 for launch in self.in_flight if launch[0] == window_class)
+        return launches < class_limit
+
+    def _wait_for_window(self) -> None:
+        """
+        Wait for a new window and finish the oldest launch in flight with its class, or the launch
+        of an unknown class when there is no launch with its class. Returns when the next launch in
+        flight times out if no window appears. Launches time out at different times, as each window
+        class has its own timeout.
+        """
+        timeout = 0
+        if self.in_flight:
+            timeout = max(min(launch[2] for launch in self.in_flight) - time.monotonic(), 0)
+        event = self.events.receive_event(timeout)
+        self._expire_launches()
+        if event is None:
+            return
+
+        _, window_event = event
+        if window_event.get("change") != "new":
+            return
+
+        window_class = window_event["container"].get("window_properties", {}).get("class")
+        launch_classes = [launch[0] for launch in self.in_flight]
+        if window_class not in launch_classes:
+            window_class = None
+
+        if window_class in launch_classes:
+            _, launched_at, _, launch_id = self.in_flight.pop(launch_classes.index(window_class))
+            self._learn_startup_time(window_class, time.monotonic() - launched_at)
+            if launch_id is not None:
+                self.windows[launch_id] = window_event["container"].get("window")
+
+    def _learn_startup_time(self, window_class: str | None, startup_time: float) -> None:
+        if window_class is None:
+            return
+
+        logger.debug("%s started in %.2f seconds", window_class, startup_time)
+        learned_time = self.startup_times.get(window_class)
+        if learned_time is not None:
+            startup_time = learned_time + constants.STARTUP_TIME_WEIGHT * (
+                startup_time - learned_time
+            )
+
+        self.startup_times[window_class] = startup_time
+
+    def _expire_launches(self) -> None:
+        now = time.monotonic()
+        expired = [launch for launch in self.in_flight if launch[2] <= now]
+        for launch_class, _, _, _ in expired:
+            logger.info("No window appeared for launched %s container. Continuing", launch_class)
+
+        self.expired += expired
+        self.in_flight = [launch for launch in self.in_flight if launch[2] > now]
@@ -0,0 +1,158 @@
+"""
+A compact model of the i3 tree. The tree i3 sends contains many fields i3-restore never uses (such
+as the rects, gaps, and the properties of every container), so it is parsed into nodes that only
+keep the fields saving and restoring need. Nodes are created while the JSON is decoded, so the full
+dictionaries of containers never exist at the same time.
+
+The tree is always traversed iteratively, so deeply nested trees can't hit the recursion limit.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+# Type alias for JSON. This can't come from utils because utils parses the tree with this module.
+JSON = dict[str, Any]
+
+# The window properties that are kept. These are the swallow criteria of saved layouts, and the
+# class is also used to find the plugin of a window.
+WINDOW_PROPERTIES = ("class", "instance", "machine", "title", "window_role")
+
+
+class Node:
+    """A container in the i3 tree (including outputs and workspaces)"""
+
+    __slots__ = (
+        "border",
+        "current_border_width",
+        "current_workspace",
+        "floating",
+        "floating_nodes",
+        "focus",
+        "focused",
+        "focused_workspace",
+        "fullscreen_mode",
+        "geometry",
+        "id",
+        "layout",
+        "marks",
+        "name",
+        "nodes",
+        "output",
+        "percent",
+        "rect",
+        "swallows",
+        "type",
+        "visible",
+        "window",
+        "window_properties",
+    )
+
+    def __init__(self, properties: JSON) -> None:
+        self.id = properties.get("id")
+        self.type = properties.get("type")
+        self.name = properties.get("name")
+        self.layout = properties.get("layout")
+        self.border = properties.get("border")
+        self.current_border_width = properties.get("current_border_width")
+        self.floating = properties.get("floating")
+        self.fullscreen_mode = properties.get("fullscreen_mode")
+        self.percent = properties.get("percent")
+        self.geometry = properties.get("geometry")
+        # Only the position of floating containers is restored
+        self.rect = properties.get("rect") if self.type == "floating_con" else None
+        self.marks = properties.get("marks")
+        self.focused = properties.get("focused", False)
+        self.focus = properties.get("focus", [])
+        self.window = properties.get("window")
+        self.swallows = properties.get("swallows", [])
+        self.current_workspace = properties.get("current_workspace")
+        self.nodes = properties.get("nodes", [])
+        self.floating_nodes = properties.get("floating_nodes", [])
+
+        window_properties = properties.get("window_properties") or {}
+        self.window_properties = {
+            prop: window_properties[prop] for prop in WINDOW_PROPERTIES if prop in window_properties
+        }
+
+        # Only set on workspaces by utils.get_workspaces
+        self.output = None
+        self.visible = False
+        self.focused_workspace = False
+
+    def __repr__(self) -> str:
+        # Children are only counted so logging a node never walks the whole tree
+        return (
+            f"Node(type={self.type!r}, name={self.name!r}, window={self.window!r}, "
+            f"nodes={len(self.nodes)}, floating_nodes={len(self.floating_nodes)})"
+        )
+
+
+def to_node(obj: JSON) -> Node | JSON:
+    """
+    Convert a decoded JSON object into a node if it is a container. Every container has a 'nodes'
+    key, while other objects (such as rects and window properties) don't. Used as the object_hook
+    when decoding the tree.
+    """
+    if "nodes" in obj:
+        return Node(obj)
+
+    return obj
+
+
+def parse_tree(data: str | bytes) -> Node:
+    return json.loads(data, object_hook=to_node)
+
+
+def iter_nodes(root: Node) -> Iterator[Node]:
+    """Iterate over a node and all its descendants (including floating nodes) in tree order"""
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        yield node
+        # Reversed so the nodes are iterated in the same order as they are in the tree
+        nodes.extend(reversed(node.nodes + node.floating_nodes))
+
+
+def iter_leaves(root: Node) -> Iterator[Node]:
+    """Iterate over the tiling leaf containers under a node in tree order"""
+    nodes = list(reversed(root.nodes))
+    while nodes:
+        node = nodes.pop()
+        if node.nodes:
+            nodes.extend(reversed(node.nodes))
+        else:
+            yield node
+
+
+def merkle_hash(root: Node, get_content: Callable[[Node], bytes]) -> str:
+    """
+    Hash a node and all its descendants. The hash of each node covers its content (from
+    get_content) and the hashes of its children, so any change anywhere in the subtree changes the
+    hash of the root.
+    """
+    digests = {}
+    nodes = [(root, False)]
+    while nodes:
+        node, children_hashed = nodes.pop()
+        children = node.nodes + node.floating_nodes
+        if not children_hashed:
+            # The node is hashed after all its children are
+            nodes.append((node, True))
+            nodes.extend((child, False) for child in children)
+            continue
+
+        # The number of tiling nodes is included so moving a container between the tiling and
+        # floating nodes changes the hash
+        node_hash = hashlib.sha256(f"{len(node.nodes)}:".encode() + get_content(node))
+        for child in children:
+            node_hash.update(digests.pop(id(child)))
+
+        digests[id(node)] = node_hash.digest()
+
+    return digests[id(root)].hex()
@@ -1,47 +1,119 @@
-import json
+import atexit
+import contextlib
 import logging
+import logging.handlers
+import multiprocessing
 import os
+import queue
+import reprlib
 import subprocess
 import sys
+import time
+from collections.abc import Iterator
+from pathlib import Path
 from typing import Any, ClassVar
 
+import psutil
+
 import constants
+import tree
 
 # Get path where layouts were saved. Sets a default if the environment variable isn't set
 HOME = os.getenv("HOME")
 i3_PATH = os.getenv("i3_PATH", f"{HOME}/.config/i3")  # noqa: N816
 
+PROJECT_DIR = os.path.dirname(os.path.dirname(__file__))
+
 # Type alias for JSON
 JSON = dict[str, Any]
 
+# The times (from time.monotonic) subprocesses must finish by. The earliest deadline applies.
+_deadlines = []
+
+# The logger get_logger sets up. Used by the functions here that other modules call while saving.
+_logger = logging.getLogger("i3-restore")
+
+# The start and end (from time.monotonic) of the time budget for the current save, if any
+_budget = None
+# The optional work that was skipped because the time budget was running out
+_skipped_work = []
 
-def get_workspaces() -> list[JSON]:
+# The children of each process (by the parent's PID) in the snapshot of the process table taken for
+# the save, if any
+_process_children: dict[int, list[psutil.Process]] = {}
+
+
+def get_workspaces() -> list[tree.Node]:
     """
     Retrieve a list of all workspaces currently active along with their
-    trees that contain all the containers on each workspace.
+    trees that contain all the containers on each workspace. The name of
+    the output each workspace is on is set in the workspace's "output"
+    attribute. Whether the workspace is visible on its output and whether
+    it is the focused workspace are set in the "visible" and
+    "focused_workspace" attributes.
     """
     all_workspaces = []
 
-    tree = get_tree()
+    root = get_tree()
+
+    # The first ID in a container's focus list is its focused child, so this is the focused output
+    focused_output_id = root.focus[0] if root.focus else None
 
     # Remove the first output as it is not wanted
-    outputs = tree["nodes"][1:]
+    outputs = root.nodes[1:]
 
     for output in outputs:
-        dockareas = output["nodes"]
+        dockareas = output.nodes
         for dockarea in dockareas:
-            if dockarea["type"] == "con":
-                workspaces = dockarea["nodes"]
+            if dockarea.type == "con":
+                workspaces = dockarea.nodes
                 for workspace in workspaces:
+                    workspace.output = output.name
+                    workspace.visible = workspace.name == output.current_workspace
+                    workspace.focused_workspace = (
+                        workspace.visible and output.id == focused_output_id
+                    )
                     all_workspaces.append(workspace)
 
     return all_workspaces
 
 
-def get_tree() -> JSON:
+def get_tree() -> tree.Node:
     """Get the current active i3 tree"""
-    tree = subprocess.check_output(["i3-msg", "-t", "get_tree"]).decode("utf-8")
-    return json.loads(tree)
+    output = subprocess.check_output(["i3-msg", "-t", "get_tree"], timeout=get_essential_timeout())
+    return tree.parse_tree(output)
+
+
+def write_script(file: Path, commands: str) -> None:
+    """Write an executable Bash script, so it doesn't need to be made executable when restoring"""
+    with file.open("w") as f:
+        f.write("#!/usr/bin/env bash\n" + commands)
+
+    file.chmod(0o755)
+
+
+def get_version() -> str:
+    with open(f"{PROJECT_DIR}/{constants.VERSION_FILE_NAME}") as file:
+        version = file.read().strip()
+
+    return f"i3-restore v{version}"
+
+
+def display_error(message: str, show_log_buttons: bool = False) -> None:
+    """
+    Display an error to the user using i3-nagbar. The nagbar is started in the background so the
+    script doesn't wait for it to be closed.
+    """
+    args = ["i3-nagbar", "-m", f"i3-restore: {message}", "-t", "error"]
+
+    if show_log_buttons:
+        log_file = os.getenv("I3_RESTORE_LOG_FILE", f"{PROJECT_DIR}/{constants.DEFAULT_LOG_FILE}")
+        args += ["-b", "View Logs", f"i3-sensible-editor {log_file}"]
+        args += ["-b", "Run Manually", f"{PROJECT_DIR}/i3-save"]
+
+    subprocess.Popen(
+        args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
 
 
 # Custom logging formatter to add prefixes to debug messages
@@ -54,9 +126,107 @@ class Formatter(logging.Formatter):  # pragma: no cover
         return formatter.format(record)
 
 
+class LogPayload:
+    """
+    Wrap a large debug payload (such as a workspace tree) so it is only serialized when the log
+    record is actually emitted, and never with more than LOG_PAYLOAD_MAX_CHARS characters.
+    """
+
+    # Limits nested containers while they are being serialized, so huge trees are never fully
+    # walked just to be cut off afterwards
+    _repr = reprlib.Repr()
+    _repr.maxlevel = 8
+    _repr.maxdict = 32
+    _repr.maxlist = 32
+    _repr.maxstring = 256
+    _repr.maxother = 256
+
+    def __init__(self, payload: Any) -> None:
+        self.payload = payload
+
+    def __str__(self) -> str:
+        if isinstance(self.payload, str):
+            text = self.payload
+        else:
+            text = self._repr.repr(self.payload)
+
+        if len(text) <= constants.LOG_PAYLOAD_MAX_CHARS:
+            return text
+
+        truncated_chars = len(text) - constants.LOG_PAYLOAD_MAX_CHARS
+        return f"{text[: constants.LOG_PAYLOAD_MAX_CHARS]}... ({truncated_chars} more characters)"
+
+
+# Writes the queued log records to the file and stream handlers in a background thread so logging
+# never blocks the caller
+_log_listener = None
+# Writes the log records that processes forked from this one send through a shared queue, with the
+# handlers of _log_listener
+_forked_log_listener = None
+
+
+class _SharedQueueHandler(logging.handlers.QueueHandler):
+    """Sends log records through a queue shared with the process this one was forked from"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.queue.put(record)
+
+
+class _SharedQueueListener(logging.handlers.QueueListener):
+    """Writes the log records that forked processes send through a shared queue"""
+
+    def dequeue(self, block: bool) -> logging.LogRecord | None:  # noqa: ARG002
+        return self.queue.get()
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class _SharedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotates a log file that other processes write to as well (such as auto_save.py, the saves it
+    starts, and the Bash scripts, which rotate it when they start). The file is reopened when
+    another process already rotated it instead of rotating it again, which would replace the old
+    log file with only the newest records.
+    """
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:  # noqa: N802
+        self._reopen_if_rotated()
+        return super().shouldRollover(record)
+
+    def doRollover(self) -> None:  # noqa: N802
+        # Another process may have rotated the file since it was checked
+        if not self._reopen_if_rotated():
+            super().doRollover()
+
+    def _reopen_if_rotated(self) -> bool:
+        """Reopen the log file if another process rotated it. Returns whether it was reopened"""
+        if self.stream is None:
+            return False
+
+        opened_file = os.fstat(self.stream.fileno())
+        try:
+            log_file = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            rotated = True
+        else:
+            rotated = (log_file.st_dev, log_file.st_ino) != (opened_file.st_dev, opened_file.st_ino)
+
+        if rotated:
+            self.stream.close()
+            self.stream = self._open()
+
+        return rotated
+
+
 def get_logger() -> logging.Logger:
-    project_dir = os.path.dirname(os.path.dirname(__file__))
-    log_file = os.getenv("I3_RESTORE_LOG_FILE", f"{project_dir}/{constants.DEFAULT_LOG_FILE}")
+    global _log_listener
+
+    log_file = os.getenv("I3_RESTORE_LOG_FILE", f"{PROJECT_DIR}/{constants.DEFAULT_LOG_FILE}")
+    old_log_file = os.getenv(
+        "I3_RESTORE_LOG_FILE_OLD", f"{PROJECT_DIR}/{constants.DEFAULT_OLD_LOG_FILE}"
+    )
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
 
     logger = logging.getLogger("i3-restore")
     logger.handlers = []  # Ensure there are no handlers before adding our own
@@ -64,7 +234,11 @@ def get_logger() -> logging.Logger:
 
     formatter = logging.Formatter("%(asctime)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
 
-    file_handler = logging.FileHandler(log_file)
+    # Rotate into the same old log file the Bash scripts rotate into
+    file_handler = _SharedRotatingFileHandler(
+        log_file, maxBytes=constants.LOG_FILE_MAX_BYTES, backupCount=1
+    )
+    file_handler.namer = lambda _: old_log_file
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging.INFO)
 
@@ -82,12 +256,211 @@ def get_logger() -> logging.Logger:
 
     stream_handler.setLevel(log_level)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+    stop_log_listener()
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Drop records no handler would emit before they are formatted, so debug payloads are never
+    # serialized unless they are going to be logged
+    queue_handler.setLevel(min(file_handler.level, stream_handler.level))
+
+    _log_listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
+    )
+    _log_listener.start()
+
+    logger.addHandler(queue_handler)
 
     return logger
 
 
+def stop_log_listener() -> None:
+    """Flush all queued log records and close the log handlers"""
+    global _log_listener
+    if _log_listener is None:
+        return
+
+    _log_listener.stop()
+    for handler in _log_listener.handlers:
+        handler.close()
+
+    _log_listener = None
+
+
+atexit.register(stop_log_listener)
+
+
+def start_forked_log_listener() -> multiprocessing.SimpleQueue:
+    """
+    Write the log records of the processes forked from this one with this process's log handlers,
+    so only this process opens and rotates the log file. Returns the queue the forked processes
+    send their records through (see log_to_queue).
+    """
+    global _forked_log_listener
+    log_queue = multiprocessing.SimpleQueue()
+    _forked_log_listener = _SharedQueueListener(
+        log_queue, *_log_listener.handlers, respect_handler_level=True
+    )
+    _forked_log_listener.start()
+    return log_queue
+
+
+def stop_forked_log_listener() -> None:
+    """Write the remaining log records of the forked processes. They must have all exited"""
+    global _forked_log_listener
+    _forked_log_listener.stop()
+    _forked_log_listener = None
+
+
+def log_to_queue(log_queue: multiprocessing.SimpleQueue) -> None:
+    """
+    Send the log records of a forked process through the queue from start_forked_log_listener
+    instead of writing them itself. The log file may not be writable once the process switches to
+    another user, and it can only be rotated safely by one process.
+    """
+    global _log_listener
+    queue_handler = _SharedQueueHandler(log_queue)
+    queue_handler.setLevel(min(handler.level for handler in _log_listener.handlers))
+
+    # The listener's thread only runs in the process this one was forked from
+    _log_listener = None
+    logging.getLogger("i3-restore").handlers = [queue_handler]
+
+
+@contextlib.contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """
+    Limit how long the subprocesses run inside the context can take in total. Only subprocesses
+    that pass get_timeout() as their timeout are bounded, and the Python code inside the context is
+    never interrupted. Deadlines can be nested, in which case the earliest deadline applies.
+    """
+    if seconds is None:
+        yield
+        return
+
+    _deadlines.append(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadlines.pop()
+
+
+def get_timeout() -> float | None:
+    """
+    Get the time (in seconds) left until the earliest deadline. This is passed as the timeout to
+    subprocesses, so None is returned when there is no deadline.
+    """
+    if not _deadlines:
+        return None
+
+    return max(min(_deadlines) - time.monotonic(), 0)
+
+
+def get_essential_timeout() -> float | None:
+    """
+    Get the timeout for subprocesses that can't be skipped. They can use the time left until the
+    earliest deadline, but always get at least constants.ESSENTIAL_COMMAND_TIMEOUT seconds.
+    """
+    timeout = get_timeout()
+    if timeout is None:
+        return None
+
+    return max(timeout, constants.ESSENTIAL_COMMAND_TIMEOUT)
+
+
+@contextlib.contextmanager
+def budget(seconds: float | None) -> Iterator[None]:
+    """
+    Set a time budget for the work done inside the context. Optional work is skipped as the budget
+    runs out (see should_skip) and subprocesses must finish before the budget ends.
+    """
+    global _budget
+    if seconds is None:
+        yield
+        return
+
+    start = time.monotonic()
+    _budget = (start, start + seconds)
+    _skipped_work.clear()
+    try:
+        with deadline(seconds):
+            yield
+    finally:
+        _budget = None
+        if _skipped_work:
+            _logger.warning("Skipped to finish within %ss: %s", seconds, ", ".join(_skipped_work))
+
+
+def has_skipped_work() -> bool:
+    """Check if any optional work was skipped to finish within the time budget"""
+    return bool(_skipped_work)
+
+
+def should_skip(work: str) -> bool:
+    """
+    Check if optional work should be skipped to finish within the time budget. Each kind of work in
+    constants.BUDGET_TIERS is skipped once less than its fraction of the budget is left, so the
+    least important work is dropped first.
+    """
+    if _budget is None:
+        return False
+
+    start, end = _budget
+    left = end - time.monotonic()
+    if left >= constants.BUDGET_TIERS[work] * (end - start):
+        return False
+
+    if work not in _skipped_work:
+        _logger.warning("%.2fs left to save. Skipping %s from now on", max(left, 0), work)
+        _skipped_work.append(work)
+
+    return True
+
+
+def snapshot_processes() -> list[psutil.Process]:
+    """
+    Take a snapshot of the process table. The processes' children are looked up in it (see
+    get_children) instead of scanning every process in /proc again each time, which is what
+    psutil.Process.children does.
+    """
+    processes = list(psutil.process_iter(["ppid", "name"]))
+
+    _process_children.clear()
+    _process_children.update({process.pid: [] for process in processes})
+    for process in processes:
+        _process_children.setdefault(process.info["ppid"], []).append(process)
+
+    return processes
+
+
+def get_children(process: psutil.Process, recursive: bool = False) -> list[psutil.Process]:
+    """
+    Get the children of a process from the process table snapshot, in the same order as
+    psutil.Process.children. psutil is used directly when the process isn't in the snapshot (such
+    as when it started after the snapshot was taken, or no snapshot was taken).
+    """
+    if process.pid not in _process_children:
+        return process.children(recursive=recursive)
+
+    children = []
+    parents = [process.pid]
+    while parents:
+        parent = parents.pop()
+        for child in _process_children.get(parent, []):
+            try:
+                # The PID may have been reused by a process started after the parent exited
+                if child.create_time() < process.create_time():
+                    continue
+            except psutil.Error:
+                continue
+
+            children.append(child)
+            if recursive:
+                parents.append(child.pid)
+
+    return children
+
+
 # Custom exception for when a plugin fails to save a container.
 class PluginSaveError(Exception):
     pass
@@ -34,65 +34,9 @@ setup() {
     assert_output "$((DEFAULT_INTERVAL_TIME * 60))"
 }
 
-@test "check_i3_alive: i3 process alive" {
-    # shellcheck disable=SC2329
-    ps() {
-        # Only override the parameters we are using in check_dependencies
-        if [[ $1 == "--pid" ]] && [[ $2 == 123 ]]; then
-            echo "PID TTY          TIME CMD"
-            echo "100 tty1     00:00:01 i3"
-        else
-            command ps "$@"
-        fi
-    }
-
-    # We need to inspect log output to see if the function behaves correctly
-    # shellcheck disable=SC2329
-    log() {
-        echo "LOG: $*"
-    }
-
-    run check_i3_alive 123
-
-    assert_success
-    # Even on failure, the function succeeds, so we need to check the output
-    refute_output --partial "Original i3 process is not alive anymore"
-}
-
-@test "check_i3_alive: i3 process dead exits with 0" {
-    ps() {
-        if [[ $1 == "--pid" ]] && [[ $2 == 123 ]]; then
-            echo "PID TTY          TIME CMD"
-        else
-            command ps "$@"
-        fi
-    }
-
-    # We need to inspect log output to see if the function behaves correctly
-    log() {
-        echo "LOG: $*"
-    }
-
-    run check_i3_alive 123
-
-    # Exits with 0 even if the i3 process is not found
-    assert_success
-    assert_output --partial "Original i3 process is not alive anymore"
-}
-
-@test "start_save_interval: saves the session on an interval until the i3 process is dead" {
-    export I3_RESTORE_INTERVAL_MINUTES=1
-
-    TEST_DIR="$(temp_make)"
-
-    # Make the mock 'i3-save' script so we can ensure it is called
-    cat >"$I3_RESTORE_SAVE_FILE" <<EOF
-#!/usr/bin/env bash
-echo "save called" >> $TEST_DIR/test-i3-save.log
-EOF
-    chmod +x "$I3_RESTORE_SAVE_FILE"
-
-    # Set up all the mock functions
+@test "start_save_interval: runs the automatic saving script with the interval in seconds" {
+    export I3_RESTORE_INTERVAL_MINUTES=2
+    export I3_RESTORE_VERBOSE=1
 
     get_sleep_time() {
         if [[ $1 -ne $I3_RESTORE_INTERVAL_MINUTES ]]; then
@@ -103,43 +47,30 @@ EOF
         echo "$((I3_RESTORE_INTERVAL_MINUTES * 60))"
     }
 
-    pidof() {
-        if [[ $1 == "i3" ]]; then
-            echo 1234
-        else
-            command pidof "$@"
-        fi
+    python3() {
+        echo "python3 $* (verbosity $I3_RESTORE_VERBOSE)"
     }
 
-    local call_count=0
-    check_i3_alive() {
-        if [[ $1 -ne 1234 ]]; then
-            echo "Unexpected PID in check_i3_alive: $1"
-            exit 1
-        fi
+    run start_save_interval
 
-        # Exit after 3 calls
-        [[ $call_count -ge 3 ]] && exit 0
+    assert_success
+    assert_output "python3 $I3_RESTORE_AUTO_SAVE_SCRIPT --interval 120 (verbosity 1)"
+}
 
-        ((call_count++))
+@test "start_save_interval: shows an error when automatic saving fails" {
+    export I3_RESTORE_INTERVAL_MINUTES=2
+    export I3_RESTORE_VERBOSE=0
+
+    python3() {
+        return 1
     }
 
-    # Simulate sleep and command execution
-    sleep() {
-        if [[ $1 -ne "$((I3_RESTORE_INTERVAL_MINUTES * 60))" ]]; then
-            echo "Unexpected sleep time in sleep: $1"
-            exit 1
-        fi
+    error() {
+        echo "ERROR: $1"
     }
 
     run start_save_interval
-    assert_success
 
-    # Make sure the save script was called the expected number of times
-    assert_equal "$(wc -l <"$TEST_DIR/test-i3-save.log")" 3
-
-    # This is a readonly variable, so we can't set it. We just have to remove it when it is done. This
-    # file is at libexec/bats-core/i3-save
-    rm -f "$I3_RESTORE_SAVE_FILE"
-    temp_del "$TEST_DIR"
+    assert_success
+    assert_output --partial "ERROR: An error occurred saving the session automatically"
 }
@@ -33,9 +33,6 @@ check_dependencies_mocks() {
 
         builtin command "$@"
     }
-
-    # shellcheck disable=SC2329
-    i3-save-tree() { echo "valid tree"; }
 }
 
 @test "version: includes the correct version" {
@@ -45,19 +42,12 @@ check_dependencies_mocks() {
 }
 
 @test "usage: prints usage for i3-restore" {
-    run usage i3-restore
+    run usage
     assert_success
     assert_output --partial "i3-restore [options]"
     assert_output --partial "--save-interval"
 }
 
-@test "usage: prints usage for i3-save" {
-    run usage i3-save
-    assert_success
-    assert_output --partial "i3-save [options]"
-    refute_output --partial "--save-interval"
-}
-
 @test "parse_flags: help flags trigger usage" {
     # shellcheck disable=SC2329
     usage() { echo "USAGE_CALLED"; }
@@ -101,6 +91,34 @@ check_dependencies_mocks() {
     assert_equal "$I3_RESTORE_INTERVAL_MINUTES" 10
 }
 
+@test "parse_flags: workspace flags select workspaces" {
+    parse_flags --workspace "1: web" --workspace 2
+    assert_equal "${#I3_RESTORE_WORKSPACES[@]}" 2
+    assert_equal "${I3_RESTORE_WORKSPACES[0]}" "1: web"
+    assert_equal "${I3_RESTORE_WORKSPACES[1]}" 2
+}
+
+@test "parse_flags: lazy flag enables lazy restoring" {
+    parse_flags --lazy
+    assert_equal "$I3_RESTORE_LAZY" 1
+}
+
+@test "parse_flags: batch layouts flag enables batching layouts" {
+    parse_flags --batch-layouts
+    assert_equal "$I3_RESTORE_BATCH_LAYOUTS" 1
+}
+
+@test "parse_flags: resume flag enables resuming the last restore" {
+    parse_flags --resume
+    assert_equal "$I3_RESTORE_RESUME" 1
+}
+
+@test "parse_flags: workspace flag without a name triggers error" {
+    run parse_flags --workspace
+    assert_failure
+    assert_output --partial "--workspace requires a workspace name"
+}
+
 @test "parse_flags: unknown flag triggers error" {
     usage() { echo "USAGE_CALLED"; }
 
@@ -163,13 +181,3 @@ check_dependencies_mocks() {
     assert_output --partial "ERROR"
     assert_output --partial "xdotool"
 }
-
-@test "check_dependencies: missing perl-anyevent-i3 triggers error" {
-    check_dependencies_mocks
-    i3-save-tree() { echo "Can't locate AnyEvent/I3.pm..."; }
-
-    run check_dependencies
-    assert_failure
-    assert_output --partial "ERROR"
-    assert_output --partial "perl-anyevent-i3"
-}
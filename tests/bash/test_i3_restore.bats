@@ -400,6 +400,35 @@ mock_i3_msg_exec_browsers() {
     assert_equal "$append_layout_calls" 1
 }
 
+@test "is_workspace_selected: selects every workspace by default" {
+    run is_workspace_selected "Workspace_1"
+    assert_success
+}
+
+@test "is_workspace_selected: only selects workspaces passed with --workspace" {
+    I3_RESTORE_WORKSPACES=("Workspace_1" "Workspace 2")
+
+    run is_workspace_selected "Workspace 2"
+    assert_success
+
+    run is_workspace_selected "Workspace_3"
+    assert_failure
+}
+
+@test "restore_workspace: skips workspaces that were not selected" {
+    I3_RESTORE_WORKSPACES=("Workspace 2")
+    local layout_file="$i3_PATH/workspace_Workspace_1_HDMI-1_layout.json"
+
+    # shellcheck disable=SC2329
+    restore_programs() {
+        echo "Unexpected restore_programs call: $*"
+        return 1
+    }
+
+    run restore_workspace "$layout_file"
+    assert_success
+}
+
 @test "kill_empty_containers: recursively kills empty containers" {
     local deleted_containers_log="$TEST_DIR/deleted_containers.log"
     create_i3_msg_script_mock "$deleted_containers_log"
@@ -509,6 +538,160 @@ mock_i3_msg_exec_browsers() {
     assert_equal "$(cat "$deleted_containers_log")" $'203\n201\n202'
 }
 
+@test "restore_workspaces: only restores selected workspaces and skips browsers" {
+    I3_RESTORE_WORKSPACES=("Workspace 2")
+    touch "$i3_PATH/workspace_Workspace_1_HDMI-1_layout.json"
+    touch "$i3_PATH/workspace_Workspace 2_HDMI-1_layout.json"
+    touch "$i3_PATH/web_browsers.sh"
+
+    local restored_files="$TEST_DIR/restored_files.log"
+    # shellcheck disable=SC2329
+    restore_workspace() {
+        echo "$1" >>"$restored_files"
+    }
+
+    local i3_msg_called=0
+    mock_i3_msg_exec_browsers "$i3_PATH/web_browsers.sh" i3_msg_called
+
+    local deleted_containers_log="$TEST_DIR/deleted_containers.log"
+    create_i3_msg_script_mock "$deleted_containers_log"
+
+    restore_workspaces
+
+    local status=$?
+    [[ $status -eq 0 ]] || fail "Expected success, got $status"
+
+    # restore_workspace skips the workspaces that weren't selected itself, so both are passed in
+    assert_equal "$(wc --lines <"$restored_files")" 2
+    assert_equal "$i3_msg_called" 0
+}
+
+@test "restore_workspaces_from_plan: runs the Python restore script with the selected workspaces" {
+    I3_RESTORE_WORKSPACES=("Workspace 1" "Workspace 2")
+
+    # shellcheck disable=SC2329
+    python3() {
+        echo "$*"
+    }
+
+    run restore_workspaces_from_plan
+
+    assert_success
+    assert_output "$I3_RESTORE_RESTORE_SCRIPT --workspace Workspace 1 --workspace Workspace 2"
+}
+
+@test "restore_workspaces_from_plan: restores lazily when enabled" {
+    # shellcheck disable=SC2034
+    I3_RESTORE_LAZY=1
+
+    # shellcheck disable=SC2329
+    python3() {
+        echo "$*"
+    }
+
+    run restore_workspaces_from_plan
+
+    assert_success
+    assert_output "$I3_RESTORE_RESTORE_SCRIPT --lazy"
+}
+
+@test "restore_workspaces_from_plan: batches layouts when enabled" {
+    # shellcheck disable=SC2034
+    I3_RESTORE_BATCH_LAYOUTS=1
+
+    # shellcheck disable=SC2329
+    python3() {
+        echo "$*"
+    }
+
+    run restore_workspaces_from_plan
+
+    assert_success
+    assert_output "$I3_RESTORE_RESTORE_SCRIPT --batch-layouts"
+}
+
+@test "restore_workspaces_from_plan: resumes the last restore when enabled" {
+    # shellcheck disable=SC2034
+    I3_RESTORE_RESUME=1
+
+    # shellcheck disable=SC2329
+    python3() {
+        echo "$*"
+    }
+
+    run restore_workspaces_from_plan
+
+    assert_success
+    assert_output "$I3_RESTORE_RESTORE_SCRIPT --resume"
+}
+
+@test "restore_workspaces: restores from the restore plan when one was saved" {
+    touch "$i3_PATH/restore_plan.json"
+    touch "$i3_PATH/workspace_1_HDMI-1_layout.json"
+    touch "$i3_PATH/web_browsers.sh"
+
+    local plan_restored=0
+    # shellcheck disable=SC2329
+    restore_workspaces_from_plan() {
+        plan_restored=1
+    }
+
+    # shellcheck disable=SC2329
+    restore_workspace() {
+        fail "Workspaces in a restore plan should not be restored from their files"
+    }
+
+    # shellcheck disable=SC2329
+    restore_browsers() {
+        fail "Web browsers in a restore plan should be restored by the restore script"
+    }
+
+    local deleted_containers_log="$TEST_DIR/deleted_containers.log"
+    create_i3_msg_script_mock "$deleted_containers_log"
+
+    local sleep_called=0
+    # shellcheck disable=SC2329
+    sleep() {
+        sleep_called=1
+    }
+
+    restore_workspaces
+
+    assert_equal "$plan_restored" 1
+    # The restore script already waits for every window to be swallowed
+    assert_equal "$sleep_called" 0
+}
+
+@test "start_lazy_restoring: does nothing when lazy restoring is disabled" {
+    # shellcheck disable=SC2034
+    I3_RESTORE_LAZY=0
+
+    # shellcheck disable=SC2329
+    python3() {
+        fail "The lazy workspaces should not be watched"
+    }
+
+    run start_lazy_restoring
+
+    assert_success
+}
+
+@test "start_lazy_restoring: watches the lazy workspaces in the background" {
+    # shellcheck disable=SC2034
+    I3_RESTORE_LAZY=1
+    local python_log="$TEST_DIR/python.log"
+
+    # shellcheck disable=SC2329
+    python3() {
+        echo "$*" >"$python_log"
+    }
+
+    start_lazy_restoring
+    wait
+
+    assert_equal "$(cat "$python_log")" "$I3_RESTORE_RESTORE_SCRIPT --watch-lazy"
+}
+
 @test "start_automatic_saving: does nothing when interval disabled" {
     local I3_RESTORE_INTERVAL=0
     local start_save_interval_calls=0
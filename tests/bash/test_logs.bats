@@ -11,7 +11,7 @@ setup() {
     export LOG_DIR="$TEST_DIR/logs"
     export I3_RESTORE_LOG_FILE="$LOG_DIR/test_i3_restore.log"
     export I3_RESTORE_LOG_FILE_OLD="$LOG_DIR/test_i3_restore_old.log"
-    export LOG_FILE_SIZE=5
+    export LOG_FILE_SIZE=20
 
     # shellcheck disable=SC2329
     version() {
@@ -44,7 +44,7 @@ teardown() {
     assert_file_not_exist "$I3_RESTORE_LOG_FILE_OLD"
 }
 
-@test "rotate_log: rotates log if line count exceeds limit" {
+@test "rotate_log: rotates log if size exceeds limit" {
     printf "line\n%.0s" {1..10} >"$I3_RESTORE_LOG_FILE"
     run rotate_log
     assert_success
@@ -0,0 +1,158 @@
+"""
+Kitty plugin benchmark. For each number of OS windows, a fake Kitty instance (see fake_kitty.py)
+serves synthetic trees, sessions, and scrollback, and every OS window is saved with
+plugins.kitty.main like i3-save does. The plugin runs `kitty @` for each command, which is the fake
+client in fake_kitty_client.py.
+
+For each instance, the benchmark reports:
+- Saved: the time to save every OS window of the instance
+- Per OS window: the average time to save one OS window
+- kitty @ calls: the number of remote control commands the plugin ran
+- Received: the amount of data the fake Kitty sent to the plugin
+
+Usage: python3 tests/benchmark/benchmark_kitty.py [--os-windows 1 4 16] [--tabs 4] [--windows 2]
+       [--scrollback 1000] [--old-sessions]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shlex
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_kitty import FakeKitty
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = BENCHMARK_DIR.parent.parent
+
+# The plugin is imported from i3-restore's own modules. The log messages from saving aren't needed.
+sys.path.insert(0, str(PROJECT_DIR / "programs"))
+os.environ.setdefault("I3_RESTORE_LOG_FILE", os.devnull)
+import utils
+from plugins import kitty
+
+# The PID in the name of the fake Kitty's listen socket
+KITTY_PID = 1000
+
+# The Kitty versions the fake client reports. Versions before 0.43.0 have no session output format,
+# so the plugin builds the sessions from the tree instead.
+NEW_KITTY_VERSION = "0.43.1"
+OLD_KITTY_VERSION = "0.42.0"
+
+
+class Container:
+    """The parts of i3_save.Container the Kitty plugin uses"""
+
+    def __init__(self, window_id: int) -> None:
+        self.pid = KITTY_PID
+        self.window_id = window_id
+        self.command = None
+        self.subprocess_command = None
+        self.working_directory = None
+
+    def check_if_subprocess(self, *_args: object) -> None:
+        # The shells in the fake Kitty don't run any programs that are saved as subprocesses
+        return
+
+
+def main() -> None:
+    args = parse_args()
+
+    print(
+        f"{'OS windows':>10} {'Windows':>8} {'Saved':>8} {'Per OS window':>14} "
+        f"{'kitty @ calls':>14} {'Received':>10}"
+    )
+    for os_windows in args.os_windows:
+        result = run_benchmark(
+            os_windows, args.tabs, args.windows, args.scrollback, args.old_sessions
+        )
+        print(
+            f"{os_windows:>10} {os_windows * args.tabs * args.windows:>8} "
+            f"{result['saved']:>7.2f}s {result['saved'] / os_windows * 1000:>12.1f}ms "
+            f"{result['calls']:>14} {result['received'] / 1024:>7.0f}KiB"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark saving Kitty with the Kitty plugin")
+    parser.add_argument(
+        "--os-windows",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16],
+        help="The number of OS windows of each benchmarked Kitty instance",
+    )
+    parser.add_argument("--tabs", type=int, default=4, help="The number of tabs in each OS window")
+    parser.add_argument("--windows", type=int, default=2, help="The number of windows in each tab")
+    parser.add_argument(
+        "--scrollback",
+        type=int,
+        default=1000,
+        help="The lines of scrollback in each window. With 0, scrollback isn't saved",
+    )
+    parser.add_argument(
+        "--old-sessions",
+        action="store_true",
+        help=f"Report Kitty {OLD_KITTY_VERSION}, so sessions are built from the tree instead of "
+        "retrieved with the session output format",
+    )
+
+    return parser.parse_args()
+
+
+def run_benchmark(
+    os_windows: int, tabs: int, windows: int, scrollback: int, old_sessions: bool = False
+) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        i3_path = temp_path / "i3"
+        i3_path.mkdir()
+        utils.i3_PATH = str(i3_path)
+
+        bin_path = temp_path / "bin"
+        bin_path.mkdir()
+        kitty_file = bin_path / "kitty"
+        client = shlex.quote(str(BENCHMARK_DIR / "fake_kitty_client.py"))
+        kitty_file.write_text(f'#!/bin/sh\nexec {shlex.quote(sys.executable)} {client} "$@"\n')
+        kitty_file.chmod(0o755)
+
+        os.environ["PATH"] = f"{bin_path}:{os.environ['PATH']}"
+        os.environ["FAKE_KITTY_VERSION"] = OLD_KITTY_VERSION if old_sessions else NEW_KITTY_VERSION
+
+        fake_kitty = FakeKitty(
+            temp_path / f"kitty-{KITTY_PID}", os_windows, tabs, windows, scrollback, os.getpid()
+        )
+        plugin_config = kitty.parse_config(
+            {
+                "listen_socket": f"unix:{temp_path}/kitty",
+                "scrollback": "all" if scrollback > 0 else "none",
+            }
+        )
+
+        # Every run starts like a new save
+        kitty._container_trees.clear()
+        kitty.USE_OLD_SESSION_SAVING = None
+
+        try:
+            start = time.monotonic()
+            for os_window in fake_kitty.tree:
+                kitty.main(Container(os_window["platform_window_id"]), plugin_config)
+            saved = time.monotonic() - start
+        finally:
+            fake_kitty.close()
+            os.environ["PATH"] = os.environ["PATH"].removeprefix(f"{bin_path}:")
+
+    return {
+        "saved": saved,
+        # The `kitty --version` the plugin runs once to choose how to save sessions isn't counted
+        "calls": sum(fake_kitty.requests.values()),
+        "received": fake_kitty.bytes_sent,
+    }
+
+
+if __name__ == "__main__":
+    main()
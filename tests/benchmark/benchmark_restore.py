@@ -0,0 +1,200 @@
+"""
+End-to-end restore benchmark. For each session size, a session is saved into a temporary i3_PATH
+and restored with programs/i3_restore.py against a fake i3 (see fake_i3.py). Each container runs a
+fake program that maps its window after a startup delay.
+
+For each session, the benchmark reports:
+- Time to first window: from starting the restore until the first window is mapped
+- Time to windows restored: from starting the restore until every window is mapped and
+  programs/i3_restore.py has finished. The rest of i3-restore (restoring web browsers, killing
+  empty containers, and restarting i3) isn't included as it needs a real i3
+- Forked processes: the number of processes forked on the system during the restore (from
+  /proc/stat), which includes the restore itself, every launched program, and helper programs
+
+Usage: python3 tests/benchmark/benchmark_restore.py [--workspaces 1 5 10] [--containers 4]
+       [--delay 0.2] [--batch-layouts]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_i3 import FakeI3
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = BENCHMARK_DIR.parent.parent
+
+# The session is saved with i3-restore's own modules so it matches what i3-save writes. The log
+# messages from saving the session aren't needed.
+sys.path.insert(0, str(PROJECT_DIR / "programs"))
+os.environ.setdefault("I3_RESTORE_LOG_FILE", os.devnull)
+import plan
+import tree
+import utils
+
+RESTORE_SCRIPT = PROJECT_DIR / "programs" / "i3_restore.py"
+OUTPUTS = ["HDMI-1", "DP-1"]
+
+# The time (in seconds) to wait for every window to be mapped after the restore finishes
+WINDOW_TIMEOUT = 30
+
+# Helper programs the restore runs. They are replaced with programs that do nothing as the
+# fake i3 has no X server.
+FAKE_HELPERS = ["xdotool"]
+
+
+def main() -> None:
+    args = parse_args()
+
+    print(
+        f"{'Workspaces':>10} {'Containers':>10} {'First window':>13} {'Windows restored':>17} "
+        f"{'Forks':>6}"
+    )
+    for num_workspaces in args.workspaces:
+        result = run_benchmark(num_workspaces, args.containers, args.delay, args.batch_layouts)
+        print(
+            f"{num_workspaces:>10} {num_workspaces * args.containers:>10} "
+            f"{result['first_window']:>12.2f}s {result['windows_restored']:>16.2f}s "
+            f"{result['forks'] if result['forks'] is not None else '-':>6}"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark restoring sessions of varying size")
+    parser.add_argument(
+        "--workspaces",
+        type=int,
+        nargs="+",
+        default=[1, 5, 10],
+        help="The number of workspaces in each benchmarked session",
+    )
+    parser.add_argument(
+        "--containers", type=int, default=4, help="The number of containers on each workspace"
+    )
+    parser.add_argument(
+        "--delay",
+        type=float,
+        default=0.2,
+        help="The time (in seconds) each fake program takes to map its window",
+    )
+    parser.add_argument(
+        "--batch-layouts",
+        action="store_true",
+        help="Restore with --batch-layouts, which appends every layout with a single command",
+    )
+
+    return parser.parse_args()
+
+
+def run_benchmark(
+    num_workspaces: int, num_containers: int, delay: float, batch_layouts: bool = False
+) -> dict[str, float | None]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        i3_path = temp_path / "i3"
+        i3_path.mkdir()
+        create_session(i3_path, num_workspaces, num_containers, delay)
+
+        bin_path = temp_path / "bin"
+        bin_path.mkdir()
+        for helper in FAKE_HELPERS:
+            helper_file = bin_path / helper
+            helper_file.write_text("#!/bin/sh\n")
+            helper_file.chmod(0o755)
+
+        fake_i3 = FakeI3(temp_path / "ipc.sock", OUTPUTS)
+        env = {
+            **os.environ,
+            "I3SOCK": str(fake_i3.socket_path),
+            "i3_PATH": str(i3_path),
+            "I3_RESTORE_LOG_FILE": str(temp_path / "i3-restore.log"),
+            "I3_RESTORE_LOG_FILE_OLD": str(temp_path / "i3-restore-old.log"),
+            "PATH": f"{bin_path}:{os.environ['PATH']}",
+        }
+
+        forks_before = get_fork_count()
+        start = time.monotonic()
+        restore_args = ["--batch-layouts"] if batch_layouts else []
+        subprocess.run([sys.executable, str(RESTORE_SCRIPT), *restore_args], env=env, check=True)
+        restore_end = time.monotonic()
+
+        expected_windows = num_workspaces * num_containers
+        while len(fake_i3.windows()) < expected_windows:
+            if time.monotonic() - restore_end > WINDOW_TIMEOUT:
+                raise RuntimeError(f"Only {len(fake_i3.windows())} windows were restored")
+
+            time.sleep(0.01)
+
+        forks_after = get_fork_count()
+        fake_i3.close()
+
+    return {
+        "first_window": fake_i3.window_times[0] - start,
+        "windows_restored": max(fake_i3.window_times[-1], restore_end) - start,
+        "forks": forks_after - forks_before if forks_before is not None else None,
+    }
+
+
+def create_session(i3_path: Path, num_workspaces: int, num_containers: int, delay: float) -> None:
+    """
+    Save a session like i3-save does: a layout and launch scripts for each workspace and the
+    restore plan compiled from them
+    """
+    utils.i3_PATH = str(i3_path)
+
+    workspaces = []
+    fake_program = shlex.quote(str(BENCHMARK_DIR / "fake_program.py"))
+    for i in range(num_workspaces):
+        name = str(i + 1)
+        window_classes = [f"Program{j}" for j in range(num_containers)]
+
+        layout_file = i3_path / f"workspace_{name}_{OUTPUTS[i % len(OUTPUTS)]}_layout.json"
+        layout = [
+            {"type": "con", "swallows": [{"class": f"^{window_class}$"}]}
+            for window_class in window_classes
+        ]
+        layout_file.write_text("\n\n".join(json.dumps(con) for con in layout))
+
+        launch_scripts = []
+        for j, window_class in enumerate(window_classes):
+            script = i3_path / f"workspace_{name}_container_{j}.sh"
+            utils.write_script(
+                script,
+                f"exec {shlex.quote(sys.executable)} {fake_program} {window_class} {delay}\n",
+            )
+            launch_scripts.append(script)
+
+        workspace = tree.Node({"type": "workspace", "name": name})
+        workspace.output = OUTPUTS[i % len(OUTPUTS)]
+        workspace.visible = i < len(OUTPUTS)
+        workspace.focused_workspace = i == 0
+        workspaces.append(
+            plan.compile_workspace(workspace, layout_file, launch_scripts, window_classes)
+        )
+
+    plan.save_plan(workspaces)
+
+
+def get_fork_count() -> int | None:
+    """Get the number of processes forked since boot, or None if it isn't available"""
+    try:
+        with open("/proc/stat") as f:
+            for line in f:
+                if line.startswith("processes "):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+A fake i3 that speaks the i3 IPC protocol over a Unix socket. It supports the messages and
+commands i3-restore uses while restoring (RUN_COMMAND, GET_TREE, GET_WORKSPACES, GET_MARKS, and
+SUBSCRIBE with window events) and keeps a simplified tree of outputs, workspaces, and containers.
+
+Programs launched with exec map their windows by sending a MAP_WINDOW message (see
+fake_program.py). A window is placed on the focused workspace and swallowed by the first matching
+placeholder on it, like i3 does.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import re
+import shlex
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+# Commands are split like i3-restore splits them
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "programs"))
+import ipc
+
+JSON = dict[str, Any]
+
+MAGIC = b"i3-ipc"
+HEADER = struct.Struct(f"={len(MAGIC)}sII")
+
+RUN_COMMAND = 0
+GET_WORKSPACES = 1
+SUBSCRIBE = 2
+GET_TREE = 4
+GET_MARKS = 5
+EVENT_MASK = 1 << 31
+WINDOW_EVENT = 3
+
+# Not part of i3's protocol. Sent by fake programs to map their window.
+MAP_WINDOW = 1000
+
+
+class FakeI3:
+    def __init__(self, socket_path: Path, outputs: list[str]) -> None:
+        self.socket_path = socket_path
+        self.lock = threading.Lock()
+        # Replies and events can be sent from different threads, so sending is serialized
+        self.send_lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+        self.outputs = {name: {"id": next(self.ids), "current": None} for name in outputs}
+        self.workspaces: dict[str, JSON] = {}
+        self.focused_workspace = self._get_workspace("1", outputs[0])
+
+        self.subscribers: list[socket.socket] = []
+        self.processes: list[subprocess.Popen] = []
+        self.exec_count = 0
+        self.window_times: list[float] = []
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(str(socket_path))
+        self.server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.close()
+        for process in self.processes:
+            process.wait()
+
+    def windows(self) -> list[JSON]:
+        with self.lock:
+            return [
+                con
+                for ws in self.workspaces.values()
+                for con in ws["nodes"]
+                if con["window"] is not None
+            ]
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client: socket.socket) -> None:
+        with client:
+            while True:
+                header = self._receive(client, HEADER.size)
+                if header is None:
+                    return
+
+                _, length, message_type = HEADER.unpack(header)
+                payload = self._receive(client, length) or b""
+                with self.lock:
+                    reply = self._handle(client, message_type, payload.decode("utf-8"))
+
+                self._send(client, message_type, reply)
+
+    def _handle(self, client: socket.socket, message_type: int, payload: str) -> Any:
+        if message_type == RUN_COMMAND:
+            return [self._run_command(command) for command in ipc.split_commands(payload)]
+        if message_type == GET_TREE:
+            return self._get_tree()
+        if message_type == GET_WORKSPACES:
+            return [
+                {
+                    "name": ws["name"],
+                    "output": ws["output"],
+                    "visible": self.outputs[ws["output"]]["current"] == ws["name"],
+                    "focused": ws is self.focused_workspace,
+                }
+                for ws in self.workspaces.values()
+            ]
+        if message_type == GET_MARKS:
+            return [mark for con in self._containers() for mark in con["marks"]]
+        if message_type == SUBSCRIBE:
+            if "window" in json.loads(payload):
+                self.subscribers.append(client)
+            return {"success": True}
+        if message_type == MAP_WINDOW:
+            return self._map_window(json.loads(payload))
+
+        return {"success": False, "error": f"Unsupported message type {message_type}"}
+
+    def _run_command(self, command: str) -> JSON:
+        criteria = re.match(r"\[(\w+)=(.+?)\]\s*(.*)", command)
+        if criteria:
+            key, value, command = criteria.group(1), shlex.split(criteria.group(2))[0], criteria[3]
+            return self._run_criteria_command(key, value, command)
+
+        args = shlex.split(command)
+        if args[0] == "workspace":
+            self._focus(self._get_workspace(args[-1], self.focused_workspace["output"]))
+        elif args[:4] == ["move", "workspace", "to", "output"]:
+            if args[4] not in self.outputs:
+                return {"success": False, "error": f"No output matched {args[4]}"}
+
+            self._move_workspace(self.focused_workspace, args[4])
+        elif args[0] == "append_layout":
+            self._append_layout(Path(args[1]))
+        elif args[0] == "exec":
+            self._exec(args[1])
+        elif args[0] == "unmark":
+            for con in self._containers():
+                con["marks"] = [mark for mark in con["marks"] if mark != args[1]]
+        else:
+            return {"success": False, "error": f"Unsupported command {command}"}
+
+        return {"success": True}
+
+    def _run_criteria_command(self, key: str, value: str, command: str) -> JSON:
+        matches = []
+        for ws in self.workspaces.values():
+            for con in ws["nodes"]:
+                matched = value in con["marks"] if key == "con_mark" else str(con["id"]) == value
+                if matched:
+                    matches.append((ws, con))
+
+        if not matches:
+            return {"success": False, "error": "No window matches given criteria"}
+
+        for ws, con in matches:
+            if command == "focus":
+                self._focus(ws)
+            elif command == "kill":
+                ws["nodes"].remove(con)
+
+        return {"success": True}
+
+    def _get_workspace(self, name: str, output: str) -> JSON:
+        if name not in self.workspaces:
+            self.workspaces[name] = {"name": name, "output": output, "nodes": []}
+            if self.outputs[output]["current"] is None:
+                self.outputs[output]["current"] = name
+
+        return self.workspaces[name]
+
+    def _focus(self, workspace: JSON) -> None:
+        self.focused_workspace = workspace
+        self.outputs[workspace["output"]]["current"] = workspace["name"]
+
+    def _move_workspace(self, workspace: JSON, output: str) -> None:
+        previous_output = self.outputs[workspace["output"]]
+        if previous_output["current"] == workspace["name"]:
+            previous_output["current"] = None
+
+        workspace["output"] = output
+        self._focus(workspace)
+
+    def _containers(self) -> list[JSON]:
+        return [con for ws in self.workspaces.values() for con in ws["nodes"]]
+
+    def _append_layout(self, layout_file: Path) -> None:
+        """
+        Add a placeholder for every leaf container in the layout. Windows already on the workspace
+        are swallowed right away, which is what unmapping and mapping them does in i3.
+        """
+        content = layout_file.read_text()
+        decoder = json.JSONDecoder()
+        containers = []
+        position = 0
+        while content[position:].strip():
+            position += len(content[position:]) - len(content[position:].lstrip())
+            container, position = decoder.raw_decode(content, position)
+            containers.append(container)
+
+        workspace = self.focused_workspace
+        windows = [con for con in workspace["nodes"] if con["window"] is not None]
+        workspace["nodes"] = [con for con in workspace["nodes"] if con["window"] is None]
+
+        for leaf in get_leaves(containers):
+            workspace["nodes"].append(
+                {
+                    "id": next(self.ids),
+                    "window": None,
+                    "window_properties": {},
+                    "swallows": leaf.get("swallows", []),
+                    "marks": leaf.get("marks", []),
+                    "nodes": [],
+                }
+            )
+
+        for window in windows:
+            self._place_window(workspace, window)
+
+    def _exec(self, command: str) -> None:
+        self.exec_count += 1
+        env = {**os.environ, "I3SOCK": str(self.socket_path)}
+        self.processes.append(
+            subprocess.Popen(["/bin/sh", "-c", command], env=env, start_new_session=True)
+        )
+
+    def _map_window(self, properties: JSON) -> JSON:
+        window = {
+            "id": next(self.ids),
+            "window": next(self.ids),
+            "window_properties": {"class": properties["class"]},
+            "swallows": [],
+            "marks": [],
+            "nodes": [],
+        }
+        self._place_window(self.focused_workspace, window)
+        self.window_times.append(time.monotonic())
+
+        event = {"change": "new", "container": window}
+        for subscriber in list(self.subscribers):
+            try:
+                self._send(subscriber, EVENT_MASK | WINDOW_EVENT, event)
+            except OSError:
+                self.subscribers.remove(subscriber)
+
+        return {"success": True}
+
+    def _place_window(self, workspace: JSON, window: JSON) -> None:
+        """Swallow the window into the first matching placeholder or add it to the workspace"""
+        window_class = window["window_properties"]["class"]
+        for con in workspace["nodes"]:
+            if con["window"] is None and any(
+                re.fullmatch(swallow.get("class", ".*"), window_class)
+                for swallow in con["swallows"]
+            ):
+                con.update(window=window["window"], window_properties=window["window_properties"])
+                con["swallows"] = []
+                return
+
+        workspace["nodes"].append(window)
+
+    def _get_tree(self) -> JSON:
+        outputs = []
+        for name, output in self.outputs.items():
+            workspaces = [
+                {"type": "workspace", **ws}
+                for ws in self.workspaces.values()
+                if ws["output"] == name
+            ]
+            content = {"type": "con", "name": "content", "nodes": workspaces}
+            outputs.append(
+                {
+                    "type": "output",
+                    "id": output["id"],
+                    "name": name,
+                    "current_workspace": output["current"],
+                    "nodes": [content],
+                }
+            )
+
+        focused_output = self.outputs[self.focused_workspace["output"]]["id"]
+        i3_output = {"type": "output", "name": "__i3", "nodes": []}
+        return {"type": "root", "focus": [focused_output], "nodes": [i3_output, *outputs]}
+
+    def _send(self, client: socket.socket, message_type: int, payload: Any) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        with self.send_lock:
+            client.sendall(HEADER.pack(MAGIC, len(data), message_type) + data)
+
+    @staticmethod
+    def _receive(client: socket.socket, size: int) -> bytes | None:
+        data = b""
+        while len(data) < size:
+            try:
+                chunk = client.recv(size - len(data))
+            except OSError:
+                return None
+            if not chunk:
+                return None
+
+            data += chunk
+
+        return data
+
+
+def get_leaves(containers: list[JSON]) -> list[JSON]:
+    leaves = []
+    for container in containers:
+        if container.get("nodes"):
+            leaves.extend(get_leaves(container["nodes"]))
+        else:
+            leaves.append(container)
+
+    return leaves
@@ -0,0 +1,164 @@
+"""
+A fake Kitty that serves Kitty's remote control protocol over a Unix socket. It answers the commands
+the Kitty plugin sends while saving (ls, ls --output-format=session, and get-text) for a synthetic
+Kitty instance with a configurable number of OS windows, tabs, windows, and lines of scrollback.
+
+The plugin runs `kitty @` for every command, so fake_kitty_client.py stands in for it. The fake
+client forks and sends each command to this server like the real one does.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import socket
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+JSON = dict[str, Any]
+
+# Every remote control message is wrapped in this escape sequence
+MESSAGE_START = b"\x1bP@kitty-cmd"
+MESSAGE_END = b"\x1b\\"
+
+# The width (in characters) of each synthetic line of scrollback
+SCROLLBACK_LINE_WIDTH = 80
+
+
+class FakeKitty:
+    def __init__(
+        self,
+        socket_path: Path,
+        os_windows: int,
+        tabs: int,
+        windows: int,
+        scrollback_lines: int,
+        window_pid: int,
+    ) -> None:
+        """
+        Create a Kitty instance with os_windows OS windows, each with tabs tabs of windows windows.
+        window_pid is the PID of the shell running in each window, which the plugin looks up.
+        """
+        self.socket_path = socket_path
+        self.scrollback_lines = scrollback_lines
+        self.tree = build_tree(os_windows, tabs, windows, window_pid)
+        self.windows = {
+            window["id"]: (tab, window)
+            for os_window in self.tree
+            for tab in os_window["tabs"]
+            for window in tab["windows"]
+        }
+
+        self.lock = threading.Lock()
+        # The number of requests for each command and the bytes sent in the replies
+        self.requests: Counter[str] = Counter()
+        self.bytes_sent = 0
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(str(socket_path))
+        self.server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client: socket.socket) -> None:
+        with client:
+            data = b""
+            while MESSAGE_END not in data:
+                chunk = client.recv(65536)
+                if not chunk:
+                    return
+
+                data += chunk
+
+            message = json.loads(data[len(MESSAGE_START) : data.index(MESSAGE_END)])
+            reply = self._handle(message["cmd"], message.get("payload") or {})
+
+            response = MESSAGE_START + json.dumps(reply).encode("utf-8") + MESSAGE_END
+            with self.lock:
+                self.requests[message["cmd"]] += 1
+                self.bytes_sent += len(response)
+
+            client.sendall(response)
+
+    def _handle(self, command: str, payload: JSON) -> JSON:
+        if command == "ls":
+            if payload.get("output_format") == "session":
+                return {"ok": True, "data": self._get_session(payload.get("match"))}
+
+            return {"ok": True, "data": json.dumps(self.tree)}
+        if command == "get-text":
+            return {"ok": True, "data": get_scrollback(self.scrollback_lines)}
+
+        return {"ok": False, "error": f"Unsupported command {command}"}
+
+    def _get_session(self, match: str | None) -> str:
+        """Get the session of the matched windows (id:<id> separated by 'or')"""
+        window_ids = [int(part.removeprefix("id:")) for part in (match or "").split(" or ")]
+
+        session = ""
+        current_tab = None
+        for window_id in window_ids:
+            tab, window = self.windows[window_id]
+            if tab is not current_tab:
+                current_tab = tab
+                session += f"new_tab\nlayout {tab['layout']}\n"
+                if tab["is_active"]:
+                    session += "focus\n"
+
+            data = json.dumps({"id": window_id})
+            session += f"launch 'kitty-unserialize-data={data}' --cwd={window['cwd']}\n"
+
+        return session
+
+
+def build_tree(os_windows: int, tabs: int, windows: int, window_pid: int) -> list[JSON]:
+    """Build the tree `kitty @ ls` returns. Every ID is unique, like in Kitty"""
+    ids = itertools.count(1)
+    home = os.path.expanduser("~")
+
+    tree = []
+    for _ in range(os_windows):
+        os_window = {"id": next(ids), "platform_window_id": next(ids), "tabs": []}
+        for tab_index in range(tabs):
+            tab = {
+                "id": next(ids),
+                "layout": "tall",
+                "is_active": tab_index == 0,
+                "windows": [
+                    {
+                        "id": next(ids),
+                        "pid": window_pid,
+                        "cwd": home,
+                        "cmdline": ["/bin/bash"],
+                        "env": {"SHELL": "/bin/bash", "HOME": home, "TERM": "xterm-kitty"},
+                    }
+                    for _ in range(windows)
+                ],
+            }
+            os_window["tabs"].append(tab)
+
+        tree.append(os_window)
+
+    return tree
+
+
+def get_scrollback(lines: int) -> str:
+    """Get lines of colored scrollback like `kitty @ get-text --ansi` returns"""
+    line = "\x1b[32m$\x1b[0m " + "x" * (SCROLLBACK_LINE_WIDTH - 2)
+    return "\n".join(itertools.repeat(line, lines))
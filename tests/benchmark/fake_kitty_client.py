@@ -0,0 +1,69 @@
+"""
+A fake `kitty` for the Kitty plugin benchmark. `kitty @` commands are sent to the fake Kitty (see
+fake_kitty.py) with Kitty's remote control protocol and the reply's data is printed, like the real
+`kitty @` does. `kitty --version` prints the version in $FAKE_KITTY_VERSION.
+
+Usage: fake_kitty_client.py --version
+       fake_kitty_client.py @ --to unix:<socket> <command> [options]
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sys
+
+from fake_kitty import MESSAGE_END, MESSAGE_START
+
+# The options that take the next argument as their value
+VALUE_OPTIONS = {"--match", "--extent", "--output-format"}
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    if args == ["--version"]:
+        print(f"kitty {os.environ.get('FAKE_KITTY_VERSION', '0.43.1')} created by Kovid Goyal")
+        return
+
+    if args[:2] != ["@", "--to"]:
+        sys.exit(f"Unsupported arguments: {args}")
+
+    socket_path, command = args[2].removeprefix("unix:"), args[3]
+    message = {"cmd": command, "version": [0, 43, 1], "payload": parse_options(args[4:])}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(MESSAGE_START + json.dumps(message).encode("utf-8") + MESSAGE_END)
+
+        data = b""
+        while MESSAGE_END not in data:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+
+            data += chunk
+
+    reply = json.loads(data[len(MESSAGE_START) : data.index(MESSAGE_END)])
+    if not reply["ok"]:
+        sys.exit(reply["error"])
+
+    sys.stdout.write(reply["data"])
+
+
+def parse_options(options: list[str]) -> dict[str, str | bool]:
+    """Parse the command's options into its payload, such as --output-format=session"""
+    payload: dict[str, str | bool] = {}
+    remaining = iter(options)
+    for option in remaining:
+        name, has_value, value = option.partition("=")
+        if not has_value:
+            value = next(remaining) if name in VALUE_OPTIONS else True
+
+        payload[name.removeprefix("--").replace("-", "_")] = value
+
+    return payload
+
+
+if __name__ == "__main__":
+    main()
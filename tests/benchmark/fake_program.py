@@ -0,0 +1,32 @@
+"""
+A fake program for the restore benchmark. It waits for its startup delay and then maps its window
+by sending a MAP_WINDOW message to the fake i3 at $I3SOCK.
+
+Usage: fake_program.py <window class> <startup delay in seconds>
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sys
+import time
+
+from fake_i3 import HEADER, MAGIC, MAP_WINDOW
+
+
+def main() -> None:
+    window_class, delay = sys.argv[1], float(sys.argv[2])
+    time.sleep(delay)
+
+    payload = json.dumps({"class": window_class, "pid": os.getpid()}).encode("utf-8")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(os.environ["I3SOCK"])
+        client.sendall(HEADER.pack(MAGIC, len(payload), MAP_WINDOW) + payload)
+        # Wait for the reply so the window is mapped before exiting
+        client.recv(HEADER.size)
+
+
+if __name__ == "__main__":
+    main()
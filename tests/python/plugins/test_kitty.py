@@ -1,10 +1,14 @@
 import json
 import subprocess
+from collections.abc import Iterator
 from unittest import mock
 
 import pytest
 from pytest_mock import MockerFixture
 
+from programs import tree
+from programs.utils import JSON
+
 with mock.patch("utils.get_logger"):
     # Don't log messages to a file
     from programs.plugins import kitty
@@ -100,11 +104,40 @@ focus_tab 0
 """  # noqa: E501
 
 
+@pytest.fixture(autouse=True)
+def container_trees() -> Iterator[None]:
+    kitty._container_trees.clear()
+    yield
+    kitty._container_trees.clear()
+
+
 @pytest.fixture(autouse=True)
 def container(mocker: MockerFixture) -> Container:
     mocker.patch.object(Container, "_get_pid")
     mocker.patch.object(Container, "_get_cmdline_options")
-    return Container({"window_properties": {}, "window": 9999})
+    return Container(tree.Node({"window_properties": {}, "window": 9999}))
+
+
+@pytest.mark.parametrize(
+    "plugin_config",
+    [
+        {},
+        {"listen_socket": "test-socket", "scrollback": "invalid"},
+        {"listen_socket": "test-socket", "single_instance": "yes"},
+    ],
+)
+def test_parse_config_raises_error_on_invalid_config(plugin_config: JSON) -> None:
+    with pytest.raises(TypeError):
+        kitty.parse_config(plugin_config)
+
+
+def test_parse_config_parses_config_correctly() -> None:
+    plugin_config = {"listen_socket": "my_socket", "scrollback": "all", "extra": "value"}
+    assert kitty.parse_config(plugin_config) == {
+        "listen_socket": "my_socket",
+        "scrollback": "all",
+        "single_instance": False,
+    }
 
 
 @pytest.mark.parametrize(
@@ -171,8 +204,25 @@ def test_get_listen_socket_with_placeholder() -> None:
 
 
 def test_get_container_tree_retrieves_container_tree(mocker: MockerFixture) -> None:
-    mocker.patch("subprocess.check_output", return_value=b'{"container_tree": {}}')
+    mock_check_output = mocker.patch(
+        "subprocess.check_output", return_value=b'{"container_tree": {}}'
+    )
+    assert kitty.get_container_tree("test-socket") == {"container_tree": {}}
+
+    # The tree is only retrieved once for each socket
     assert kitty.get_container_tree("test-socket") == {"container_tree": {}}
+    mock_check_output.assert_called_once()
+
+
+def test_get_container_tree_uses_plugin_deadline(mocker: MockerFixture) -> None:
+    mock_check_output = mocker.patch(
+        "subprocess.check_output", return_value=b'{"container_tree": {}}'
+    )
+
+    with kitty.utils.deadline(5):
+        kitty.get_container_tree("test_socket")
+
+    assert 0 < mock_check_output.call_args.kwargs["timeout"] <= 5
 
 
 def test_get_container_raises_plugin_save_error_when_command_fails(mocker: MockerFixture) -> None:
@@ -186,6 +236,15 @@ def test_save_scrollback_skips_with_none_scrollback_config() -> None:
     assert kitty.save_scrollback(0, 0, plugin_config) is None
 
 
+def test_save_scrollback_skips_when_out_of_time(mocker: MockerFixture) -> None:
+    mocker.patch.object(kitty.utils, "should_skip", return_value=True)
+    mock_check_call = mocker.patch("subprocess.check_call")
+
+    plugin_config = {"listen_socket": "test-socket", "scrollback": "all"}
+    assert kitty.save_scrollback(0, 0, plugin_config) is None
+    mock_check_call.assert_not_called()
+
+
 def test_save_scrollback_handles_failed_command(mocker: MockerFixture) -> None:
     mocker.patch("subprocess.check_call", side_effect=subprocess.CalledProcessError(None, None))
     mocker.patch("pathlib.Path.open")
@@ -286,10 +345,17 @@ def test_parse_tree_to_session_parses_tree_into_session_correctly(
 
 
 def test_get_session_contents_retrieves_session_contents(mocker: MockerFixture) -> None:
-    mocker.patch(
+    mock_check_output = mocker.patch(
         "subprocess.check_output", return_value=KITTY_CONTAINER_SESSION_NEW_ORIGINAL.encode("utf-8")
     )
-    assert kitty.get_session_contents("test-socket") == KITTY_CONTAINER_SESSION_NEW_ORIGINAL
+    assert (
+        kitty.get_session_contents("test-socket", KITTY_CONTAINER_TREE[0])
+        == KITTY_CONTAINER_SESSION_NEW_ORIGINAL
+    )
+
+    # Only the windows in the OS window are included in the session
+    args = mock_check_output.call_args[0][0]
+    assert args[-2:] == ["--match", "id:1 or id:2 or id:3"]
 
 
 def test_get_session_contents_raises_plugin_save_error_when_command_fails(
@@ -297,7 +363,7 @@ def test_get_session_contents_raises_plugin_save_error_when_command_fails(
 ) -> None:
     mocker.patch("subprocess.check_output", side_effect=subprocess.CalledProcessError(None, None))
     with pytest.raises(kitty.utils.PluginSaveError):
-        kitty.get_session_contents("test-socket")
+        kitty.get_session_contents("test-socket", KITTY_CONTAINER_TREE[0])
 
 
 def test_get_new_launch_command_gets_command_from_correct_window(
@@ -414,12 +480,12 @@ def test_main_saves_a_kitty_container(mocker: MockerFixture, container: Containe
             version_output,
             kitty_tree_command_output,
             kitty_session_output,
-            kitty_tree_command_output,
+            # The container tree is only retrieved once
             kitty_session_output,
         ],
     )
 
-    plugin_config = {"listen_socket": "test-socket", "scrollback": "none"}
+    plugin_config = {"listen_socket": "test-socket", "scrollback": "none", "single_instance": False}
     kitty.main(container, plugin_config)
 
     assert "kitty-session-9999" in container.command
@@ -433,3 +499,18 @@ def test_main_saves_a_kitty_container(mocker: MockerFixture, container: Containe
     container.subprocess_command = "subprocess"
     kitty.main(container, plugin_config)
     assert "kitty-session-9999" in container.command
+
+
+def test_main_restores_into_a_single_instance(mocker: MockerFixture, container: Container) -> None:
+    mocker.patch.object(kitty, "USE_OLD_SESSION_SAVING", False)
+    mocker.patch.object(kitty, "get_container_tree", return_value=KITTY_CONTAINER_TREE)
+    mocker.patch.object(
+        kitty, "create_session_file", return_value=kitty.Path("/tmp/kitty-session-9999")
+    )
+
+    plugin_config = {"listen_socket": "test-socket", "scrollback": "none", "single_instance": True}
+    kitty.main(container, plugin_config)
+
+    assert container.command == (
+        "kitty --single-instance --instance-group=i3-restore --session '/tmp/kitty-session-9999'"
+    )
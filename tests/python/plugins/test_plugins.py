@@ -0,0 +1,53 @@
+from collections.abc import Iterator
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from programs import constants
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import plugins
+
+
+@pytest.fixture(autouse=True)
+def loaded_plugins() -> Iterator[None]:
+    plugins._loaded_plugins.clear()
+    yield
+    plugins._loaded_plugins.clear()
+
+
+def test_get_available_plugins_finds_plugin_modules() -> None:
+    assert constants.KITTY_CLASS in plugins.get_available_plugins()
+
+
+def test_load_plugin_imports_and_parses_the_plugin(mocker: MockerFixture) -> None:
+    mock_import = mocker.patch("importlib.import_module")
+    mock_import.return_value.parse_config.return_value = {"listen_socket": "test_socket"}
+
+    plugin, plugin_config = plugins.load_plugin(
+        constants.KITTY_CLASS, {"listen_socket": "test_socket", "timeout": 5}
+    )
+
+    mock_import.assert_called_once_with(f"{plugins.__name__}.{constants.KITTY_CLASS}")
+    assert plugin == mock_import.return_value
+    assert plugin_config == {"listen_socket": "test_socket", "timeout": 5}
+
+
+def test_load_plugin_only_loads_plugins_once(mocker: MockerFixture) -> None:
+    mock_import = mocker.patch("importlib.import_module")
+    mock_import.return_value.parse_config.return_value = {}
+
+    first = plugins.load_plugin(constants.KITTY_CLASS, {"timeout": 5})
+    second = plugins.load_plugin(constants.KITTY_CLASS, {"timeout": 5})
+
+    mock_import.assert_called_once()
+    assert first is second
+
+
+def test_load_plugin_raises_error_on_invalid_config() -> None:
+    with pytest.raises(TypeError):
+        plugins.load_plugin(constants.KITTY_CLASS, {"timeout": 5})
+
+    assert not plugins._loaded_plugins
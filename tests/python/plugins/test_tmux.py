@@ -0,0 +1,292 @@
+import subprocess
+from collections.abc import Iterator
+from pathlib import Path
+from unittest import mock
+
+import psutil
+import pytest
+from pytest_mock import MockerFixture
+
+from programs import tree
+from programs.utils import JSON
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs.plugins import tmux
+
+    with mock.patch("config.Config._read_config", return_value={}):
+        # Don't read the config file
+        from programs.i3_save import Container
+
+# Overwrite for testing so it is deterministic
+tmux.utils.i3_PATH = "/tmp/i3-restore-test"
+
+TMUX_SERVER_OUTPUT = """\
+client\t100\tmain
+client\t200\tother
+pane\t0\t0\t0\tlayout-0\t0\t0\t%0\t10\t/home/test\teditor\tmain
+pane\t0\t0\t0\tlayout-0\t1\t1\t%1\t11\t/home/test/code\teditor\tmain
+pane\t0\t1\t1\tlayout-1\t0\t1\t%2\t12\t/tmp\tlogs\tmain
+pane\t0\t1\t1\tlayout-2\t1\t1\t%3\t13\t/\tshell\tother
+"""
+
+
+@pytest.fixture(autouse=True)
+def container(mocker: MockerFixture) -> Container:
+    mocker.patch.object(Container, "_get_pid")
+    mocker.patch.object(Container, "_get_cmdline_options")
+    return Container(tree.Node({"window_properties": {}, "window": 9999}))
+
+
+@pytest.fixture(autouse=True)
+def servers() -> Iterator[None]:
+    tmux._servers.clear()
+    yield
+    tmux._servers.clear()
+
+
+@pytest.fixture
+def server(mocker: MockerFixture) -> JSON:
+    mocker.patch("subprocess.check_output", return_value=TMUX_SERVER_OUTPUT.encode("utf-8"))
+    return tmux.get_server([])
+
+
+@pytest.mark.parametrize("plugin_config", [{"scrollback": "invalid"}, {"scrollback": None}])
+def test_parse_config_raises_error_on_invalid_config(plugin_config: JSON) -> None:
+    with pytest.raises(TypeError):
+        tmux.parse_config(plugin_config)
+
+
+def test_parse_config_parses_config_correctly() -> None:
+    assert tmux.parse_config({}) == {"scrollback": "none"}
+    assert tmux.parse_config({"scrollback": "all", "extra": "value"}) == {"scrollback": "all"}
+
+
+def test_get_client_process_finds_the_tmux_client(
+    mocker: MockerFixture, container: Container
+) -> None:
+    shell, client = mocker.Mock(), mocker.Mock()
+    shell.cmdline.return_value = ["/bin/bash"]
+    client.cmdline.return_value = ["/usr/bin/tmux", "attach"]
+    mocker.patch("psutil.Process").return_value.children.return_value = [shell, client]
+
+    assert tmux.get_client_process(container) == client
+
+
+def test_get_client_process_raises_plugin_save_error_without_a_client(
+    mocker: MockerFixture, container: Container
+) -> None:
+    zombie = mocker.Mock()
+    zombie.cmdline.return_value = []
+    mocker.patch("psutil.Process").return_value.children.return_value = [zombie]
+
+    with pytest.raises(tmux.utils.PluginSaveError):
+        tmux.get_client_process(container)
+
+
+@pytest.mark.parametrize(
+    ("cmdline", "expected_args"),
+    [
+        (["tmux"], []),
+        (["tmux", "attach", "-t", "main"], []),
+        (["tmux", "-L", "work", "attach"], ["-L", "work"]),
+        (["tmux", "-2", "-f", "tmux.conf", "-Lwork"], ["-L", "work"]),
+        (["tmux", "-u", "-S", "/tmp/socket", "new"], ["-S", "/tmp/socket"]),
+        (["tmux", "--", "-L", "work"], []),
+    ],
+)
+def test_get_socket_args_parses_the_socket_from_the_command_line(
+    cmdline: list[str], expected_args: list[str]
+) -> None:
+    assert tmux.get_socket_args(cmdline) == expected_args
+
+
+def test_get_server_lists_clients_and_panes_in_one_command(mocker: MockerFixture) -> None:
+    mock_check_output = mocker.patch(
+        "subprocess.check_output", return_value=TMUX_SERVER_OUTPUT.encode("utf-8")
+    )
+
+    server = tmux.get_server(["-L", "work"])
+
+    command = mock_check_output.call_args[0][0]
+    assert command[:4] == ["tmux", "-L", "work", "list-clients"]
+    assert "list-panes" in command
+
+    assert server["clients"] == {100: "main", 200: "other"}
+    assert server["sessions"]["main"]["base_index"] == "0"
+    windows = server["sessions"]["main"]["windows"]
+    assert list(windows) == ["0", "1"]
+    assert windows["0"]["name"] == "editor"
+    assert windows["0"]["layout"] == "layout-0"
+    assert windows["1"]["active"]
+    assert windows["0"]["panes"][1] == {
+        "index": "1",
+        "active": True,
+        "id": "%1",
+        "pid": 11,
+        "cwd": "/home/test/code",
+    }
+
+
+def test_get_server_only_queries_each_server_once(mocker: MockerFixture) -> None:
+    mock_check_output = mocker.patch(
+        "subprocess.check_output", return_value=TMUX_SERVER_OUTPUT.encode("utf-8")
+    )
+
+    first_server = tmux.get_server([])
+    assert tmux.get_server([]) is first_server
+    mock_check_output.assert_called_once()
+
+    second_server = tmux.get_server(["-L", "work"])
+    assert second_server["number"] == 1
+
+
+def test_get_server_raises_plugin_save_error_when_command_fails(mocker: MockerFixture) -> None:
+    mocker.patch("subprocess.check_output", side_effect=subprocess.CalledProcessError(None, None))
+
+    with pytest.raises(tmux.utils.PluginSaveError):
+        tmux.get_server([])
+
+
+def test_save_scrollback_captures_all_panes_in_one_command(
+    mocker: MockerFixture, server: JSON
+) -> None:
+    mock_check_call = mocker.patch("subprocess.check_call")
+
+    scrollback = tmux.save_scrollback(["-L", "work"], server, {"scrollback": "all"})
+
+    assert scrollback["%3"] == Path("/tmp/i3-restore-test/tmux-scrollback-0-3")
+    assert len(scrollback) == 4
+
+    command = mock_check_call.call_args[0][0]
+    assert command[:3] == ["tmux", "-L", "work"]
+    assert command.count("capture-pane") == 4
+    assert command.count("-S") == 4
+    assert command[-1] != ";"
+
+    # The scrollback is only saved once for each server
+    assert tmux.save_scrollback(["-L", "work"], server, {"scrollback": "all"}) is scrollback
+    mock_check_call.assert_called_once()
+
+
+def test_save_scrollback_only_captures_the_screen(mocker: MockerFixture, server: JSON) -> None:
+    mock_check_call = mocker.patch("subprocess.check_call")
+
+    tmux.save_scrollback([], server, {"scrollback": "screen"})
+
+    assert "-S" not in mock_check_call.call_args[0][0]
+
+
+@pytest.mark.parametrize("should_skip", [True, False])
+def test_save_scrollback_skips_saving_scrollback(
+    mocker: MockerFixture, server: JSON, should_skip: bool
+) -> None:
+    mocker.patch.object(tmux.utils, "should_skip", return_value=should_skip)
+    mock_check_call = mocker.patch("subprocess.check_call")
+
+    # Scrollback is skipped when it is configured not to be saved or there is no time left for it
+    scrollback_option = "all" if should_skip else "none"
+    assert tmux.save_scrollback([], server, {"scrollback": scrollback_option}) == {}
+    mock_check_call.assert_not_called()
+
+
+def test_save_scrollback_handles_failed_command(mocker: MockerFixture, server: JSON) -> None:
+    mocker.patch("subprocess.check_call", side_effect=subprocess.CalledProcessError(None, None))
+
+    assert tmux.save_scrollback([], server, {"scrollback": "all"}) == {}
+
+
+def test_get_pane_command_restores_subprocess(mocker: MockerFixture, container: Container) -> None:
+    mocker.patch("psutil.Process")
+
+    def find_subprocess(_: psutil.Process, launch_command: str) -> None:
+        container.subprocess_command = launch_command.replace("{command}", "vim")
+
+    mocker.patch.object(container, "check_if_subprocess", side_effect=find_subprocess)
+
+    pane = {"id": "%0", "pid": 10}
+    command = tmux.get_pane_command(container, pane, Path("/tmp/scrollback"))
+
+    assert command == ['vim && exec "${SHELL:-sh}"']
+    assert container.subprocess_command is None
+
+
+def test_get_pane_command_restores_scrollback(mocker: MockerFixture, container: Container) -> None:
+    mocker.patch("psutil.Process", side_effect=psutil.NoSuchProcess(10))
+
+    pane = {"id": "%0", "pid": 10}
+    command = tmux.get_pane_command(container, pane, Path("/tmp/scroll back"))
+
+    assert command == ["cat '/tmp/scroll back'; exec \"${SHELL:-sh}\""]
+
+
+def test_get_pane_command_returns_no_command_for_shells(
+    mocker: MockerFixture, container: Container
+) -> None:
+    mocker.patch("psutil.Process")
+    mocker.patch.object(container, "check_if_subprocess")
+
+    assert tmux.get_pane_command(container, {"id": "%0", "pid": 10}, None) == []
+
+
+def test_create_restore_script_rebuilds_and_attaches_to_the_session(
+    mocker: MockerFixture, container: Container, server: JSON
+) -> None:
+    mocker.patch.object(tmux, "get_pane_command", return_value=[])
+
+    script = tmux.create_restore_script(
+        container, ["-L", "work"], "main", server["sessions"]["main"], {}
+    )
+
+    rebuild_line, *commands, attach_line = script.splitlines()
+    assert rebuild_line.startswith("tmux -L work has-session -t =main 2>/dev/null || tmux -L work")
+    assert "new-session -d -s main -n i3-restore-placeholder" in rebuild_line
+    assert attach_line == "tmux -L work attach-session -t =main"
+
+    assert commands == [
+        "    new-window -d -k -t =main:0 -n editor -c /home/test \\; \\",
+        "    split-window -t =main:0 -c /home/test/code \\; \\",
+        "    select-layout -t =main:0 layout-0 \\; \\",
+        "    select-pane -t =main:0.1 \\; \\",
+        "    new-window -d -k -t =main:1 -n logs -c /tmp \\; \\",
+        "    select-layout -t =main:1 layout-1 \\; \\",
+        "    select-pane -t =main:1.0 \\; \\",
+        "    select-window -t =main:1",
+    ]
+
+
+def test_create_restore_script_kills_placeholder_without_a_window_at_the_base_index(
+    mocker: MockerFixture, container: Container, server: JSON
+) -> None:
+    mocker.patch.object(tmux, "get_pane_command", return_value=["cat file"])
+
+    script = tmux.create_restore_script(container, [], "other", server["sessions"]["other"], {})
+
+    assert "new-window -d -k -t =other:1 -n shell -c / 'cat file'" in script
+    assert "kill-window -t =other:i3-restore-placeholder\n" in script
+
+
+@pytest.mark.usefixtures("server")
+def test_main_saves_a_tmux_container(mocker: MockerFixture, container: Container) -> None:
+    client = mocker.Mock(pid=200)
+    client.cmdline.return_value = ["tmux"]
+    client.cwd.return_value = "/home/test"
+    mocker.patch.object(tmux, "get_client_process", return_value=client)
+    mocker.patch.object(tmux, "get_pane_command", return_value=[])
+
+    tmux.main(container, {"scrollback": "none"})
+
+    assert "attach-session -t =other" in container.subprocess_command
+    assert container.working_directory == "/home/test"
+
+
+@pytest.mark.usefixtures("server")
+def test_main_raises_plugin_save_error_for_unknown_clients(
+    mocker: MockerFixture, container: Container
+) -> None:
+    client = mocker.Mock(pid=300)
+    client.cmdline.return_value = ["tmux"]
+    mocker.patch.object(tmux, "get_client_process", return_value=client)
+
+    with pytest.raises(tmux.utils.PluginSaveError):
+        tmux.main(container, {"scrollback": "none"})
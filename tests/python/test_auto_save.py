@@ -0,0 +1,264 @@
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import auto_save
+
+
+@pytest.fixture
+def mock_time(mocker: MockerFixture) -> mock.Mock:
+    return mocker.patch("time.monotonic", return_value=0)
+
+
+@pytest.fixture
+def mock_connection(mocker: MockerFixture) -> mock.Mock:
+    return mocker.patch.object(auto_save.ipc, "connect").return_value
+
+
+def shutdown_event(change: str) -> tuple[int, dict]:
+    return auto_save.ipc.SHUTDOWN_EVENT, {"change": change}
+
+
+def window_event(change: str = "new") -> tuple[int, dict]:
+    return auto_save.ipc.WINDOW_EVENT, {"change": change}
+
+
+def test_main_runs_the_auto_saver_at_idle_priority(mocker: MockerFixture) -> None:
+    mock_lower_priority = mocker.patch.object(auto_save, "lower_priority")
+    mock_auto_saver = mocker.patch.object(auto_save, "AutoSaver")
+
+    auto_save.main(["--interval", "120"])
+
+    mock_lower_priority.assert_called_once()
+    mock_auto_saver.assert_called_once_with(120)
+    mock_auto_saver.return_value.run.assert_called_once()
+
+
+def test_main_exits_when_the_connection_to_i3_is_lost(mocker: MockerFixture) -> None:
+    mocker.patch.object(auto_save, "lower_priority")
+    mock_auto_saver = mocker.patch.object(auto_save, "AutoSaver")
+    mock_auto_saver.return_value.run.side_effect = auto_save.ipc.IPCError
+
+    auto_save.main([])
+
+    mock_auto_saver.assert_called_once_with(auto_save.constants.AUTO_SAVE_DEFAULT_INTERVAL)
+
+
+def test_lower_priority_uses_idle_cpu_and_io_priority(mocker: MockerFixture) -> None:
+    mock_sched_setscheduler = mocker.patch("os.sched_setscheduler")
+    mock_setpriority = mocker.patch("os.setpriority")
+    mock_process = mocker.patch.object(auto_save.psutil, "Process")
+
+    auto_save.lower_priority()
+
+    assert mock_sched_setscheduler.call_args[0][:2] == (0, auto_save.os.SCHED_IDLE)
+    mock_setpriority.assert_not_called()
+    mock_process.return_value.ionice.assert_called_once_with(auto_save.psutil.IOPRIO_CLASS_IDLE)
+
+
+def test_lower_priority_falls_back_to_niceness(mocker: MockerFixture) -> None:
+    mocker.patch("os.sched_setscheduler", side_effect=PermissionError)
+    mock_setpriority = mocker.patch("os.setpriority")
+    mock_process = mocker.patch.object(auto_save.psutil, "Process")
+    mock_process.return_value.ionice.side_effect = auto_save.psutil.AccessDenied
+
+    auto_save.lower_priority()
+
+    mock_setpriority.assert_called_once_with(auto_save.os.PRIO_PROCESS, 0, 19)
+
+
+@pytest.mark.parametrize(
+    ("load", "pressure", "expected_busy"),
+    [(0.5, 0.0, False), (1.5, 0.0, True), (0.5, 20.0, True)],
+)
+def test_is_system_busy(
+    mocker: MockerFixture, load: float, pressure: float, expected_busy: bool
+) -> None:
+    mocker.patch.object(auto_save.scheduler, "get_system_load", return_value=(load, pressure))
+    assert auto_save.is_system_busy() is expected_busy
+
+
+def test_get_workspace_hashes_reads_the_restore_plan(mocker: MockerFixture) -> None:
+    mocker.patch.object(
+        auto_save.plan,
+        "load_plan",
+        return_value={"workspaces": [{"name": "1", "hash": "abc"}, {"name": "2"}]},
+    )
+    assert auto_save.get_workspace_hashes() == {"1": "abc", "2": None}
+
+
+def test_get_workspace_hashes_ignores_an_unsupported_restore_plan(mocker: MockerFixture) -> None:
+    mocker.patch.object(auto_save.plan, "load_plan", side_effect=ValueError)
+    assert auto_save.get_workspace_hashes() == {}
+
+
+def test_count_changed_workspaces() -> None:
+    previous_hashes = {"1": "a", "2": "b", "3": None, "4": "d", "5": "e"}
+    hashes = {"1": "a", "2": "changed", "3": None, "4": None, "6": "f"}
+
+    # 2 and 6 changed, 5 was removed, and 4 can't be compared anymore
+    assert auto_save.count_changed_workspaces(previous_hashes, hashes) == 3
+
+
+@pytest.mark.usefixtures("mock_time")
+class TestAutoSaver:
+    def test_run_saves_when_a_save_is_due(
+        self, mocker: MockerFixture, mock_connection: mock.Mock
+    ) -> None:
+        mock_try_save = mocker.patch.object(auto_save.AutoSaver, "try_save")
+        mock_connection.receive_event.side_effect = [
+            None,
+            window_event(),
+            shutdown_event("exit"),
+        ]
+        auto_saver = auto_save.AutoSaver(600)
+
+        auto_saver.run()
+
+        mock_connection.subscribe.assert_called_once_with(["window", "workspace", "shutdown"])
+        mock_connection.receive_event.assert_called_with(600)
+        mock_try_save.assert_called_once()
+        assert auto_saver.events == 1
+        mock_connection.close.assert_called_once()
+
+    def test_run_reconnects_when_i3_restarts(
+        self, mocker: MockerFixture, mock_connection: mock.Mock
+    ) -> None:
+        mock_connect = mocker.patch.object(auto_save.ipc, "connect")
+        new_connection = mock.Mock()
+        new_connection.receive_event.side_effect = [shutdown_event("exit")]
+        mock_connect.side_effect = [mock_connection, new_connection]
+        mock_connection.receive_event.side_effect = [shutdown_event("restart")]
+
+        auto_save.AutoSaver(600).run()
+
+        mock_connection.close.assert_called_once()
+        new_connection.subscribe.assert_called_once_with(["window", "workspace", "shutdown"])
+        new_connection.close.assert_called_once()
+
+    def test_get_next_save_uses_the_current_interval(self) -> None:
+        auto_saver = auto_save.AutoSaver(600)
+        auto_saver.current_interval = 1200
+        assert auto_saver.get_next_save() == 1200
+
+    def test_get_next_save_is_sooner_after_a_burst_of_events(self, mock_time: mock.Mock) -> None:
+        auto_saver = auto_save.AutoSaver(600)
+        mock_time.return_value = 100
+        for _ in range(auto_save.constants.AUTO_SAVE_BURST_EVENTS):
+            auto_saver.add_event({"change": "new"})
+
+        assert auto_saver.get_next_save() == 100 + auto_save.constants.AUTO_SAVE_SETTLE_TIME
+
+    def test_get_next_save_after_a_burst_of_events_is_limited_by_save_duration(self) -> None:
+        auto_saver = auto_save.AutoSaver(600)
+        auto_saver.save_duration = 10
+        for _ in range(auto_save.constants.AUTO_SAVE_BURST_EVENTS):
+            auto_saver.add_event({"change": "close"})
+
+        assert auto_saver.get_next_save() == 10 * auto_save.constants.AUTO_SAVE_DURATION_FACTOR
+
+    def test_get_next_save_waits_until_a_deferred_save(self) -> None:
+        auto_saver = auto_save.AutoSaver(600)
+        auto_saver.deferred_until = 700
+        assert auto_saver.get_next_save() == 700
+
+    def test_add_event_ignores_changes_that_dont_change_the_session(self) -> None:
+        auto_saver = auto_save.AutoSaver(600)
+        auto_saver.current_interval = 1200
+
+        auto_saver.add_event({"change": "title"})
+        assert auto_saver.events == 0
+        assert auto_saver.current_interval == 1200
+
+        auto_saver.add_event({"change": "move"})
+        assert auto_saver.events == 1
+        assert auto_saver.current_interval == 600
+
+    def test_try_save_saves_when_the_system_is_not_busy(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(auto_save, "is_system_busy", return_value=False)
+        mock_save = mocker.patch.object(auto_save.AutoSaver, "save")
+        auto_saver = auto_save.AutoSaver(600)
+        auto_saver.deferred_since = 0
+
+        auto_saver.try_save()
+
+        mock_save.assert_called_once()
+        assert auto_saver.deferred_since is None
+
+    def test_try_save_defers_while_the_system_is_busy(
+        self, mocker: MockerFixture, mock_time: mock.Mock
+    ) -> None:
+        mocker.patch.object(auto_save, "is_system_busy", return_value=True)
+        mock_save = mocker.patch.object(auto_save.AutoSaver, "save")
+        auto_saver = auto_save.AutoSaver(600)
+
+        mock_time.return_value = 100
+        auto_saver.try_save()
+        mock_time.return_value = 650
+        auto_saver.try_save()
+
+        mock_save.assert_not_called()
+        assert auto_saver.deferred_since == 100
+        assert auto_saver.deferred_until == 650 + auto_save.constants.AUTO_SAVE_DEFER_TIME
+
+        # Saves are deferred for at most one interval
+        mock_time.return_value = 700
+        auto_saver.try_save()
+        mock_save.assert_called_once()
+        assert auto_saver.deferred_since is None
+
+    def test_save_backs_off_when_nothing_changed(
+        self, mocker: MockerFixture, mock_time: mock.Mock
+    ) -> None:
+        mock_run = mocker.patch("subprocess.run")
+        mock_run.return_value.returncode = 0
+        mocker.patch.object(auto_save, "get_workspace_hashes", return_value={"1": "a"})
+        mock_time.side_effect = [0, 100, 102, 200, 201, 300, 301]
+        auto_saver = auto_save.AutoSaver(600)
+
+        auto_saver.save()
+
+        mock_run.assert_called_once_with(
+            [auto_save.sys.executable, str(auto_save.SAVE_SCRIPT)], check=False
+        )
+        assert auto_saver.last_save == 102
+        assert auto_saver.save_duration == 2
+        assert auto_saver.current_interval == 1200
+
+        # The interval backs off up to a limit
+        auto_saver.save()
+        auto_saver.save()
+        assert auto_saver.current_interval == 600 * auto_save.constants.AUTO_SAVE_MAX_BACKOFF
+
+    @pytest.mark.parametrize(
+        ("events", "hashes"), [(1, [{"1": "a"}, {"1": "a"}]), (0, [{"1": "a"}, {"1": "b"}])]
+    )
+    def test_save_resets_the_interval_when_the_session_changed(
+        self, mocker: MockerFixture, events: int, hashes: list[dict[str, str]]
+    ) -> None:
+        mock_run = mocker.patch("subprocess.run")
+        mock_run.return_value.returncode = 0
+        mocker.patch.object(auto_save, "get_workspace_hashes", side_effect=hashes)
+        auto_saver = auto_save.AutoSaver(600)
+        auto_saver.current_interval = 1200
+        auto_saver.events = events
+
+        auto_saver.save()
+
+        assert auto_saver.current_interval == 600
+        assert auto_saver.events == 0
+
+    def test_save_resets_the_interval_when_saving_fails(self, mocker: MockerFixture) -> None:
+        mock_run = mocker.patch("subprocess.run")
+        mock_run.return_value.returncode = 1
+        mock_get_hashes = mocker.patch.object(auto_save, "get_workspace_hashes")
+        auto_saver = auto_save.AutoSaver(600)
+        auto_saver.current_interval = 1200
+
+        auto_saver.save()
+
+        assert auto_saver.current_interval == 600
+        mock_get_hashes.assert_called_once()
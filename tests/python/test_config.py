@@ -51,8 +51,18 @@ def test_read_config_returns_empty_config_when_file_is_not_found(mocker: MockerF
     [
         {"subprocesses": "invalid"},
         {"terminals": "invalid"},
+        {"terminals": [{"class": "URxvt", "command": "urxvt", "client_command": 1}]},
+        {
+            "terminals": [
+                {"class": "URxvt", "command": "urxvt", "server_command": "urxvtd -q -o -f"}
+            ]
+        },
         {"web_browsers": "invalid"},
         {"enabled_plugins": []},
+        {"launch_limits": []},
+        {"launch_limits": {"firefox": 0}},
+        {"launch_limits": {"firefox": "1"}},
+        {"metrics_dir": 1},
     ],
 )
 def test_parse_config_raises_exception_with_invalid_entries(config_content: dict[str, Any]) -> None:
@@ -68,8 +78,14 @@ def test_parse_config_sets_the_correct_config_values() -> None:
         "terminals": ["terminal1", "terminal2"],
         "web_browsers": ["browser1", "browser2"],
         "enabled_plugins": {
-            constants.KITTY_CLASS: {"listen_socket": "test-socket", "scrollback": "all"}
+            constants.KITTY_CLASS: {
+                "listen_socket": "test-socket",
+                "scrollback": "all",
+                "timeout": 2,
+            }
         },
+        "launch_limits": {"firefox": 1, "kitty": 8},
+        "metrics_dir": "/var/lib/node_exporter",
     }
 
     test_config = config.Config()
@@ -79,6 +95,8 @@ def test_parse_config_sets_the_correct_config_values() -> None:
     assert test_config.terminals == json_config["terminals"]
     assert test_config.web_browsers == json_config["web_browsers"]
     assert test_config.enabled_plugins == json_config["enabled_plugins"]
+    assert test_config.launch_limits == json_config["launch_limits"]
+    assert test_config.metrics_dir == json_config["metrics_dir"]
 
 
 def test_parse_config_does_not_set_values_when_a_config_value_is_empty() -> None:
@@ -91,6 +109,8 @@ def test_parse_config_does_not_set_values_when_a_config_value_is_empty() -> None
     assert test_config.terminals == expected_config.terminals
     assert test_config.web_browsers == expected_config.web_browsers
     assert test_config.enabled_plugins == expected_config.enabled_plugins
+    assert test_config.launch_limits == expected_config.launch_limits
+    assert test_config.metrics_dir == expected_config.metrics_dir
 
 
 def test_parse_config_warns_about_deprecated_args_keyword(mocker: MockerFixture) -> None:
@@ -113,27 +133,25 @@ def test_parse_plugins_parses_only_supported_plugins() -> None:
         {constants.KITTY_CLASS: {"listen_socket": "my_socket"}, "unsupported": "plugin"}
     )
 
-    assert len(parsed_plugins) == 1
+    assert parsed_plugins == {
+        constants.KITTY_CLASS: {"listen_socket": "my_socket", "timeout": constants.PLUGIN_TIMEOUT}
+    }
 
 
-# This test is only needed for now to test the case when no supported plugins are in the config at
-# all. Can be removed if/when more plugin parsers are supported.
 def test_parse_plugins_parses_empty_plugin_config() -> None:
     test_config = config.Config()
     assert not test_config._parse_plugins({})
 
 
-@pytest.mark.parametrize(
-    "plugin_config", ["", {}, {"listen_socket": "test-socket", "scrollback": "invalid"}]
-)
-def test_parse_kitty_config_raises_error_on_invalid_config(plugin_config: Any) -> None:
-    with pytest.raises(TypeError):
-        config.parse_kitty_plugin(plugin_config)
+def test_parse_plugins_keeps_configured_timeout() -> None:
+    test_config = config.Config()
+    parsed_plugins = test_config._parse_plugins({constants.KITTY_CLASS: {"timeout": 0.5}})
 
+    assert parsed_plugins[constants.KITTY_CLASS]["timeout"] == 0.5
 
-def test_parse_kitty_config_parses_config_correctly() -> None:
-    plugin_config = {"listen_socket": "my_socket", "scrollback": "all", "extra": "value"}
-    assert config.parse_kitty_plugin(plugin_config) == {
-        "listen_socket": "my_socket",
-        "scrollback": "all",
-    }
+
+@pytest.mark.parametrize("plugin_config", ["", {"timeout": 0}, {"timeout": "5"}, {"timeout": True}])
+def test_parse_plugins_raises_error_on_invalid_config(plugin_config: Any) -> None:
+    test_config = config.Config()
+    with pytest.raises(TypeError):
+        test_config._parse_plugins({constants.KITTY_CLASS: plugin_config})
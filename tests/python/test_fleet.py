@@ -0,0 +1,200 @@
+import os
+import pathlib
+import pwd
+from unittest import mock
+
+import psutil
+import pytest
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import fleet
+
+
+@pytest.fixture
+def socket_dir(mocker: MockerFixture, tmp_path: pathlib.Path) -> pathlib.Path:
+    mocker.patch.object(
+        fleet.constants,
+        "I3_SOCKET_PATTERNS",
+        ["{runtime_dir}/i3/ipc-socket.{pid}", f"{tmp_path}/tmp/i3-*/ipc-socket.{{pid}}"],
+    )
+    return tmp_path
+
+
+def mock_i3_process(
+    mocker: MockerFixture, pid: int, environment: dict[str, str], name: str = "i3"
+) -> mock.Mock:
+    process = mocker.Mock(pid=pid, info={"ppid": 1, "name": name})
+    process.uids.return_value.real = 1000
+    process.gids.return_value.real = 1000
+    process.environ.return_value = environment
+    return process
+
+
+@pytest.fixture
+def mock_getpwuid(mocker: MockerFixture) -> mock.Mock:
+    user = mocker.Mock(pw_name="user", pw_dir="/home/user")
+    get_user = pwd.getpwuid
+    # Only the session's user is mocked, as pytest looks up the current user too
+    return mocker.patch(
+        "pwd.getpwuid", side_effect=lambda uid: user if uid == 1000 else get_user(uid)
+    )
+
+
+@pytest.mark.usefixtures("mock_getpwuid")
+class TestSession:
+    def test_session_is_found_from_its_i3_process(
+        self, mocker: MockerFixture, socket_dir: pathlib.Path
+    ) -> None:
+        socket = socket_dir / "run" / "i3" / "ipc-socket.100"
+        socket.parent.mkdir(parents=True)
+        socket.touch()
+        environment = {"DISPLAY": ":1", "XDG_RUNTIME_DIR": str(socket_dir / "run")}
+
+        session = fleet.Session(mock_i3_process(mocker, 100, environment))
+
+        assert session.display == ":1"
+        assert session.socket_path == str(socket)
+        assert session.i3_path == "/home/user/.config/i3"
+        assert repr(session) == "Session(pid=100, user='user', display=':1')"
+
+    def test_session_saves_into_the_i3_path_it_was_started_with(
+        self, mocker: MockerFixture, socket_dir: pathlib.Path
+    ) -> None:
+        socket = socket_dir / "tmp" / "i3-user.abc" / "ipc-socket.100"
+        socket.parent.mkdir(parents=True)
+        socket.touch()
+
+        session = fleet.Session(mock_i3_process(mocker, 100, {"i3_PATH": "/i3"}))
+
+        assert session.socket_path == str(socket)
+        assert session.i3_path == "/i3"
+
+    @pytest.mark.usefixtures("socket_dir")
+    def test_session_requires_an_ipc_socket(self, mocker: MockerFixture) -> None:
+        with pytest.raises(FileNotFoundError):
+            fleet.Session(mock_i3_process(mocker, 100, {}))
+
+    @pytest.mark.parametrize(("uid", "drops_privileges"), [(0, True), (1000, False)])
+    def test_enter_switches_to_the_session(
+        self, mocker: MockerFixture, uid: int, drops_privileges: bool
+    ) -> None:
+        mocker.patch.object(fleet, "get_socket_path", return_value="/run/i3/ipc-socket.100")
+        mocker.patch("os.getuid", return_value=uid)
+        mock_setgid = mocker.patch("os.setgid")
+        mock_initgroups = mocker.patch("os.initgroups")
+        mock_setuid = mocker.patch("os.setuid")
+        mocker.patch.dict(os.environ, clear=True)
+        mocker.patch.object(fleet.utils, "i3_PATH", "/root/.config/i3")
+
+        fleet.Session(mock_i3_process(mocker, 100, {"DISPLAY": ":1"})).enter()
+
+        assert os.environ["I3SOCK"] == "/run/i3/ipc-socket.100"
+        assert os.environ["DISPLAY"] == ":1"
+        assert fleet.utils.i3_PATH == "/home/user/.config/i3"
+        if drops_privileges:
+            mock_setgid.assert_called_once_with(1000)
+            mock_initgroups.assert_called_once_with("user", 1000)
+            mock_setuid.assert_called_once_with(1000)
+            assert os.environ["HOME"] == "/home/user"
+        else:
+            mock_setuid.assert_not_called()
+
+    def test_enter_keeps_the_display_without_one(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(fleet, "get_socket_path", return_value="/run/i3/ipc-socket.100")
+        mocker.patch("os.getuid", return_value=1000)
+        mocker.patch.dict(os.environ, {"DISPLAY": ":0"}, clear=True)
+        mocker.patch.object(fleet.utils, "i3_PATH", "/root/.config/i3")
+
+        fleet.Session(mock_i3_process(mocker, 100, {})).enter()
+
+        assert os.environ["DISPLAY"] == ":0"
+
+    def test_enter_uses_the_authorization_file_of_the_display(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(fleet, "get_socket_path", return_value="/run/i3/ipc-socket.100")
+        mocker.patch("os.getuid", return_value=1000)
+        mocker.patch.dict(os.environ, {"XAUTHORITY": "/root/.Xauthority"}, clear=True)
+        mocker.patch.object(fleet.utils, "i3_PATH", "/root/.config/i3")
+        environment = {"DISPLAY": ":99", "XAUTHORITY": "/tmp/xvfb-run.abc/Xauthority"}
+
+        fleet.Session(mock_i3_process(mocker, 100, environment)).enter()
+
+        assert os.environ["DISPLAY"] == ":99"
+        assert os.environ["XAUTHORITY"] == "/tmp/xvfb-run.abc/Xauthority"
+
+    def test_enter_uses_the_default_authorization_file_without_one(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(fleet, "get_socket_path", return_value="/run/i3/ipc-socket.100")
+        mocker.patch("os.getuid", return_value=1000)
+        mocker.patch.dict(os.environ, {"XAUTHORITY": "/root/.Xauthority"}, clear=True)
+        mocker.patch.object(fleet.utils, "i3_PATH", "/root/.config/i3")
+
+        fleet.Session(mock_i3_process(mocker, 100, {"DISPLAY": ":1"})).enter()
+
+        assert "XAUTHORITY" not in os.environ
+
+
+@pytest.mark.usefixtures("mock_getpwuid")
+def test_find_sessions_finds_each_accessible_i3_session(mocker: MockerFixture) -> None:
+    mocker.patch.object(fleet, "get_socket_path", return_value="/run/i3/ipc-socket")
+    session1 = mock_i3_process(mocker, 100, {"i3_PATH": "/i3/1"})
+    session2 = mock_i3_process(mocker, 101, {"i3_PATH": "/i3/2"})
+    inaccessible = mock_i3_process(mocker, 102, {})
+    inaccessible.environ.side_effect = psutil.AccessDenied(102)
+    same_path = mock_i3_process(mocker, 103, {"i3_PATH": "/i3/1"})
+    other_process = mock_i3_process(mocker, 104, {}, name="bash")
+
+    sessions = fleet.find_sessions([session1, other_process, inaccessible, session2, same_path])
+
+    assert [session.pid for session in sessions] == [100, 101]
+
+
+def test_save_sessions_saves_each_session_in_a_forked_process(mocker: MockerFixture) -> None:
+    mocker.patch("os.cpu_count", return_value=2)
+    mock_fork = mocker.patch("os.fork", side_effect=[1, 2, 3])
+    # The second session failed
+    mock_wait = mocker.patch("os.wait", side_effect=[(2, 256), (1, 0), (3, 0)])
+    mocker.patch.object(fleet.utils, "start_forked_log_listener")
+    mocker.patch.object(fleet.utils, "stop_forked_log_listener")
+    sessions = [mocker.Mock(), mocker.Mock(), mocker.Mock()]
+
+    failed_sessions = fleet.save_sessions(sessions, mocker.Mock())
+
+    assert mock_fork.call_count == 3
+    assert mock_wait.call_count == 3
+    assert failed_sessions == [sessions[1]]
+
+
+def test_save_sessions_exits_the_forked_process_after_saving(mocker: MockerFixture) -> None:
+    mocker.patch("os.fork", return_value=0)
+    mocker.patch("os.wait", return_value=(0, 0))
+    mock_exit = mocker.patch("os._exit")
+    mock_save_session = mocker.patch.object(fleet, "save_session", return_value=0)
+    mock_start_listener = mocker.patch.object(fleet.utils, "start_forked_log_listener")
+    mock_stop_listener = mocker.patch.object(fleet.utils, "stop_forked_log_listener")
+    mock_log_to_queue = mocker.patch.object(fleet.utils, "log_to_queue")
+    session = mocker.Mock()
+    save = mocker.Mock()
+
+    fleet.save_sessions([session], save)
+
+    # The forked process sends its log records to this process
+    mock_log_to_queue.assert_called_once_with(mock_start_listener.return_value)
+    mock_save_session.assert_called_once_with(session, save)
+    mock_exit.assert_called_once_with(0)
+    mock_stop_listener.assert_called_once()
+
+
+@pytest.mark.parametrize(("error", "exit_code"), [(None, 0), (RuntimeError, 1)])
+def test_save_session_saves_in_the_session(
+    mocker: MockerFixture, error: type[Exception] | None, exit_code: int
+) -> None:
+    session = mocker.Mock()
+    save = mocker.Mock(side_effect=error)
+
+    assert fleet.save_session(session, save) == exit_code
+
+    session.enter.assert_called_once()
+    save.assert_called_once()
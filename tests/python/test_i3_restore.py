@@ -0,0 +1,681 @@
+import json
+import pathlib
+import subprocess
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import i3_restore
+
+from programs import tree
+
+
+# Make sure we don't actually read the config file
+@pytest.fixture(autouse=True)
+def mock_read_config(mocker: MockerFixture) -> None:
+    mocker.patch.object(i3_restore.config.Config, "_read_config", return_value={})
+
+
+@pytest.fixture(autouse=True)
+def i3_path(mocker: MockerFixture, tmp_path: pathlib.Path) -> pathlib.Path:
+    mocker.patch.object(i3_restore.utils, "i3_PATH", str(tmp_path))
+    return tmp_path
+
+
+I3_TREE = tree.parse_tree(
+    json.dumps(
+        {
+            "type": "root",
+            "nodes": [
+                {
+                    "type": "output",
+                    "nodes": [
+                        {
+                            "type": "workspace",
+                            "name": "1",
+                            "nodes": [
+                                {"window": 101, "nodes": []},
+                                {"window": None, "nodes": [{"window": 102, "nodes": []}]},
+                            ],
+                            "floating_nodes": [{"nodes": [{"window": 103, "nodes": []}]}],
+                        },
+                        {"type": "workspace", "name": "2", "nodes": [{"window": 201, "nodes": []}]},
+                    ],
+                }
+            ],
+        }
+    )
+)
+
+
+def mock_scheduler() -> mock.Mock:
+    launch_scheduler = mock.Mock()
+    # Launch the containers in their saved order
+    launch_scheduler.get_launch_order.side_effect = lambda classes: list(range(len(classes)))
+    launch_scheduler.windows = {}
+    return launch_scheduler
+
+
+WORKSPACE = {
+    "name": "1",
+    "output": "HDMI-1",
+    "output_command": "output command",
+    "layout_command": "layout command",
+    "launch_commands": ["launch 0", "launch 1"],
+}
+
+
+def test_main_restores_workspaces_from_plan(mocker: MockerFixture) -> None:
+    restore_plan = {"version": 1, "workspaces": [WORKSPACE]}
+    mocker.patch.object(i3_restore.plan, "load_plan", return_value=restore_plan)
+    mock_connection = mocker.patch.object(i3_restore.ipc, "Connection")
+    mock_scheduler = mocker.patch.object(i3_restore.scheduler, "LaunchScheduler")
+    mock_start_journal = mocker.patch.object(i3_restore.journal, "start_journal")
+    mock_start_journal.return_value.finished = False
+    mock_restore_workspaces = mocker.patch.object(i3_restore, "restore_workspaces")
+    mock_write_metrics = mocker.patch.object(i3_restore.metrics, "write_metrics")
+
+    i3_restore.main(["--workspace", "1", "--batch-layouts"])
+
+    mock_start_journal.assert_called_once_with(False)
+    mock_restore_workspaces.assert_called_once_with(
+        mock_connection.return_value,
+        mock_scheduler.return_value,
+        restore_plan,
+        ["1"],
+        lazy=False,
+        batch_layouts=True,
+        restore_journal=mock_start_journal.return_value,
+    )
+    mock_scheduler.return_value.save_startup_times.assert_called_once()
+    mock_scheduler.return_value.close.assert_called_once()
+    mock_connection.return_value.close.assert_called_once()
+    assert mock_write_metrics.call_args[0][1:3] == ("restore", True)
+
+
+def test_main_does_nothing_when_resuming_a_finished_restore(mocker: MockerFixture) -> None:
+    mocker.patch.object(i3_restore.plan, "load_plan")
+    mock_start_journal = mocker.patch.object(i3_restore.journal, "start_journal")
+    mock_start_journal.return_value.finished = True
+    mock_connection = mocker.patch.object(i3_restore.ipc, "Connection")
+
+    i3_restore.main(["--resume"])
+
+    mock_start_journal.assert_called_once_with(True)
+    mock_connection.assert_not_called()
+
+
+def test_main_watches_lazy_workspaces(mocker: MockerFixture) -> None:
+    mock_watch_lazy_workspaces = mocker.patch.object(i3_restore, "watch_lazy_workspaces")
+    mock_connection = mocker.patch.object(i3_restore.ipc, "Connection")
+
+    i3_restore.main(["--watch-lazy"])
+
+    mock_watch_lazy_workspaces.assert_called_once()
+    mock_connection.assert_not_called()
+
+
+def test_restore_workspaces_only_restores_selected_workspaces(mocker: MockerFixture) -> None:
+    mock_restore_workspace = mocker.patch.object(i3_restore, "restore_workspace")
+    mock_save_lazy_workspaces = mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    workspaces = [{"name": "1"}, {"name": "2"}]
+    connection = mock.Mock()
+    launch_scheduler = mock.Mock()
+
+    i3_restore.restore_workspaces(connection, launch_scheduler, {"workspaces": workspaces})
+    assert mock_restore_workspace.call_count == 2
+    # Lazy workspaces from a previous restore are cleared
+    mock_save_lazy_workspaces.assert_called_once_with([])
+
+    mock_restore_workspace.reset_mock()
+    mock_save_lazy_workspaces.reset_mock()
+    i3_restore.restore_workspaces(connection, launch_scheduler, {"workspaces": workspaces}, ["2"])
+    mock_restore_workspace.assert_called_once_with(
+        connection, launch_scheduler, {"name": "2"}, mock.ANY
+    )
+    mock_save_lazy_workspaces.assert_not_called()
+
+
+def test_restore_workspaces_starts_terminal_servers_of_selected_workspaces(
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch.object(i3_restore, "restore_workspace")
+    mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    mock_start_terminal_servers = mocker.patch.object(i3_restore, "start_terminal_servers")
+    workspaces = [{"name": "1"}, {"name": "2"}]
+
+    i3_restore.restore_workspaces(mock.Mock(), mock.Mock(), {"workspaces": workspaces}, ["2"])
+    mock_start_terminal_servers.assert_called_once_with([{"name": "2"}])
+
+
+def test_restore_workspaces_resumes_from_the_journal(mocker: MockerFixture) -> None:
+    mock_restore_workspace = mocker.patch.object(i3_restore, "restore_workspace")
+    mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    mock_start_terminal_servers = mocker.patch.object(i3_restore, "start_terminal_servers")
+    workspaces = [{"name": "1"}, {"name": "2"}]
+    connection = mock.Mock()
+    launch_scheduler = mock.Mock()
+    restore_journal = i3_restore.journal.RestoreJournal()
+    restore_journal.servers_started = True
+    restore_journal.set_restored(["1"])
+
+    i3_restore.restore_workspaces(
+        connection, launch_scheduler, {"workspaces": workspaces}, restore_journal=restore_journal
+    )
+
+    mock_start_terminal_servers.assert_not_called()
+    mock_restore_workspace.assert_called_once_with(
+        connection, launch_scheduler, {"name": "2"}, restore_journal
+    )
+    launch_scheduler.wait_for_late_windows.assert_called_once()
+    assert restore_journal.finished
+
+
+@pytest.mark.parametrize(
+    ("workspace_names", "browsers_restored", "restores_browsers"),
+    [(None, False, True), (None, True, False), (["1"], False, False)],
+)
+def test_restore_workspaces_restores_browsers_once_with_the_whole_session(
+    mocker: MockerFixture,
+    workspace_names: list[str] | None,
+    browsers_restored: bool,
+    restores_browsers: bool,
+) -> None:
+    mocker.patch.object(i3_restore, "restore_workspace")
+    mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    mocker.patch.object(i3_restore, "start_terminal_servers")
+    mock_restore_browsers = mocker.patch.object(i3_restore, "restore_browsers")
+    connection = mock.Mock()
+    restore_journal = i3_restore.journal.RestoreJournal()
+    restore_journal.browsers_restored = browsers_restored
+
+    i3_restore.restore_workspaces(
+        connection,
+        mock.Mock(),
+        {"workspaces": [{"name": "1"}]},
+        workspace_names,
+        restore_journal=restore_journal,
+    )
+
+    if restores_browsers:
+        mock_restore_browsers.assert_called_once_with(connection, restore_journal)
+    else:
+        mock_restore_browsers.assert_not_called()
+
+
+def test_restore_browsers_opens_the_saved_browsers(
+    mocker: MockerFixture, i3_path: pathlib.Path
+) -> None:
+    mock_sleep = mocker.patch("time.sleep")
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}]
+    restore_journal = i3_restore.journal.RestoreJournal()
+
+    i3_restore.restore_browsers(connection, restore_journal)
+    connection.command.assert_not_called()
+    assert not restore_journal.browsers_restored
+
+    browser_file = i3_path / "web_browsers.sh"
+    browser_file.write_text("firefox\n")
+    i3_restore.restore_browsers(connection, restore_journal)
+
+    assert browser_file.stat().st_mode & 0o111 == 0o111
+    connection.command.assert_called_once_with(f'exec "{browser_file}"')
+    assert restore_journal.browsers_restored
+    mock_sleep.assert_called_once_with(i3_restore.constants.BROWSER_SWALLOW_TIME)
+
+
+def test_restore_workspaces_prefetches_the_files_of_restored_workspaces(
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch.object(i3_restore, "restore_workspace")
+    mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    mocker.patch.object(i3_restore, "start_terminal_servers")
+    mock_start_prefetch = mocker.patch.object(i3_restore.prefetch, "start_prefetch")
+    workspaces = [
+        {"name": "1", "prefetch_files": ["/usr/bin/vim"]},
+        {"name": "2", "prefetch_files": ["/usr/bin/kitty"], "focused": True},
+        {"name": "3", "prefetch_files": ["/usr/bin/firefox"]},
+        # Plans saved before prefetching was added have no prefetch files
+        {"name": "4"},
+    ]
+    restore_journal = i3_restore.journal.RestoreJournal()
+    restore_journal.set_restored(["3"])
+
+    i3_restore.restore_workspaces(
+        mock.Mock(), mock.Mock(), {"workspaces": workspaces}, restore_journal=restore_journal
+    )
+
+    # The files of the workspaces restored first are prefetched first
+    mock_start_prefetch.assert_called_once_with(["/usr/bin/kitty", "/usr/bin/vim"])
+    mock_start_prefetch.return_value.shutdown.assert_called_once_with(
+        wait=False, cancel_futures=True
+    )
+
+
+def test_start_terminal_servers_starts_each_server_once(mocker: MockerFixture) -> None:
+    mock_popen = mocker.patch("subprocess.Popen")
+    mock_popen.return_value.wait.return_value = 0
+    workspaces = [
+        {"server_commands": ["urxvtd -q -o -f", "emacs --daemon"]},
+        {"server_commands": ["urxvtd -q -o -f"]},
+        # Plans saved before terminal servers were added have no server commands
+        {},
+    ]
+
+    i3_restore.start_terminal_servers(workspaces)
+    assert [call.args[0] for call in mock_popen.call_args_list] == [
+        "urxvtd -q -o -f",
+        "emacs --daemon",
+    ]
+    # Each server is waited for until it forks into the background
+    assert mock_popen.return_value.wait.call_count == 2
+
+    mock_popen.reset_mock()
+    i3_restore.start_terminal_servers([{"server_commands": []}])
+    mock_popen.assert_not_called()
+
+
+def test_start_terminal_servers_only_waits_until_the_timeout(mocker: MockerFixture) -> None:
+    mock_time = mocker.patch("time.monotonic", return_value=0)
+    servers = [mock.Mock(), mock.Mock(), mock.Mock()]
+    mocker.patch("subprocess.Popen", side_effect=servers)
+
+    def wait_for_first_server(timeout: float) -> int:
+        mock_time.return_value = i3_restore.constants.SERVER_START_TIMEOUT + 1
+        raise subprocess.TimeoutExpired("server", timeout)
+
+    servers[0].wait.side_effect = wait_for_first_server
+    servers[1].wait.return_value = 1
+    servers[2].wait.return_value = 0
+
+    i3_restore.start_terminal_servers([{"server_commands": ["server1", "server2", "server3"]}])
+
+    servers[0].wait.assert_called_once_with(i3_restore.constants.SERVER_START_TIMEOUT)
+    # The other servers are only checked once the timeout passed
+    servers[1].wait.assert_called_once_with(0)
+    servers[2].wait.assert_called_once_with(0)
+
+
+def test_restore_workspaces_only_restores_visible_workspaces_when_lazy(
+    mocker: MockerFixture,
+) -> None:
+    mock_restore_workspace = mocker.patch.object(i3_restore, "restore_workspace")
+    mock_save_lazy_workspaces = mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    workspaces = [{"name": "1"}, {"name": "2"}, {"name": "3"}]
+    connection = mock.Mock()
+    launch_scheduler = mock.Mock()
+    connection.get_workspaces.return_value = [
+        {"name": "1", "visible": False},
+        {"name": "2", "visible": True},
+    ]
+
+    i3_restore.restore_workspaces(
+        connection, launch_scheduler, {"workspaces": workspaces}, lazy=True
+    )
+
+    mock_restore_workspace.assert_called_once_with(
+        connection, launch_scheduler, {"name": "2"}, mock.ANY
+    )
+    mock_save_lazy_workspaces.assert_called_once_with(["1", "3"])
+
+
+def test_restore_workspaces_restores_saved_visible_workspaces_when_lazy(
+    mocker: MockerFixture,
+) -> None:
+    mock_restore_workspace = mocker.patch.object(i3_restore, "restore_workspace")
+    mock_save_lazy_workspaces = mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    workspaces = [{"name": "1"}, {"name": "2", "visible": True}]
+    connection = mock.Mock()
+    launch_scheduler = mock.Mock()
+    connection.get_workspaces.return_value = []
+
+    i3_restore.restore_workspaces(
+        connection, launch_scheduler, {"workspaces": workspaces}, lazy=True
+    )
+
+    mock_restore_workspace.assert_called_once_with(
+        connection, launch_scheduler, {"name": "2", "visible": True}, mock.ANY
+    )
+    mock_save_lazy_workspaces.assert_called_once_with(["1"])
+
+
+def test_get_restore_order_restores_focused_and_visible_workspaces_first() -> None:
+    workspaces = [
+        {"name": "1"},
+        {"name": "2", "focused": False, "visible": True},
+        {"name": "3"},
+        {"name": "4", "focused": True, "visible": True},
+    ]
+
+    order = [ws["name"] for ws in i3_restore.get_restore_order(workspaces)]
+
+    assert order == ["4", "2", "1", "3"]
+
+
+def test_restore_workspace_runs_the_plan_commands_in_order(mocker: MockerFixture) -> None:
+    mock_set_windows_mapped = mocker.patch.object(i3_restore, "set_windows_mapped")
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}]
+    connection.get_tree.return_value = I3_TREE
+    connection.get_marks.return_value = []
+    launch_scheduler = mock_scheduler()
+    launch_scheduler.windows = {("1", 0): 103, ("1", 1): 101}
+
+    restore_journal = i3_restore.journal.RestoreJournal()
+
+    i3_restore.restore_workspace(connection, launch_scheduler, WORKSPACE, restore_journal)
+
+    assert connection.command.call_args_list == [
+        mock.call("launch 0"),
+        mock.call("launch 1"),
+        mock.call("output command; layout command"),
+    ]
+    # The launched windows are mapped in the order of their placeholders
+    assert mock_set_windows_mapped.call_args_list == [
+        mock.call([103, 101, 102], mapped=False),
+        mock.call([103, 101, 102], mapped=True),
+    ]
+    launch_scheduler.wait_for_all.assert_called_once()
+    assert restore_journal.get_launched("1") == {0, 1}
+    assert restore_journal.is_restored("1")
+
+
+def test_restore_workspace_restores_focus_once_the_layout_is_appended(
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch.object(i3_restore, "set_windows_mapped")
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}]
+    connection.get_tree.return_value = I3_TREE
+    connection.get_marks.return_value = [i3_restore.constants.FOCUS_MARK]
+
+    i3_restore.restore_workspace(
+        connection, mock_scheduler(), WORKSPACE, i3_restore.journal.RestoreJournal()
+    )
+
+    assert connection.command.call_args_list[-2:] == [
+        mock.call("output command; layout command"),
+        # The mark is kept so i3-restore can remove it once every workspace is restored
+        mock.call('[con_mark="_i3_restore_focus"] focus'),
+    ]
+
+
+def test_restore_workspaces_batches_layouts(mocker: MockerFixture) -> None:
+    mock_restore_workspace = mocker.patch.object(i3_restore, "restore_workspace")
+    mock_restore_batched = mocker.patch.object(i3_restore, "restore_workspaces_batched")
+    mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    workspaces = [{"name": "1"}, {"name": "2", "focused": True}]
+    connection = mock.Mock()
+    launch_scheduler = mock.Mock()
+
+    i3_restore.restore_workspaces(
+        connection, launch_scheduler, {"workspaces": workspaces}, batch_layouts=True
+    )
+
+    mock_restore_workspace.assert_not_called()
+    mock_restore_batched.assert_called_once_with(
+        connection, launch_scheduler, [workspaces[1], workspaces[0]], mock.ANY
+    )
+
+    # Nothing is restored when no workspace is selected
+    mock_restore_batched.reset_mock()
+    i3_restore.restore_workspaces(
+        connection, launch_scheduler, {"workspaces": workspaces}, ["3"], batch_layouts=True
+    )
+    mock_restore_batched.assert_not_called()
+
+
+def test_restore_workspaces_batched_appends_every_layout_at_once(mocker: MockerFixture) -> None:
+    mock_set_windows_mapped = mocker.patch.object(i3_restore, "set_windows_mapped")
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}] * 4
+    connection.get_tree.return_value = I3_TREE
+    connection.get_marks.return_value = []
+    launch_scheduler = mock_scheduler()
+    workspace_2 = {
+        "name": "2",
+        "output_command": "output command 2",
+        "layout_command": "layout command 2",
+        "launch_commands": ["launch 2"],
+    }
+
+    restore_journal = i3_restore.journal.RestoreJournal()
+
+    i3_restore.restore_workspaces_batched(
+        connection, launch_scheduler, [WORKSPACE, workspace_2], restore_journal
+    )
+
+    assert connection.command.call_args_list == [
+        mock.call("launch 0"),
+        mock.call("launch 1"),
+        mock.call("launch 2"),
+        mock.call("output command; layout command; output command 2; layout command 2"),
+    ]
+    connection.get_tree.assert_called_once()
+    assert mock_set_windows_mapped.call_args_list == [
+        mock.call([101, 102, 103, 201], mapped=False),
+        mock.call([101, 102, 103, 201], mapped=True),
+    ]
+    launch_scheduler.wait_for_all.assert_called_once()
+    assert restore_journal.is_restored("1")
+    assert restore_journal.is_restored("2")
+
+
+def test_get_map_order_maps_launched_windows_in_placeholder_order() -> None:
+    launched_windows = {("1", 0): 300, ("1", 1): 100, ("2", 0): 200}
+
+    # Launched windows that aren't on the workspace (such as windows that moved) aren't mapped
+    order = i3_restore.get_map_order(WORKSPACE, [100, 200, 400], launched_windows)
+    assert order == [100, 200, 400]
+
+    order = i3_restore.get_map_order(WORKSPACE, [100, 200, 300], launched_windows)
+    assert order == [300, 100, 200]
+
+
+def test_launch_programs_launches_through_the_scheduler() -> None:
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}]
+    launch_scheduler = mock.Mock()
+    # Firefox takes longer to start, so it is launched first
+    launch_scheduler.get_launch_order.return_value = [1, 0]
+    workspace = {**WORKSPACE, "launch_classes": ["kitty", "firefox"]}
+
+    i3_restore.launch_programs(connection, launch_scheduler, workspace)
+
+    assert launch_scheduler.mock_calls == [
+        mock.call.get_launch_order(["kitty", "firefox"]),
+        mock.call.wait_for_slot("firefox"),
+        mock.call.add("firefox", ("1", 1)),
+        mock.call.wait_for_slot("kitty"),
+        mock.call.add("kitty", ("1", 0)),
+    ]
+    assert connection.command.call_args_list == [mock.call("launch 1"), mock.call("launch 0")]
+
+
+def test_launch_programs_skips_programs_that_were_already_launched() -> None:
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}]
+    restore_journal = i3_restore.journal.RestoreJournal()
+    restore_journal.set_launched("1", 0)
+
+    i3_restore.launch_programs(connection, mock_scheduler(), WORKSPACE, restore_journal)
+
+    connection.command.assert_called_once_with("launch 1")
+    assert restore_journal.get_launched("1") == {0, 1}
+
+
+def test_launch_programs_skips_launched_programs_when_the_launch_order_changed() -> None:
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}]
+    launch_scheduler = mock.Mock()
+    # The startup times changed since the programs were launched in their original order
+    launch_scheduler.get_launch_order.return_value = [1, 0]
+    restore_journal = i3_restore.journal.RestoreJournal()
+    restore_journal.set_launched("1", 0)
+
+    i3_restore.launch_programs(connection, launch_scheduler, WORKSPACE, restore_journal)
+
+    connection.command.assert_called_once_with("launch 1")
+    assert restore_journal.get_launched("1") == {0, 1}
+
+
+def test_watch_lazy_workspaces_does_nothing_without_lazy_workspaces(
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch.object(i3_restore.plan, "load_lazy_workspaces", return_value=[])
+    mocker.patch.object(i3_restore.plan, "load_plan", return_value={"workspaces": [WORKSPACE]})
+    mock_connect = mocker.patch.object(i3_restore.ipc, "connect")
+
+    i3_restore.watch_lazy_workspaces()
+
+    mock_connect.assert_not_called()
+
+
+def test_watch_lazy_workspaces_restores_workspaces_when_focused(mocker: MockerFixture) -> None:
+    workspaces = [{"name": "1"}, {"name": "2"}, {"name": "3"}, {"name": "4"}]
+    mocker.patch.object(i3_restore.plan, "load_lazy_workspaces", return_value=["2", "3", "4"])
+    mocker.patch.object(i3_restore.plan, "load_plan", return_value={"workspaces": workspaces})
+    mock_save_lazy_workspaces = mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    mock_append_lazy_layouts = mocker.patch.object(i3_restore, "append_lazy_layouts")
+    mock_launch_programs = mocker.patch.object(i3_restore, "launch_programs")
+    mock_scheduler = mocker.patch.object(i3_restore.scheduler, "LaunchScheduler")
+    launch_scheduler = mock_scheduler.return_value
+
+    connection = mock.Mock()
+    connection.get_workspaces.return_value = [
+        {"name": "1", "visible": True},
+        {"name": "2", "visible": True},
+    ]
+    connection.receive_event.side_effect = [
+        (i3_restore.ipc.WORKSPACE_EVENT, {"change": "focus", "current": {"name": "1"}}),
+        (i3_restore.ipc.WORKSPACE_EVENT, {"change": "init", "current": {"name": "5"}}),
+        (i3_restore.ipc.SHUTDOWN_EVENT, {"change": "restart"}),
+        (i3_restore.ipc.WORKSPACE_EVENT, {"change": "focus", "current": {"name": "3"}}),
+        (i3_restore.ipc.WORKSPACE_EVENT, {"change": "focus", "current": {"name": "4"}}),
+    ]
+    mock_connect = mocker.patch.object(i3_restore.ipc, "connect", return_value=connection)
+
+    i3_restore.watch_lazy_workspaces()
+
+    mock_append_lazy_layouts.assert_called_once_with(
+        connection, [{"name": "2"}, {"name": "3"}, {"name": "4"}]
+    )
+    assert mock_launch_programs.call_args_list == [
+        mock.call(connection, launch_scheduler, {"name": "2"}),
+        mock.call(connection, launch_scheduler, {"name": "3"}),
+        mock.call(connection, launch_scheduler, {"name": "4"}),
+    ]
+    # The connections are reopened after i3 restarts
+    assert mock_connect.call_count == 2
+    assert mock_scheduler.call_count == 2
+    assert connection.subscribe.call_count == 2
+    assert mock_save_lazy_workspaces.call_args_list[-1] == mock.call([])
+
+
+def test_watch_lazy_workspaces_stops_when_i3_exits(mocker: MockerFixture) -> None:
+    mocker.patch.object(i3_restore.plan, "load_lazy_workspaces", return_value=["1"])
+    mocker.patch.object(i3_restore.plan, "load_plan", return_value={"workspaces": [WORKSPACE]})
+    mock_save_lazy_workspaces = mocker.patch.object(i3_restore.plan, "save_lazy_workspaces")
+    mocker.patch.object(i3_restore, "append_lazy_layouts")
+    mock_launch_programs = mocker.patch.object(i3_restore, "launch_programs")
+    mocker.patch.object(i3_restore.scheduler, "LaunchScheduler")
+
+    connection = mock.Mock()
+    connection.get_workspaces.return_value = []
+    connection.receive_event.return_value = (i3_restore.ipc.SHUTDOWN_EVENT, {"change": "exit"})
+    mocker.patch.object(i3_restore.ipc, "connect", return_value=connection)
+
+    i3_restore.watch_lazy_workspaces()
+
+    mock_launch_programs.assert_not_called()
+    connection.close.assert_called_once()
+    mock_save_lazy_workspaces.assert_called_once_with(["1"])
+
+
+def test_append_lazy_layouts_restores_focus_to_the_focus_mark() -> None:
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}]
+    connection.get_workspaces.return_value = [{"name": "1", "focused": True}]
+    connection.get_marks.return_value = [i3_restore.constants.FOCUS_MARK]
+
+    i3_restore.append_lazy_layouts(connection, [WORKSPACE])
+
+    assert connection.command.call_args_list == [
+        mock.call("output command; layout command"),
+        mock.call('[con_mark="_i3_restore_focus"] focus; unmark _i3_restore_focus'),
+    ]
+
+
+def test_append_lazy_layouts_focuses_the_previously_focused_workspace() -> None:
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}]
+    connection.get_workspaces.return_value = [
+        {"name": "1", "focused": False},
+        {"name": "2", "focused": True},
+    ]
+    connection.get_marks.return_value = []
+
+    i3_restore.append_lazy_layouts(connection, [WORKSPACE])
+
+    connection.command.assert_called_with('workspace --no-auto-back-and-forth "2"')
+
+
+def test_run_command_reports_failed_commands() -> None:
+    connection = mock.Mock()
+    connection.command.return_value = [{"success": True}]
+    assert i3_restore.run_command(connection, "command")
+
+    connection.command.return_value = [{"success": True}, {"success": False, "error": "error"}]
+    assert not i3_restore.run_command(connection, "command; other command")
+
+
+def test_run_commands_matches_results_to_their_commands(mocker: MockerFixture) -> None:
+    mock_logger = mocker.patch.object(i3_restore, "logger")
+    connection = mock.Mock()
+    connection.command.return_value = [
+        {"success": True},
+        {"success": False, "error": "No output matched"},
+        {"success": True},
+        {"success": True},
+    ]
+
+    commands = ['workspace "1"; move workspace to output "DP-1"', 'workspace "1"; append_layout x']
+    assert i3_restore.run_commands(connection, commands, optional_commands=[commands[0]])
+
+    connection.command.assert_called_once_with("; ".join(commands))
+    # The failed optional command is only logged as info
+    mock_logger.error.assert_not_called()
+    assert mock_logger.info.call_args[0][1] == commands[0]
+
+    connection.command.return_value = connection.command.return_value[:3]
+    assert not i3_restore.run_commands(connection, commands, optional_commands=[commands[0]])
+    assert mock_logger.error.call_args[0][1:] == (commands[1], "Not run")
+
+
+def test_get_window_ids_on_workspace_returns_no_ids_for_unknown_workspace() -> None:
+    assert i3_restore.get_window_ids_on_workspace(I3_TREE, "unknown") == []
+
+
+def test_get_window_ids_on_workspace_returns_window_ids() -> None:
+    assert i3_restore.get_window_ids_on_workspace(I3_TREE, "2") == [201]
+
+
+def test_set_windows_mapped_uses_a_single_xdotool_process(mocker: MockerFixture) -> None:
+    mock_check_call = mocker.patch("subprocess.check_call")
+
+    i3_restore.set_windows_mapped([1, 2], mapped=False)
+    mock_check_call.assert_called_once_with(["xdotool", "windowunmap", "1", "windowunmap", "2"])
+
+    mock_check_call.reset_mock()
+    i3_restore.set_windows_mapped([1], mapped=True)
+    mock_check_call.assert_called_once_with(["xdotool", "windowmap", "1"])
+
+
+def test_set_windows_mapped_does_nothing_without_windows(mocker: MockerFixture) -> None:
+    mock_check_call = mocker.patch("subprocess.check_call")
+    i3_restore.set_windows_mapped([], mapped=True)
+    mock_check_call.assert_not_called()
@@ -1,5 +1,8 @@
 import json
+import os
+import pathlib
 import subprocess
+from collections.abc import Callable, Iterator
 from unittest import mock
 
 import psutil
@@ -11,15 +14,15 @@ with mock.patch("utils.get_logger"):
         # Don't log messages or read the config file
         from programs import i3_save
 
-from programs import constants
+from programs import constants, tree
 from programs.utils import JSON
 
 WORKSPACE = """{
     "name": "test_workspace",
     "nodes": [
         {"nodes": [], "swallows": ["swallow1"]},
-        {"nodes": [{"nodes": [], "swallows": [], "window": 999, "window_properties": {}}]},
-        {"nodes": [{"nodes": [], "swallows": [], "window": 999, "window_properties": {}}]},
+        {"nodes": [{"nodes": [], "swallows": [], "window": 997, "window_properties": {}}]},
+        {"nodes": [{"nodes": [], "swallows": [], "window": 998, "window_properties": {}}]},
         {"nodes": [{"nodes": [], "swallows": [], "window": 999, "window_properties": {}}]}
     ]
 }"""
@@ -28,28 +31,642 @@ I3_TREE = bytes(
     f"""{{
     "nodes": [
         {{}},
-        {{ "nodes": [{{"type": "con", "nodes": [{WORKSPACE}]}} , {{"type": ""}}] }},
-        {{ "nodes": [{{"type": "con", "nodes": [{WORKSPACE}, {WORKSPACE} ]}}] }}
+        {{
+            "name": "HDMI-1",
+            "nodes": [
+                {{"type": "con", "nodes": [{WORKSPACE}]}},
+                {{"type": "dockarea", "nodes": []}}
+            ]
+        }},
+        {{"name": "DP-1", "nodes": [{{"type": "con", "nodes": [{WORKSPACE}, {WORKSPACE}]}}]}}
     ]
 }}""",
     encoding="utf-8",
 )
 
 
-def test_main_creates_workspaces_correctly(mocker: MockerFixture) -> None:
+@pytest.fixture(autouse=True)
+def window_pids() -> Iterator[None]:
+    i3_save._window_pids.clear()
+    yield
+    i3_save._window_pids.clear()
+
+
+def test_main_saves_layouts_and_programs_for_each_workspace(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(i3_save, "check_dependencies")
+    mocker.patch.object(i3_save.utils, "get_version")
+    mocker.patch.object(i3_save.utils, "snapshot_processes")
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    mock_remove_session = mocker.patch.object(i3_save, "remove_previous_session")
+    # The third workspace is empty, so it has no layout
+    mock_save_layout = mocker.patch.object(
+        i3_save.layout, "save_workspace_layout", side_effect=["file1", "file2", None]
+    )
     mock_workspace = mocker.patch.object(i3_save, "Workspace")
-    mocker.patch("subprocess.check_output", return_value=I3_TREE)
+    mock_compile_workspace = mocker.patch.object(i3_save.plan, "compile_workspace")
+    mock_save_plan = mocker.patch.object(i3_save.plan, "save_plan")
+    mocker.patch.object(i3_save, "get_workspace_hash", return_value=None)
+    mock_check_output = mocker.patch("subprocess.check_output", return_value=I3_TREE)
 
-    i3_save.main()
+    i3_save.main([])
+
+    # The i3 tree is only retrieved once for the whole save
+    mock_check_output.assert_called_once()
+    mock_remove_session.assert_called_once()
 
     # There are three workspaces in the i3 tree
+    assert mock_save_layout.call_count == 3
     assert mock_workspace.call_count == 3
+    # Launched windows are swallowed without matching their titles
+    assert mock_save_layout.call_args[0][1] == mock_workspace.return_value.launched_windows
+
+    # Only workspaces with a layout are added to the restore plan
+    assert mock_compile_workspace.call_count == 2
+    assert len(mock_save_plan.call_args[0][0]) == 2
+    assert mock_save_plan.call_args[0][1] is None
+
+
+def test_main_saves_within_the_deadline(mocker: MockerFixture, tmp_path: pathlib.Path) -> None:
+    mocker.patch.object(i3_save, "check_dependencies")
+    mocker.patch.object(i3_save.utils, "get_version")
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    mock_snapshot = mocker.patch.object(i3_save.utils, "snapshot_processes")
+    mock_budget = mocker.patch.object(i3_save.utils, "budget")
+    mock_save_session = mocker.patch.object(i3_save, "save_session")
+    mock_write_metrics = mocker.patch.object(i3_save.metrics, "write_metrics")
+
+    def single_flight(save: Callable[[], None], *_: object) -> None:
+        # The process table is only read once the save holds the lock
+        mock_snapshot.assert_not_called()
+        save()
+
+    mocker.patch.object(i3_save.save_lock, "single_flight", side_effect=single_flight)
+
+    i3_save.main(["--deadline", "2.5"])
+
+    mock_snapshot.assert_called_once()
+    # The budget is what's left of the deadline after waiting for other saves
+    assert mock_budget.call_args[0][0] == pytest.approx(2.5, abs=0.5)
+    mock_save_session.assert_called_once_with(None, False)
+    assert mock_write_metrics.call_args[0][1:3] == ("save", True)
+
+
+def test_main_writes_metrics_when_saving_fails(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(i3_save, "check_dependencies")
+    mocker.patch.object(i3_save.utils, "get_version")
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    mocker.patch.object(i3_save.utils, "snapshot_processes")
+    mocker.patch.object(i3_save, "save_session", side_effect=RuntimeError)
+    mock_write_metrics = mocker.patch.object(i3_save.metrics, "write_metrics")
+
+    with pytest.raises(RuntimeError):
+        i3_save.main([])
+
+    assert mock_write_metrics.call_args[0][1:3] == ("save", False)
+
+
+def test_main_saves_every_session_with_fleet(mocker: MockerFixture, tmp_path: pathlib.Path) -> None:
+    mocker.patch.object(i3_save, "check_dependencies")
+    mocker.patch.object(i3_save.utils, "get_version")
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    mock_snapshot = mocker.patch.object(i3_save.utils, "snapshot_processes")
+    mock_find_sessions = mocker.patch.object(i3_save.fleet, "find_sessions")
+    mock_save_sessions = mocker.patch.object(i3_save.fleet, "save_sessions", return_value=[])
+    mock_save_session = mocker.patch.object(i3_save, "save_session")
+
+    i3_save.main(["--fleet", "--force"])
+
+    mock_find_sessions.assert_called_once_with(mock_snapshot.return_value)
+    sessions, save = mock_save_sessions.call_args[0]
+    assert sessions == mock_find_sessions.return_value
+    mock_save_session.assert_not_called()
+
+    save()
+    mock_save_session.assert_called_once_with(None, True)
+
+
+def test_main_exits_when_a_session_fails_to_save_with_fleet(mocker: MockerFixture) -> None:
+    mocker.patch.object(i3_save, "check_dependencies")
+    mocker.patch.object(i3_save.utils, "get_version")
+    mocker.patch.object(i3_save.utils, "snapshot_processes")
+    mocker.patch.object(i3_save.fleet, "find_sessions")
+    mocker.patch.object(i3_save.fleet, "save_sessions", return_value=[mock.Mock()])
+
+    with pytest.raises(SystemExit):
+        i3_save.main(["--fleet"])
+
+
+def test_save_session_only_saves_selected_workspaces(mocker: MockerFixture) -> None:
+    mocker.patch("pathlib.Path.mkdir")
+    mock_remove_session = mocker.patch.object(i3_save, "remove_previous_session")
+    mock_remove_ws_session = mocker.patch.object(i3_save, "remove_workspace_session")
+    mock_mark_browsers = mocker.patch.object(i3_save, "mark_saved_web_browsers")
+    mock_save_layout = mocker.patch.object(i3_save.layout, "save_workspace_layout")
+    mock_workspace = mocker.patch.object(i3_save, "Workspace")
+    mocker.patch.object(i3_save.plan, "compile_workspace")
+    mock_save_plan = mocker.patch.object(i3_save.plan, "save_plan")
+    workspaces = [tree.Node({"name": "1"}), tree.Node({"name": "2"}), tree.Node({"name": "3"})]
+    mocker.patch.object(i3_save.utils, "get_workspaces", return_value=workspaces)
+
+    i3_save.save_session(["2", "3"])
+
+    assert mock_save_plan.call_args[0][1] == ["2", "3"]
+
+    mock_remove_session.assert_not_called()
+    assert mock_remove_ws_session.call_args_list == [mock.call("2"), mock.call("3")]
+    mock_mark_browsers.assert_called_once()
+    assert mock_save_layout.call_count == 2
+    assert mock_workspace.call_args_list == [mock.call(workspaces[1]), mock.call(workspaces[2])]
+
+
+def test_save_session_keeps_the_session_of_lazy_workspaces(mocker: MockerFixture) -> None:
+    mocker.patch("pathlib.Path.mkdir")
+    mock_remove_session = mocker.patch.object(i3_save, "remove_previous_session")
+    mocker.patch.object(i3_save, "remove_workspace_session")
+    mocker.patch.object(i3_save, "mark_saved_web_browsers")
+    mocker.patch.object(i3_save.layout, "save_workspace_layout")
+    mock_workspace = mocker.patch.object(i3_save, "Workspace")
+    mocker.patch.object(i3_save.plan, "compile_workspace")
+    mock_save_plan = mocker.patch.object(i3_save.plan, "save_plan")
+    mocker.patch.object(i3_save.plan, "load_lazy_workspaces", return_value=["2"])
+    workspaces = [tree.Node({"name": "1"}), tree.Node({"name": "2"})]
+    mocker.patch.object(i3_save.utils, "get_workspaces", return_value=workspaces)
+
+    i3_save.save_session()
+
+    mock_remove_session.assert_called_once_with(["2"])
+    mock_workspace.assert_called_once_with(workspaces[0])
+    assert mock_save_plan.call_args[0][2] == ["2"]
+
+    i3_save.save_session(["1", "2"])
+    assert mock_save_plan.call_args[0][1] == ["1"]
+
+
+def test_save_session_skips_unchanged_workspaces(mocker: MockerFixture) -> None:
+    mocker.patch("pathlib.Path.mkdir")
+    mock_remove_session = mocker.patch.object(i3_save, "remove_previous_session")
+    mocker.patch.object(i3_save.layout, "save_workspace_layout")
+    mock_workspace = mocker.patch.object(i3_save, "Workspace")
+    mock_compile_workspace = mocker.patch.object(
+        i3_save.plan, "compile_workspace", return_value={"name": "2"}
+    )
+    mock_save_plan = mocker.patch.object(i3_save.plan, "save_plan")
+    mocker.patch.object(i3_save.plan, "load_lazy_workspaces", return_value=[])
+    saved_workspaces = [{"name": "1", "hash": "hash1", "focused": False, "visible": False}]
+    mocker.patch.object(i3_save.plan, "load_plan", return_value={"workspaces": saved_workspaces})
+    mocker.patch.object(i3_save, "get_workspace_hash", side_effect=lambda ws: f"hash{ws.name}")
+    workspaces = [tree.Node({"name": "1"}), tree.Node({"name": "2"})]
+    workspaces[0].visible = workspaces[0].focused_workspace = True
+    mocker.patch.object(i3_save.utils, "get_workspaces", return_value=workspaces)
+
+    i3_save.save_session()
+
+    # The files of the unchanged workspace are kept
+    mock_remove_session.assert_called_once_with(["1"])
+    mock_workspace.assert_called_once_with(workspaces[1])
+    assert mock_compile_workspace.call_args[0][4] == "hash2"
+
+    # The entry of the unchanged workspace is kept, with where it currently is
+    assert mock_save_plan.call_args[0][0] == [
+        {"name": "1", "hash": "hash1", "focused": True, "visible": True},
+        {"name": "2"},
+    ]
+
+
+def test_save_session_only_removes_changed_selected_workspaces(mocker: MockerFixture) -> None:
+    mocker.patch("pathlib.Path.mkdir")
+    mock_remove_ws_session = mocker.patch.object(i3_save, "remove_workspace_session")
+    mocker.patch.object(i3_save, "mark_saved_web_browsers")
+    mocker.patch.object(i3_save.layout, "save_workspace_layout")
+    mocker.patch.object(i3_save, "Workspace")
+    mocker.patch.object(i3_save.plan, "compile_workspace")
+    mocker.patch.object(i3_save.plan, "save_plan")
+    mocker.patch.object(i3_save.plan, "load_lazy_workspaces", return_value=[])
+    mocker.patch.object(i3_save, "get_workspace_hash", side_effect=lambda ws: f"hash{ws.name}")
+    mocker.patch.object(i3_save, "get_unchanged_workspaces", return_value={"1": {"name": "1"}})
+    workspaces = [tree.Node({"name": "1"}), tree.Node({"name": "2"})]
+    mocker.patch.object(i3_save.utils, "get_workspaces", return_value=workspaces)
+
+    i3_save.save_session(["1", "2"])
+
+    mock_remove_ws_session.assert_called_once_with("2")
+
+
+def test_save_session_saves_every_workspace_when_forced(mocker: MockerFixture) -> None:
+    mocker.patch("pathlib.Path.mkdir")
+    mock_remove_session = mocker.patch.object(i3_save, "remove_previous_session")
+    mocker.patch.object(i3_save.layout, "save_workspace_layout")
+    mock_workspace = mocker.patch.object(i3_save, "Workspace")
+    mocker.patch.object(i3_save.plan, "compile_workspace")
+    mocker.patch.object(i3_save.plan, "save_plan")
+    mocker.patch.object(i3_save.plan, "load_lazy_workspaces", return_value=[])
+    mocker.patch.object(i3_save, "get_workspace_hash", return_value="hash")
+    mock_get_unchanged = mocker.patch.object(i3_save, "get_unchanged_workspaces")
+    mocker.patch.object(i3_save.utils, "get_workspaces", return_value=[tree.Node({"name": "1"})])
+
+    i3_save.save_session(force=True)
+
+    mock_get_unchanged.assert_not_called()
+    mock_remove_session.assert_called_once_with([])
+    mock_workspace.assert_called_once()
+
+
+def test_save_session_does_not_store_hash_when_work_was_skipped(mocker: MockerFixture) -> None:
+    mocker.patch("pathlib.Path.mkdir")
+    mocker.patch.object(i3_save, "remove_previous_session")
+    mocker.patch.object(i3_save.layout, "save_workspace_layout")
+    mocker.patch.object(i3_save, "Workspace")
+    mock_compile_workspace = mocker.patch.object(i3_save.plan, "compile_workspace")
+    mocker.patch.object(i3_save.plan, "save_plan")
+    mocker.patch.object(i3_save.plan, "load_lazy_workspaces", return_value=[])
+    mocker.patch.object(i3_save, "get_workspace_hash", return_value="hash")
+    mocker.patch.object(i3_save, "get_unchanged_workspaces", return_value={})
+    mocker.patch.object(i3_save.utils, "has_skipped_work", return_value=True)
+    mocker.patch.object(i3_save.utils, "get_workspaces", return_value=[tree.Node({"name": "1"})])
+
+    i3_save.save_session()
+
+    assert mock_compile_workspace.call_args[0][4] is None
+
+
+def test_get_unchanged_workspaces_compares_saved_hashes(mocker: MockerFixture) -> None:
+    saved_workspaces = [
+        {"name": "1", "hash": "hash1"},
+        {"name": "2", "hash": "old"},
+        {"name": "3", "hash": None},
+        {"name": "4"},
+    ]
+    mocker.patch.object(i3_save.plan, "load_plan", return_value={"workspaces": saved_workspaces})
+    workspace_hashes = {"1": "hash1", "2": "hash2", "3": None, "4": "hash4"}
+
+    assert i3_save.get_unchanged_workspaces(workspace_hashes) == {"1": saved_workspaces[0]}
+
+
+def test_get_unchanged_workspaces_handles_unsupported_plans(mocker: MockerFixture) -> None:
+    mocker.patch.object(i3_save.plan, "load_plan", side_effect=ValueError("unsupported"))
+    assert i3_save.get_unchanged_workspaces({"1": "hash1"}) == {}
+
+
+class TestWorkspaceHash:
+    @pytest.fixture(autouse=True)
+    def processes(self, mocker: MockerFixture) -> dict[int, mock.Mock]:
+        mocker.patch.object(i3_save, "get_window_pid", side_effect=lambda window_id: window_id)
+        mocker.patch.object(i3_save.utils, "get_version", return_value="i3-restore v1.0")
+        mocker.patch.object(i3_save.CONFIG, "web_browsers", ["firefox"])
+        mocker.patch.object(i3_save.CONFIG, "enabled_plugins", {})
+
+        processes = {}
+        for pid in [101, 102]:
+            process = mock.Mock(pid=pid)
+            process.cmdline.return_value = ["kitty"]
+            process.create_time.return_value = 1.0
+            process.cwd.return_value = "/home/test"
+            process.children.return_value = []
+            processes[pid] = process
+
+        mocker.patch("psutil.Process", side_effect=lambda pid: processes[pid])
+        return processes
+
+    @staticmethod
+    def get_workspace() -> tree.Node:
+        workspace = tree.parse_tree(
+            json.dumps(
+                {
+                    "type": "workspace",
+                    "name": "1",
+                    "nodes": [
+                        {"window": 101, "nodes": [], "window_properties": {"class": "kitty"}},
+                        {"nodes": [{"window": 102, "nodes": []}]},
+                        {"nodes": [], "swallows": [{"class": "^kitty$"}]},
+                    ],
+                }
+            )
+        )
+        workspace.output = "HDMI-1"
+        return workspace
+
+    def test_get_workspace_hash_is_the_same_for_unchanged_workspaces(self) -> None:
+        workspace_hash = i3_save.get_workspace_hash(self.get_workspace())
+        assert workspace_hash == i3_save.get_workspace_hash(self.get_workspace())
+
+        # Only containers with a window are hashed with their processes
+        assert i3_save.get_window_pid.call_count == 4
+
+    def test_get_workspace_hash_changes_when_the_layout_changes(self) -> None:
+        workspace_hash = i3_save.get_workspace_hash(self.get_workspace())
+
+        workspace = self.get_workspace()
+        workspace.nodes[1].layout = "tabbed"
+        assert i3_save.get_workspace_hash(workspace) != workspace_hash
+
+        workspace = self.get_workspace()
+        workspace.output = "DP-1"
+        assert i3_save.get_workspace_hash(workspace) != workspace_hash
+
+    def test_get_workspace_hash_changes_when_the_processes_change(
+        self, processes: dict[int, mock.Mock]
+    ) -> None:
+        workspace_hash = i3_save.get_workspace_hash(self.get_workspace())
+
+        child = mock.Mock(pid=200)
+        child.cmdline.return_value = ["bash"]
+        child.create_time.return_value = 2.0
+        child.cwd.return_value = "/home/test"
+        processes[102].children.return_value = [child]
+        child_hash = i3_save.get_workspace_hash(self.get_workspace())
+        assert child_hash != workspace_hash
+
+        child.cwd.return_value = "/tmp"
+        assert i3_save.get_workspace_hash(self.get_workspace()) != child_hash
+
+    def test_get_workspace_hash_handles_inaccessible_processes(
+        self, processes: dict[int, mock.Mock]
+    ) -> None:
+        workspace_hash = i3_save.get_workspace_hash(self.get_workspace())
+
+        processes[101].cwd.side_effect = psutil.AccessDenied()
+        assert i3_save.get_workspace_hash(self.get_workspace()) not in [None, workspace_hash]
+
+    def test_get_workspace_hash_handles_windows_without_a_pid(self) -> None:
+        i3_save.get_window_pid.side_effect = None
+        i3_save.get_window_pid.return_value = None
+
+        assert i3_save.get_workspace_hash(self.get_workspace()) is not None
+
+    def test_get_workspace_hash_returns_none_for_web_browsers(
+        self, processes: dict[int, mock.Mock]
+    ) -> None:
+        processes[102].cmdline.return_value = ["/usr/lib/firefox/firefox", "--new-window"]
+        assert i3_save.get_workspace_hash(self.get_workspace()) is None
+
+    def test_get_workspace_hash_returns_none_for_programs_saved_by_plugins(
+        self, mocker: MockerFixture, processes: dict[int, mock.Mock]
+    ) -> None:
+        mocker.patch.object(i3_save.CONFIG, "enabled_plugins", {"tmux": {}})
+        assert i3_save.get_workspace_hash(self.get_workspace()) is not None
+
+        # The tmux server's panes aren't children of the tmux client in the terminal
+        tmux_client = mock.Mock(pid=200)
+        tmux_client.cmdline.return_value = ["/usr/bin/tmux", "attach"]
+        processes[102].children.return_value = [tmux_client]
+        assert i3_save.get_workspace_hash(self.get_workspace()) is None
+
+        mocker.patch.object(i3_save.CONFIG, "enabled_plugins", {"kitty": {}})
+        processes[102].children.return_value = []
+        assert i3_save.get_workspace_hash(self.get_workspace()) is None
+
+
+def test_get_window_pid_only_retrieves_each_pid_once(mocker: MockerFixture) -> None:
+    mock_check_output = mocker.patch("subprocess.check_output", return_value=b"1234")
+
+    assert i3_save.get_window_pid(9999) == 1234
+    assert i3_save.get_window_pid(9999) == 1234
+    mock_check_output.assert_called_once()
+
+
+def test_get_prefetch_files_gets_the_executable_and_libraries(mocker: MockerFixture) -> None:
+    mock_readlink = mocker.patch("os.readlink", return_value="/usr/bin/kitty")
+    mocker.patch(
+        "pathlib.Path.read_text",
+        return_value="""\
+55d0c000-55d0d000 r--p 00000000 103:02 1 /usr/bin/kitty
+55d0d000-55d0e000 r-xp 00001000 103:02 1 /usr/bin/kitty
+7f00a000-7f00b000 r-xp 00002000 103:02 2 /usr/lib/libc.so.6
+7f00b000-7f00c000 r--p 00000000 103:02 3 /usr/share/fonts/font.ttf
+7f00c000-7f00d000 r-xp 00000000 103:02 4 /tmp/library.so (deleted)
+7f00d000-7f00e000 rw-p 00000000 00:00 0
+7ffd0000-7ffd1000 r-xp 00000000 00:00 0 [vdso]
+""",
+    )
+
+    assert i3_save.get_prefetch_files(1234) == ["/usr/bin/kitty", "/usr/lib/libc.so.6"]
+    mock_readlink.assert_called_once_with("/proc/1234/exe")
+
+
+def test_get_prefetch_files_handles_processes_that_exited(mocker: MockerFixture) -> None:
+    mocker.patch("os.readlink", side_effect=FileNotFoundError)
+    assert i3_save.get_prefetch_files(1234) == []
+
+
+def test_select_workspaces_selects_workspaces_by_name() -> None:
+    workspaces = [tree.Node({"name": "1"}), tree.Node({"name": "2"})]
+    assert i3_save.select_workspaces(workspaces, ["2", "unknown"]) == [workspaces[1]]
+
+
+def test_parse_args_collects_workspaces() -> None:
+    assert i3_save.parse_args([]).workspaces is None
+
+    args = i3_save.parse_args(["--workspace", "1", "--workspace", "2: web"])
+    assert args.workspaces == ["1", "2: web"]
+
+
+def test_parse_args_parses_fleet() -> None:
+    assert not i3_save.parse_args([]).fleet
+    assert i3_save.parse_args(["--fleet"]).fleet
+
+
+def test_parse_args_parses_force() -> None:
+    assert not i3_save.parse_args([]).force
+    assert i3_save.parse_args(["--force"]).force
+
+
+def test_parse_args_parses_deadline() -> None:
+    assert i3_save.parse_args([]).deadline is None
+    assert i3_save.parse_args(["--deadline", "3"]).deadline == 3
+
+
+@pytest.mark.parametrize("deadline", ["0", "-1", "nan", "soon"])
+def test_parse_args_rejects_invalid_deadlines(deadline: str) -> None:
+    with pytest.raises(SystemExit):
+        i3_save.parse_args(["--deadline", deadline])
+
+
+def test_parse_args_counts_verbosity_flags() -> None:
+    assert i3_save.parse_args([]).verbose == 0
+    assert i3_save.parse_args(["-v"]).verbose == 1
+    assert i3_save.parse_args(["-vv"]).verbose == 2
+
+
+def test_parse_args_displays_version(
+    mocker: MockerFixture, capsys: pytest.CaptureFixture[str]
+) -> None:
+    mocker.patch.object(i3_save.utils, "get_version", return_value="i3-restore v1.2.3")
+
+    with pytest.raises(SystemExit):
+        i3_save.parse_args(["--version"])
+
+    assert "i3-restore v1.2.3" in capsys.readouterr().out
+
+
+def test_set_verbosity_does_not_reconfigure_logger_by_default(mocker: MockerFixture) -> None:
+    mock_get_logger = mocker.patch.object(i3_save.utils, "get_logger")
+    i3_save.set_verbosity(0)
+    mock_get_logger.assert_not_called()
+
+
+@pytest.mark.parametrize(("verbose", "expected_level"), [(1, "1"), (2, "2"), (3, "2")])
+def test_set_verbosity_reconfigures_logger(
+    mocker: MockerFixture, verbose: int, expected_level: str
+) -> None:
+    mocker.patch.dict(os.environ)
+    mock_get_logger = mocker.patch.object(i3_save.utils, "get_logger")
+
+    i3_save.set_verbosity(verbose)
+
+    assert os.environ["I3_RESTORE_VERBOSE"] == expected_level
+    mock_get_logger.assert_called_once()
+
+
+def test_check_dependencies_passes_when_all_are_installed(mocker: MockerFixture) -> None:
+    mocker.patch("shutil.which", return_value="/usr/bin/dependency")
+    mock_display_error = mocker.patch.object(i3_save.utils, "display_error")
+
+    i3_save.check_dependencies()
+    mock_display_error.assert_not_called()
+
+
+def test_check_dependencies_exits_when_dependency_is_missing(mocker: MockerFixture) -> None:
+    mocker.patch("shutil.which", return_value=None)
+    mock_display_error = mocker.patch.object(i3_save.utils, "display_error")
+
+    with pytest.raises(SystemExit):
+        i3_save.check_dependencies()
+
+    mock_display_error.assert_called_once()
+
+
+def test_remove_previous_session_removes_session_files(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    session_files = [
+        "restore_plan.json",
+        "workspace_1_HDMI-1_layout.json",
+        "workspace_1_container_0.sh",
+        "workspace_1_programs.sh",
+        "workspace_1_subprocess_0.sh",
+        "web_browsers.sh",
+        "kitty-session-1",
+        "kitty-scrollback-1-1",
+        "tmux-scrollback-0-1",
+    ]
+    for file in session_files:
+        (tmp_path / file).touch()
+    (tmp_path / "config").touch()
+
+    i3_save.remove_previous_session()
+
+    assert [file.name for file in tmp_path.iterdir()] == ["config"]
+
+
+def test_remove_previous_session_keeps_files_of_kept_workspaces(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    kept_files = ["restore_plan.json", "workspace_2_DP-1_layout.json", "workspace_2_container_0.sh"]
+    for file in [*kept_files, "workspace_1_HDMI-1_layout.json", "workspace_1_container_0.sh"]:
+        (tmp_path / file).touch()
+
+    i3_save.remove_previous_session(["2"])
+
+    assert sorted(file.name for file in tmp_path.iterdir()) == sorted(kept_files)
+
+
+def test_remove_workspace_session_only_removes_workspace_files(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    removed_files = [
+        "workspace_1 ws_HDMI-1_layout.json",
+        "workspace_1{space}ws_programs.sh",
+        "workspace_1{space}ws_container_0.sh",
+        "workspace_1{space}ws_subprocess_0.sh",
+        "kitty-session-100",
+        "kitty-scrollback-100-1",
+        "tmux-scrollback-0-1",
+    ]
+    kept_files = [
+        "workspace_1 ws_2_DP-1_layout.json",
+        "workspace_1{space}ws_2_programs.sh",
+        "workspace_1{space}ws_2_container_0.sh",
+        "workspace_1{space}ws_2_subprocess_0.sh",
+        "kitty-session-200",
+        "kitty-scrollback-200-1",
+        "tmux-scrollback-0-2",
+        "web_browsers.sh",
+    ]
+    for file in removed_files + kept_files:
+        (tmp_path / file).touch()
+
+    (tmp_path / "workspace_1{space}ws_container_0.sh").write_text(
+        f"cd \"/\" && kitty --session '{tmp_path}/kitty-session-100'\n"
+    )
+    (tmp_path / "workspace_1{space}ws_subprocess_0.sh").write_text(
+        f"tmux new-session -d -s main 'cat {tmp_path}/tmux-scrollback-0-1; exec \"$SHELL\"'\n"
+    )
+
+    i3_save.remove_workspace_session("1 ws")
+
+    assert sorted(file.name for file in tmp_path.iterdir()) == sorted(kept_files)
+
+
+def test_remove_workspace_session_removes_single_instance_kitty_sessions(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    kept_files = ["kitty-session-200", "kitty-scrollback-200-1"]
+    for file in [*kept_files, "kitty-session-100", "kitty-scrollback-100-1"]:
+        (tmp_path / file).touch()
+
+    (tmp_path / "workspace_1_container_0.sh").write_text(
+        f"kitty --single-instance --instance-group={constants.KITTY_INSTANCE_GROUP} "
+        f"--session '{tmp_path}/kitty-session-100'\n"
+    )
+
+    i3_save.remove_workspace_session("1")
+
+    assert sorted(file.name for file in tmp_path.iterdir()) == sorted(kept_files)
+
+
+def test_remove_workspace_session_handles_no_files(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    i3_save.remove_workspace_session("1")
+    assert not list(tmp_path.iterdir())
+
+
+def test_mark_saved_web_browsers_marks_browsers_in_session(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    (tmp_path / "web_browsers.sh").write_text("firefox\n")
+    i3_save.WEB_BROWSERS_DICT = {"firefox": False, "chromium": False}
+
+    i3_save.mark_saved_web_browsers()
+
+    assert i3_save.WEB_BROWSERS_DICT == {"firefox": True, "chromium": False}
+
+
+def test_mark_saved_web_browsers_does_nothing_without_browsers_file(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(i3_save.utils, "i3_PATH", str(tmp_path))
+    i3_save.WEB_BROWSERS_DICT = {"firefox": False}
+
+    i3_save.mark_saved_web_browsers()
+
+    assert i3_save.WEB_BROWSERS_DICT == {"firefox": False}
 
 
 class TestWorkspace:
     def test_workspace_saves_containers_correctly(self, mocker: MockerFixture) -> None:
         i3_save.CONFIG.terminals = []
-        mock_open = mocker.patch("pathlib.Path.open", new_callable=mock.mock_open)
+        mock_write_script = mocker.patch.object(i3_save.utils, "write_script")
 
         # Make sure the container with no pid doesn't get saved (the third container in the
         # WORKSPACE)
@@ -59,31 +676,35 @@ class TestWorkspace:
         )
         mocker.patch("psutil.Process")
 
-        workspace = i3_save.Workspace(json.loads(WORKSPACE))
+        workspace = i3_save.Workspace(tree.parse_tree(WORKSPACE))
         assert len(workspace.containers) == 2
 
-        handle = mock_open()
-        assert handle.write.call_args[0][0].count("[[ $1 ==") == 2, (
-            "Containers were not saved in the correct format"
-        )
+        # Each container gets its own launch script
+        assert mock_write_script.call_count == 2
+        assert workspace.launch_scripts == [call[0][0] for call in mock_write_script.call_args_list]
+        assert workspace.launch_scripts[1].name == "workspace_test_workspace_container_1.sh"
+        assert workspace.launch_classes == [None, None]
 
     def test_workspace_does_not_save_with_no_containers(self, mocker: MockerFixture) -> None:
-        mock_open = mocker.patch("pathlib.Path.open", new_callable=mock.mock_open)
+        mock_write_script = mocker.patch.object(i3_save.utils, "write_script")
 
-        properties = {"name": "test_workspace", "nodes": []}
+        properties = tree.Node({"name": "test_workspace", "nodes": []})
         workspace = i3_save.Workspace(properties)
 
         assert len(workspace.containers) == 0
-        mock_open.assert_not_called()
+        assert workspace.launch_scripts == []
+        mock_write_script.assert_not_called()
 
     def test_workspace_saves_subprocesses_correctly(self, mocker: MockerFixture) -> None:
-        mock_open = mocker.patch("pathlib.Path.open", new_callable=mock.mock_open)
+        mock_write_script = mocker.patch.object(i3_save.utils, "write_script")
         # Mock these class methods so they don't run. Their functionality is not tested at all in
         # this test
         mocker.patch.object(i3_save.Container, "_get_pid")
         mocker.patch.object(i3_save.Container, "_get_cmdline_options")
 
-        properties = {"name": "test_workspace", "nodes": [], "window": 999, "window_properties": {}}
+        properties = tree.Node(
+            {"name": "test_workspace", "nodes": [], "window": 999, "window_properties": {}}
+        )
         container = i3_save.Container(properties)
         container.subprocess_command = "test_subprocess"
 
@@ -91,7 +712,51 @@ class TestWorkspace:
         workspace.containers = [container]
         workspace._save()
 
-        assert mock_open.call_count == 2, "Only the workspace and subprocess should be saved"
+        assert mock_write_script.call_count == 2, (
+            "Only the container and subprocess should be saved"
+        )
+        launch_command = mock_write_script.call_args_list[1][0][1]
+        # Exported so the terminal gets it when its client can't connect to a server too
+        assert "export I3_RESTORE_SUBPROCESS_SCRIPT=" in launch_command
+
+    def test_workspace_saves_each_terminal_server_once(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(i3_save.utils, "write_script")
+        mocker.patch.object(i3_save.Container, "_get_pid")
+        mocker.patch.object(i3_save.Container, "_get_cmdline_options")
+
+        properties = tree.Node(
+            {"name": "test_workspace", "nodes": [], "window": 999, "window_properties": {}}
+        )
+        containers = [i3_save.Container(properties) for _ in range(3)]
+        for container, server_command in zip(
+            containers, ["urxvtd -q -o -f", None, "urxvtd -q -o -f"]
+        ):
+            container.command = "command"
+            container.server_command = server_command
+
+        workspace = i3_save.Workspace(properties)
+        workspace.containers = containers
+        workspace._save()
+
+        assert workspace.server_commands == ["urxvtd -q -o -f"]
+
+    def test_workspace_collects_each_prefetch_file_once(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(i3_save.utils, "write_script")
+        mocker.patch.object(i3_save.Container, "_get_pid")
+        mocker.patch.object(i3_save.Container, "_get_cmdline_options")
+
+        properties = tree.Node(
+            {"name": "test_workspace", "nodes": [], "window": 999, "window_properties": {}}
+        )
+        containers = [i3_save.Container(properties) for _ in range(2)]
+        containers[0].prefetch_files = ["/usr/bin/kitty", "/usr/lib/libc.so.6"]
+        containers[1].prefetch_files = ["/usr/bin/vim", "/usr/lib/libc.so.6"]
+
+        workspace = i3_save.Workspace(properties)
+        workspace.containers = containers
+        workspace._save()
+
+        assert workspace.prefetch_files == ["/usr/bin/kitty", "/usr/lib/libc.so.6", "/usr/bin/vim"]
 
 
 class TestContainer:
@@ -102,14 +767,34 @@ class TestContainer:
         mocker.patch("subprocess.check_output", return_value=b"1")
         mocker.patch.object(i3_save.Container, "_get_cmdline_options", side_effect=exception)
 
-        container = i3_save.Container({"window": 9999, "window_properties": {}})
+        container = i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
         assert container.command is None
 
+    @pytest.mark.parametrize(
+        ("skipped", "prefetch_files"), [(False, ["/usr/bin/prog"]), (True, [])]
+    )
+    def test_container_records_the_files_to_prefetch(
+        self, mocker: MockerFixture, skipped: bool, prefetch_files: list[str]
+    ) -> None:
+        mocker.patch("subprocess.check_output", return_value=b"1")
+        mocker.patch("psutil.Process").return_value.cmdline.return_value = ["prog"]
+        mocker.patch.object(i3_save.utils, "should_skip", return_value=skipped)
+        mock_get_prefetch_files = mocker.patch.object(
+            i3_save, "get_prefetch_files", return_value=["/usr/bin/prog"]
+        )
+        i3_save.CONFIG.terminals = []
+
+        container = i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
+
+        assert container.prefetch_files == prefetch_files
+        if not skipped:
+            mock_get_prefetch_files.assert_called_once_with(1)
+
     def test_get_pid_returns_the_pid(self, mocker: MockerFixture) -> None:
         mocker.patch("subprocess.check_output", return_value=b"99999")
         mocker.patch("psutil.Process")
 
-        container = i3_save.Container({"window": 9999, "window_properties": {}})
+        container = i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
         assert container._get_pid() == 99999
 
     def test_get_pid_handles_called_process_error(self, mocker: MockerFixture) -> None:
@@ -117,7 +802,13 @@ class TestContainer:
             "subprocess.check_output", side_effect=subprocess.CalledProcessError(None, None)
         )
 
-        container = i3_save.Container({"window": 9999, "window_properties": {}})
+        container = i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
+        assert container._get_pid() is None
+
+    def test_get_pid_handles_timeouts(self, mocker: MockerFixture) -> None:
+        mocker.patch("subprocess.check_output", side_effect=subprocess.TimeoutExpired("xdotool", 2))
+
+        container = i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
         assert container._get_pid() is None
 
     def test_get_cmdline_options_does_not_run_with_no_pid(self, mocker: MockerFixture) -> None:
@@ -126,7 +817,7 @@ class TestContainer:
         )
         mock_process = mocker.patch("psutil.Process")
 
-        i3_save.Container({"window": 9999, "window_properties": {}})
+        i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
         mock_process.assert_not_called()
 
     def test_get_cmdline_options_uses_plugin_for_matching_window_class(
@@ -136,10 +827,17 @@ class TestContainer:
         mock_process = mocker.patch("psutil.Process")
 
         # Add the config so it's seen as a plugin enabled by the user
-        i3_save.CONFIG.enabled_plugins = {constants.KITTY_CLASS: {"listen_socket": "test_socket"}}
+        plugin_config = {"listen_socket": "test_socket", "timeout": 5}
+        i3_save.CONFIG.enabled_plugins = {constants.KITTY_CLASS: plugin_config}
 
-        mock_saver = mocker.patch.object(i3_save.SUPPORTED_PLUGINS[constants.KITTY_CLASS], "main")
-        properties = {"window_properties": {"class": constants.KITTY_CLASS}, "window": 9999}
+        mock_plugin = mocker.Mock()
+        mock_saver = mock_plugin.main
+        mocker.patch.object(
+            i3_save.plugins, "load_plugin", return_value=(mock_plugin, plugin_config)
+        )
+        properties = tree.Node(
+            {"window_properties": {"class": constants.KITTY_CLASS}, "window": 9999}
+        )
 
         i3_save.Container(properties)
 
@@ -153,28 +851,126 @@ class TestContainer:
         mocker.patch("psutil.Process")
 
         # Add the config so it's seen as a plugin enabled by the user
-        i3_save.CONFIG.enabled_plugins = {constants.KITTY_CLASS: {"listen_socket": "test_socket"}}
+        plugin_config = {"listen_socket": "test_socket", "timeout": 5}
+        i3_save.CONFIG.enabled_plugins = {constants.KITTY_CLASS: plugin_config}
         i3_save.CONFIG.terminals = [{"command": "test_command", "class": constants.KITTY_CLASS}]
 
+        mock_plugin = mocker.Mock()
+        mock_plugin.main.side_effect = i3_save.utils.PluginSaveError
         mocker.patch.object(
-            i3_save.SUPPORTED_PLUGINS[constants.KITTY_CLASS],
-            "main",
-            side_effect=i3_save.utils.PluginSaveError,
+            i3_save.plugins, "load_plugin", return_value=(mock_plugin, plugin_config)
+        )
+        properties = tree.Node(
+            {"window_properties": {"class": constants.KITTY_CLASS}, "window": 9999}
         )
-        properties = {"window_properties": {"class": constants.KITTY_CLASS}, "window": 9999}
 
         container = i3_save.Container(properties)
         assert container.command == "test_command"
 
+    def test_get_cmdline_options_skips_plugin_when_out_of_time(self, mocker: MockerFixture) -> None:
+        mocker.patch("subprocess.check_output", return_value=b"1")
+        mocker.patch("psutil.Process")
+        mocker.patch.object(i3_save.utils, "should_skip", return_value=True)
+        mock_save_with_plugin = mocker.patch.object(i3_save.Container, "_save_with_plugin")
+
+        i3_save.CONFIG.enabled_plugins = {constants.KITTY_CLASS: {"timeout": 5}}
+        i3_save.CONFIG.terminals = [{"command": "test_command", "class": constants.KITTY_CLASS}]
+        properties = tree.Node(
+            {"window_properties": {"class": constants.KITTY_CLASS}, "window": 9999}
+        )
+        container = i3_save.Container(properties)
+
+        mock_save_with_plugin.assert_not_called()
+        assert container.command == "test_command"
+
+    def test_get_cmdline_options_uses_plugin_for_program_in_terminal(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("subprocess.check_output", return_value=b"1")
+        mock_process = mocker.patch("psutil.Process")
+        shell, tmux = mocker.Mock(), mocker.Mock()
+        shell.cmdline.return_value = ["bash"]
+        tmux.cmdline.return_value = ["/usr/bin/tmux", "attach"]
+        mock_process.return_value.children.return_value = [shell, tmux]
+        mock_save_with_plugin = mocker.patch.object(
+            i3_save.Container, "_save_with_plugin", return_value=True
+        )
+        mock_check_subprocess = mocker.patch.object(i3_save.Container, "check_if_subprocess")
+
+        i3_save.CONFIG.enabled_plugins = {"tmux": {"timeout": 5}}
+        i3_save.CONFIG.terminals = [{"command": "test_command", "class": "terminal"}]
+        container = i3_save.Container(
+            tree.Node({"window": 9999, "window_properties": {"class": "terminal"}})
+        )
+
+        mock_save_with_plugin.assert_called_once_with("tmux")
+        mock_check_subprocess.assert_not_called()
+        assert container.command == "test_command"
+
+    def test_get_cmdline_options_saves_terminal_without_program_plugins(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("subprocess.check_output", return_value=b"1")
+        mock_process = mocker.patch("psutil.Process")
+        zombie, tmux = mocker.Mock(), mocker.Mock()
+        zombie.cmdline.return_value = []
+        zombie.name.return_value = "zombie"
+        tmux.cmdline.return_value = ["tmux"]
+        mock_process.return_value.children.return_value = [zombie, tmux]
+        mocker.patch.object(i3_save.Container, "_save_with_plugin", return_value=False)
+        mock_check_subprocess = mocker.patch.object(i3_save.Container, "check_if_subprocess")
+
+        i3_save.CONFIG.enabled_plugins = {"tmux": {"timeout": 5}}
+        i3_save.CONFIG.terminals = [{"command": "test_command", "class": "terminal"}]
+        i3_save.Container(tree.Node({"window": 9999, "window_properties": {"class": "terminal"}}))
+
+        # The terminal is saved normally when no plugin saves it
+        mock_check_subprocess.assert_called_once()
+
     def test_get_cmdline_options_saves_terminals(self, mocker: MockerFixture) -> None:
         mocker.patch("subprocess.check_output", return_value=b"1")
         mocker.patch("psutil.Process")
 
         i3_save.CONFIG.terminals = [{"command": "test_command", "class": "test_class"}]
-        properties = {"window_properties": {"class": "test_class"}, "window": 9999}
+        properties = tree.Node({"window_properties": {"class": "test_class"}, "window": 9999})
+        container = i3_save.Container(properties)
+
+        assert container.command == "test_command"
+        assert container.server_command is None
+
+    def test_get_cmdline_options_saves_terminals_without_children(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("subprocess.check_output", return_value=b"1")
+        mock_process = mocker.patch("psutil.Process")
+        mock_process.return_value.children.return_value = []
+        mock_process.return_value.cwd.return_value = "terminal_dir"
+
+        i3_save.CONFIG.terminals = [{"command": "test_command", "class": "test_class"}]
+        properties = tree.Node({"window_properties": {"class": "test_class"}, "window": 9999})
         container = i3_save.Container(properties)
 
+        # The terminal's own working directory is used when its shell hasn't started yet
         assert container.command == "test_command"
+        assert container.working_directory == "terminal_dir"
+
+    def test_get_cmdline_options_saves_terminals_with_a_client(self, mocker: MockerFixture) -> None:
+        mocker.patch("subprocess.check_output", return_value=b"1")
+        mocker.patch("psutil.Process")
+
+        i3_save.CONFIG.terminals = [
+            {
+                "command": "urxvt",
+                "class": "URxvt",
+                "client_command": "urxvtc",
+                "server_command": "urxvtd -q -o -f",
+            }
+        ]
+        properties = tree.Node({"window_properties": {"class": "URxvt"}, "window": 9999})
+        container = i3_save.Container(properties)
+
+        assert container.command == "urxvtc || urxvt"
+        assert container.server_command == "urxvtd -q -o -f"
 
     @pytest.mark.parametrize("window_props", [{"class": "not_terminal"}, {}])
     def test_get_cmdline_options_saves_processes(
@@ -188,33 +984,80 @@ class TestContainer:
         mock_process.return_value.cwd.return_value = "test_dir"
 
         i3_save.CONFIG.terminals = [{"command": "test_command", "class": "test_class"}]
-        container = i3_save.Container({"window_properties": window_props, "window": 9999})
+        container = i3_save.Container(
+            tree.Node({"window_properties": window_props, "window": 9999})
+        )
 
         assert container.command == "test_command"
         assert container.working_directory == "test_dir"
 
-    def test_save_with_plugin_skips_saving_when_plugin_not_supported(
-        self, mocker: MockerFixture
-    ) -> None:
+    def test_save_with_plugin_handles_invalid_plugin_config(self, mocker: MockerFixture) -> None:
         mocker.patch("subprocess.check_output", return_value=b"1")
+        mocker.patch.object(i3_save.plugins, "load_plugin", side_effect=TypeError)
 
-        properties = {"window_properties": {"class": "unknown"}, "window": 9999}
+        i3_save.CONFIG.enabled_plugins = {}
+        properties = tree.Node(
+            {"window_properties": {"class": constants.KITTY_CLASS}, "window": 9999}
+        )
         container = i3_save.Container(properties)
+        i3_save.CONFIG.enabled_plugins = {constants.KITTY_CLASS: {"timeout": 5}}
 
-        assert not container._save_with_plugin()
+        assert not container._save_with_plugin(constants.KITTY_CLASS)
 
-    def test_save_with_plugin_handles_plugin_save_errors(self, mocker: MockerFixture) -> None:
+    @pytest.mark.parametrize(
+        "error", [i3_save.utils.PluginSaveError, subprocess.TimeoutExpired("kitty", 5)]
+    )
+    def test_save_with_plugin_handles_plugin_save_errors(
+        self, mocker: MockerFixture, error: Exception
+    ) -> None:
         mocker.patch("subprocess.check_output", return_value=b"1")
+
+        i3_save.CONFIG.enabled_plugins = {}
+        properties = tree.Node(
+            {"window_properties": {"class": constants.KITTY_CLASS}, "window": 9999}
+        )
+        container = i3_save.Container(properties)
+
+        def partially_save(container: i3_save.Container, _: JSON) -> None:
+            container.command = "partial_command"
+            raise error
+
+        plugin_config = {"timeout": 5}
+        i3_save.CONFIG.enabled_plugins = {constants.KITTY_CLASS: plugin_config}
+        mock_plugin = mocker.Mock()
+        mock_plugin.main.side_effect = partially_save
         mocker.patch.object(
-            i3_save.SUPPORTED_PLUGINS[constants.KITTY_CLASS],
-            "main",
-            side_effect=i3_save.utils.PluginSaveError,
+            i3_save.plugins, "load_plugin", return_value=(mock_plugin, plugin_config)
         )
 
-        properties = {"window_properties": {"class": constants.KITTY_CLASS}, "window": 9999}
+        mock_increment = mocker.patch.object(i3_save.metrics, "increment")
+
+        container.command = "test_command"
+        assert not container._save_with_plugin(constants.KITTY_CLASS)
+        assert container.command == "test_command"
+        mock_increment.assert_called_once_with("plugin_failures")
+
+    def test_save_with_plugin_sets_plugin_deadline(self, mocker: MockerFixture) -> None:
+        mocker.patch("subprocess.check_output", return_value=b"1")
+
+        i3_save.CONFIG.enabled_plugins = {}
+        properties = tree.Node(
+            {"window_properties": {"class": constants.KITTY_CLASS}, "window": 9999}
+        )
         container = i3_save.Container(properties)
 
-        assert not container._save_with_plugin()
+        timeouts = []
+        plugin_config = {"timeout": 5}
+        i3_save.CONFIG.enabled_plugins = {constants.KITTY_CLASS: plugin_config}
+        mock_plugin = mocker.Mock()
+        mock_plugin.main.side_effect = lambda *_: timeouts.append(i3_save.utils.get_timeout())
+        mocker.patch.object(
+            i3_save.plugins, "load_plugin", return_value=(mock_plugin, plugin_config)
+        )
+
+        assert container._save_with_plugin(constants.KITTY_CLASS)
+        assert 0 < timeouts[0] <= 5
+        assert i3_save.utils.get_timeout() is None
 
     def test_check_if_subprocess_saves_subprocess(self, mocker: MockerFixture) -> None:
         mocker.patch("subprocess.check_output", return_value=b"1")
@@ -230,7 +1073,9 @@ class TestContainer:
             {"name": "subprocess1"},
             {"name": "subprocess2", "args": ["--test-arg", "-t"]},
         ]
-        container = i3_save.Container({"window": 9999, "window_properties": {"class": "terminal"}})
+        container = i3_save.Container(
+            tree.Node({"window": 9999, "window_properties": {"class": "terminal"}})
+        )
         container.check_if_subprocess(mock_process)
 
         # The space should be escaped
@@ -251,7 +1096,9 @@ class TestContainer:
             {"name": "subprocess", "launch_command": "{command} and more!"}
         ]
 
-        container = i3_save.Container({"window": 9999, "window_properties": {"class": "terminal"}})
+        container = i3_save.Container(
+            tree.Node({"window": 9999, "window_properties": {"class": "terminal"}})
+        )
         container.check_if_subprocess(mock_process)
 
         assert container.subprocess_command == r"test_command and more!"
@@ -268,7 +1115,9 @@ class TestContainer:
 
         i3_save.CONFIG.subprocesses = [{"name": "subprocess", "include_args": ["--test-arg"]}]
 
-        container = i3_save.Container({"window": 9999, "window_properties": {"class": "terminal"}})
+        container = i3_save.Container(
+            tree.Node({"window": 9999, "window_properties": {"class": "terminal"}})
+        )
         container.check_if_subprocess(mock_process)
 
         assert container.subprocess_command is None
@@ -285,7 +1134,9 @@ class TestContainer:
 
         i3_save.CONFIG.subprocesses = [{"name": "subprocess", "args": ["--test-arg"]}]
 
-        container = i3_save.Container({"window": 9999, "window_properties": {"class": "terminal"}})
+        container = i3_save.Container(
+            tree.Node({"window": 9999, "window_properties": {"class": "terminal"}})
+        )
         container.check_if_subprocess(mock_process)
 
         assert container.subprocess_command is None
@@ -302,7 +1153,9 @@ class TestContainer:
 
         i3_save.CONFIG.subprocesses = [{"name": "subprocess", "exclude_args": ["--test-arg"]}]
 
-        container = i3_save.Container({"window": 9999, "window_properties": {"class": "terminal"}})
+        container = i3_save.Container(
+            tree.Node({"window": 9999, "window_properties": {"class": "terminal"}})
+        )
         container.check_if_subprocess(mock_process)
 
         assert container.subprocess_command is None
@@ -319,9 +1172,27 @@ class TestContainer:
 
         i3_save.CONFIG.subprocesses = [{"name": "subprocess1"}]
 
-        container = i3_save.Container({"window": 9999, "window_properties": {"class": "terminal"}})
+        container = i3_save.Container(
+            tree.Node({"window": 9999, "window_properties": {"class": "terminal"}})
+        )
+        container.check_if_subprocess(mock_process)
+
+        assert container.subprocess_command is None
+
+    def test_check_if_subprocess_skips_detection_when_out_of_time(
+        self, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("subprocess.check_output", return_value=b"1")
+        mocker.patch("psutil.Process")
+
+        container = i3_save.Container(
+            tree.Node({"window": 9999, "window_properties": {"class": "terminal"}})
+        )
+        mocker.patch.object(i3_save.utils, "should_skip", return_value=True)
+        mock_process = mocker.Mock()
         container.check_if_subprocess(mock_process)
 
+        mock_process.children.assert_not_called()
         assert container.subprocess_command is None
 
     def test_handle_web_browser_saves_configured_browsers(self, mocker: MockerFixture) -> None:
@@ -331,7 +1202,7 @@ class TestContainer:
 
         i3_save.CONFIG.terminals = []
         i3_save.CONFIG.web_browsers = ["test_browser"]
-        container = i3_save.Container({"window": 9999, "window_properties": {}})
+        container = i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
         container.command = "test_browser"
         container._handle_web_browser()
 
@@ -347,7 +1218,7 @@ class TestContainer:
 
         i3_save.CONFIG.terminals = []
         i3_save.CONFIG.web_browsers = ["browser1"]
-        container = i3_save.Container({"window": 9999, "window_properties": {}})
+        container = i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
         container.command = "not_a_browser"
         container._handle_web_browser()
 
@@ -362,7 +1233,7 @@ class TestContainer:
         mocker.patch("psutil.Process")
 
         i3_save.WEB_BROWSERS_DICT = {"test_browser": True}
-        container = i3_save.Container({"window": 9999, "window_properties": {}})
+        container = i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
         container._save_web_browser("test_browser")
 
         mock_open.assert_not_called()
@@ -373,7 +1244,7 @@ class TestContainer:
         mocker.patch("psutil.Process")
 
         i3_save.WEB_BROWSERS_DICT = {"test_browser": False}
-        container = i3_save.Container({"window": 9999, "window_properties": {}})
+        container = i3_save.Container(tree.Node({"window": 9999, "window_properties": {}}))
         container.command = "test_browser_command"
         container._save_web_browser("test_browser")
 
@@ -0,0 +1,173 @@
+import json
+import os
+import pathlib
+import socket
+from collections.abc import Iterator
+
+import pytest
+from pytest_mock import MockerFixture
+
+from programs import ipc
+
+
+@pytest.fixture
+def server(tmp_path: pathlib.Path) -> Iterator[socket.socket]:
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(tmp_path / "ipc.sock"))
+    server.listen(1)
+    yield server
+    server.close()
+
+
+def connect(server: socket.socket) -> tuple[ipc.Connection, socket.socket]:
+    connection = ipc.Connection(server.getsockname())
+    client, _ = server.accept()
+    return connection, client
+
+
+def message(message_type: int, payload: object) -> bytes:
+    data = json.dumps(payload).encode("utf-8")
+    return ipc.HEADER.pack(ipc.MAGIC, len(data), message_type) + data
+
+
+def test_get_socket_path_uses_i3sock(mocker: MockerFixture) -> None:
+    mocker.patch.dict(os.environ, {"I3SOCK": "/tmp/i3.sock"})
+    mock_check_output = mocker.patch("subprocess.check_output")
+
+    assert ipc.get_socket_path() == "/tmp/i3.sock"
+    mock_check_output.assert_not_called()
+
+
+def test_get_socket_path_asks_i3_without_i3sock(mocker: MockerFixture) -> None:
+    mocker.patch.dict(os.environ, {"I3SOCK": ""})
+    mocker.patch("subprocess.check_output", return_value=b"/run/user/1000/i3/ipc.sock\n")
+
+    assert ipc.get_socket_path() == "/run/user/1000/i3/ipc.sock"
+
+
+def test_connection_sends_messages_in_the_i3_format(server: socket.socket) -> None:
+    connection, client = connect(server)
+
+    connection.send(ipc.RUN_COMMAND, "workspace 1")
+
+    magic, length, message_type = ipc.HEADER.unpack(client.recv(ipc.HEADER.size))
+    assert magic == ipc.MAGIC
+    assert message_type == ipc.RUN_COMMAND
+    assert client.recv(length) == b"workspace 1"
+    connection.close()
+
+
+def test_request_skips_events_before_the_reply(server: socket.socket) -> None:
+    connection, client = connect(server)
+    client.sendall(message(ipc.EVENT_MASK, {"change": "focus"}))
+    client.sendall(message(ipc.RUN_COMMAND, [{"success": True}]))
+
+    assert connection.command("workspace 1") == [{"success": True}]
+    connection.close()
+
+
+@pytest.mark.parametrize(
+    ("method", "message_type", "reply"),
+    [
+        ("get_workspaces", ipc.GET_WORKSPACES, [{"name": "1"}]),
+        ("get_marks", ipc.GET_MARKS, ["mark"]),
+    ],
+)
+def test_connection_retrieves_replies(
+    server: socket.socket, method: str, message_type: int, reply: object
+) -> None:
+    connection, client = connect(server)
+    client.sendall(message(message_type, reply))
+
+    assert getattr(connection, method)() == reply
+    connection.close()
+
+
+def test_get_tree_parses_the_tree_into_nodes(server: socket.socket) -> None:
+    connection, client = connect(server)
+    client.sendall(message(ipc.GET_TREE, {"type": "root", "nodes": [{"name": "1", "nodes": []}]}))
+
+    root = connection.get_tree()
+    assert root.type == "root"
+    assert root.nodes[0].name == "1"
+    connection.close()
+
+
+def test_subscribe_and_receive_event(server: socket.socket) -> None:
+    connection, client = connect(server)
+    client.sendall(message(ipc.SUBSCRIBE, {"success": True}))
+    client.sendall(message(ipc.GET_TREE, {"nodes": []}))
+    client.sendall(message(ipc.EVENT_MASK | 0, {"change": "focus"}))
+
+    assert connection.subscribe(["workspace"]) == {"success": True}
+    # Replies received while waiting for an event are skipped
+    assert connection.receive_event() == (0, {"change": "focus"})
+
+    client.recv(ipc.HEADER.size)
+    assert client.recv(1024) == b'["workspace"]'
+    connection.close()
+
+
+def test_receive_event_returns_none_after_timeout(server: socket.socket) -> None:
+    connection, client = connect(server)
+
+    assert connection.receive_event(timeout=0) is None
+
+    client.sendall(message(ipc.EVENT_MASK | ipc.WINDOW_EVENT, {"change": "new"}))
+    assert connection.receive_event(timeout=1) == (ipc.WINDOW_EVENT, {"change": "new"})
+    connection.close()
+
+
+def test_receive_raises_error_on_invalid_magic(server: socket.socket) -> None:
+    connection, client = connect(server)
+    client.sendall(ipc.HEADER.pack(b"invalid", 0, 0))
+
+    with pytest.raises(ipc.IPCError):
+        connection.receive()
+
+    connection.close()
+
+
+def test_receive_raises_error_when_socket_is_closed(server: socket.socket) -> None:
+    connection, client = connect(server)
+    client.sendall(b"i3-")
+    client.close()
+
+    with pytest.raises(ipc.IPCError):
+        connection.receive()
+
+    connection.close()
+
+
+def test_quote_escapes_quotes_and_backslashes() -> None:
+    assert ipc.quote(r'1: "web" \ work') == r'"1: \"web\" \\ work"'
+
+
+def test_connect_retries_until_i3_accepts_connections(mocker: MockerFixture) -> None:
+    mock_sleep = mocker.patch("time.sleep")
+    mock_connection = mocker.patch.object(
+        ipc, "Connection", side_effect=[ConnectionRefusedError, "connection"]
+    )
+
+    assert ipc.connect() == "connection"
+    assert mock_connection.call_count == 2
+    mock_sleep.assert_called_once()
+
+
+def test_connect_raises_error_after_timeout(mocker: MockerFixture) -> None:
+    mocker.patch("time.sleep")
+    mocker.patch("time.monotonic", side_effect=[0, 5, 10])
+    mocker.patch.object(ipc, "Connection", side_effect=FileNotFoundError)
+
+    with pytest.raises(FileNotFoundError):
+        ipc.connect(timeout=10)
+
+
+def test_split_commands_splits_on_unquoted_separators() -> None:
+    payload = 'workspace "a; b \\" c"; [con_mark="x"] focus, kill; exec "a, b";'
+    assert ipc.split_commands(payload) == [
+        'workspace "a; b \\" c"',
+        '[con_mark="x"] focus',
+        "kill",
+        'exec "a, b"',
+    ]
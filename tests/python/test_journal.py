@@ -0,0 +1,103 @@
+import json
+import pathlib
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import journal
+
+
+@pytest.fixture(autouse=True)
+def i3_path(mocker: MockerFixture, tmp_path: pathlib.Path) -> pathlib.Path:
+    mocker.patch.object(journal.utils, "i3_PATH", str(tmp_path))
+    return tmp_path
+
+
+def test_get_plan_hash_hashes_the_restore_plan(i3_path: pathlib.Path) -> None:
+    assert journal.get_plan_hash() is None
+
+    plan_file = i3_path / journal.constants.RESTORE_PLAN_FILE_NAME
+    plan_file.write_text('{"workspaces": []}')
+    plan_hash = journal.get_plan_hash()
+    assert plan_hash is not None
+
+    plan_file.write_text('{"workspaces": [{}]}')
+    assert journal.get_plan_hash() != plan_hash
+
+
+def test_start_journal_starts_from_the_beginning(mocker: MockerFixture) -> None:
+    mocker.patch.object(journal, "get_plan_hash", return_value="abc")
+    previous_journal = journal.RestoreJournal("abc")
+    previous_journal.set_launched("1", 2)
+
+    restore_journal = journal.start_journal(resume=False)
+
+    assert restore_journal.get_launched("1") == set()
+    # The previous journal is replaced
+    assert journal.RestoreJournal.load("abc").get_launched("1") == set()
+
+
+def test_start_journal_resumes_the_last_restore(mocker: MockerFixture) -> None:
+    mocker.patch.object(journal, "get_plan_hash", return_value="abc")
+    previous_journal = journal.RestoreJournal("abc")
+    previous_journal.set_servers_started()
+    previous_journal.set_launched("1", 2)
+    previous_journal.set_launched("1", 0)
+    previous_journal.set_restored(["2"])
+    previous_journal.set_browsers_restored()
+
+    restore_journal = journal.start_journal(resume=True)
+
+    assert restore_journal.servers_started
+    assert restore_journal.browsers_restored
+    assert restore_journal.get_launched("1") == {0, 2}
+    assert not restore_journal.is_restored("1")
+    assert restore_journal.is_restored("2")
+    assert not restore_journal.finished
+
+
+def test_start_journal_starts_from_the_beginning_without_a_journal(mocker: MockerFixture) -> None:
+    mocker.patch.object(journal, "get_plan_hash", return_value="abc")
+    restore_journal = journal.start_journal(resume=True)
+    assert restore_journal.workspaces == {}
+
+
+@pytest.mark.parametrize("plan_hash", [None, "other"])
+def test_load_ignores_journals_of_other_restore_plans(plan_hash: str | None) -> None:
+    journal.RestoreJournal("abc").finish()
+    assert journal.RestoreJournal.load(plan_hash) is None
+
+
+def test_load_ignores_invalid_journals(i3_path: pathlib.Path) -> None:
+    (i3_path / journal.constants.RESTORE_JOURNAL_FILE_NAME).write_text("{")
+    assert journal.RestoreJournal.load("abc") is None
+
+
+def test_save_replaces_the_journal(i3_path: pathlib.Path) -> None:
+    restore_journal = journal.RestoreJournal("abc")
+    restore_journal.set_launched("1", 1)
+    restore_journal.set_launched("1", 0)
+    restore_journal.finish()
+
+    assert [file.name for file in i3_path.iterdir()] == [
+        journal.constants.RESTORE_JOURNAL_FILE_NAME
+    ]
+    with journal.get_journal_file().open() as f:
+        assert json.load(f) == {
+            "plan_hash": "abc",
+            "servers_started": False,
+            "workspaces": {"1": {"launched": [1, 0]}},
+            "browsers_restored": False,
+            "finished": True,
+        }
+
+
+def test_save_keeps_journals_without_a_plan_hash_in_memory(i3_path: pathlib.Path) -> None:
+    restore_journal = journal.RestoreJournal()
+    restore_journal.set_restored(["1"])
+
+    assert restore_journal.is_restored("1")
+    assert list(i3_path.iterdir()) == []
@@ -0,0 +1,144 @@
+import json
+import pathlib
+import re
+from unittest import mock
+
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import layout
+
+from programs import constants, tree
+
+WINDOW = {
+    "type": "con",
+    "name": "vim ~/file.txt",
+    "layout": "splith",
+    "border": "normal",
+    "current_border_width": -1,
+    "fullscreen_mode": 0,
+    "percent": 0.5,
+    "rect": {"x": 0, "y": 0, "width": 10, "height": 10},
+    "geometry": {"x": 0, "y": 0, "width": 0, "height": 0},
+    "marks": [],
+    "focused": False,
+    "window": 101,
+    "window_properties": {
+        "class": "Alacritty",
+        "instance": "alacritty",
+        "title": "vim ~/file.txt",
+        "transient_for": None,
+    },
+    "nodes": [],
+    "floating_nodes": [],
+}
+
+
+def parse_container(container: dict) -> tree.Node:
+    return tree.parse_tree(json.dumps(container))
+
+
+def test_save_workspace_layout_skips_empty_workspaces(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(layout.utils, "i3_PATH", str(tmp_path))
+
+    workspace = parse_container({"name": "1", "nodes": [], "floating_nodes": []})
+    workspace.output = "HDMI-1"
+    assert layout.save_workspace_layout(workspace) is None
+    assert not list(tmp_path.iterdir())
+
+
+def test_save_workspace_layout_writes_each_container(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(layout.utils, "i3_PATH", str(tmp_path))
+
+    floating_con = {"type": "floating_con", "rect": {"x": 5}, "nodes": [WINDOW]}
+    workspace = parse_container(
+        {"name": "1/ws", "nodes": [WINDOW, WINDOW], "floating_nodes": [floating_con]}
+    )
+    workspace.output = "HDMI-1"
+    file = layout.save_workspace_layout(workspace)
+
+    # The slash in the workspace name is sanitized
+    assert file == tmp_path / "workspace_1{slash}ws_HDMI-1_layout.json"
+
+    decoder = json.JSONDecoder()
+    contents = file.read_text().strip()
+    containers = []
+    while contents:
+        container, end = decoder.raw_decode(contents)
+        containers.append(container)
+        contents = contents[end:].strip()
+
+    assert len(containers) == 3
+    assert containers[2]["rect"] == {"x": 5}
+
+
+def test_strip_container_keeps_only_layout_keys() -> None:
+    parent = {"type": "con", "name": "generated", "layout": "splitv", "nodes": [WINDOW]}
+    stripped = layout.strip_container(parse_container(parent))
+
+    assert stripped == {
+        "type": "con",
+        "layout": "splitv",
+        "nodes": [
+            {
+                "type": "con",
+                "name": "vim ~/file.txt",
+                "border": "normal",
+                "percent": 0.5,
+                "marks": [],
+                "swallows": [
+                    {
+                        "class": "^Alacritty$",
+                        "instance": "^alacritty$",
+                        "title": "^" + re.escape("vim ~/file.txt") + "$",
+                    }
+                ],
+            }
+        ],
+    }
+
+
+def test_strip_container_does_not_match_the_title_of_launched_windows() -> None:
+    stripped = layout.strip_container(parse_container(WINDOW), launched_windows={101})
+    assert stripped["swallows"] == [{"class": "^Alacritty$", "instance": "^alacritty$"}]
+
+
+def test_strip_container_marks_the_focused_window() -> None:
+    stripped = layout.strip_container(
+        parse_container({**WINDOW, "focused": True, "marks": ["mark"]})
+    )
+    assert stripped["marks"] == ["mark", constants.FOCUS_MARK]
+
+
+def test_strip_container_keeps_non_default_values() -> None:
+    container = {
+        **WINDOW,
+        "fullscreen_mode": 1,
+        "current_border_width": 2,
+        "geometry": {"x": 0, "y": 0, "width": 100, "height": 50},
+    }
+    stripped = layout.strip_container(parse_container(container))
+
+    assert stripped["fullscreen_mode"] == 1
+    assert stripped["current_border_width"] == 2
+    assert stripped["geometry"]["width"] == 100
+
+
+def test_strip_container_handles_deeply_nested_containers() -> None:
+    # Deeper than the recursion limit
+    root = parse_container(WINDOW)
+    for _ in range(5000):
+        root = tree.Node({"type": "con", "layout": "splith", "nodes": [root]})
+
+    stripped = layout.strip_container(root)
+    depth = 0
+    while "nodes" in stripped:
+        stripped = stripped["nodes"][0]
+        depth += 1
+
+    assert depth == 5000
@@ -0,0 +1,129 @@
+import os
+import pathlib
+import pwd
+import subprocess
+import sys
+from collections.abc import Iterator
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import metrics
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics() -> Iterator[None]:
+    metrics._phases.clear()
+    metrics._counters.update(dict.fromkeys(metrics.COUNTERS, 0))
+    yield
+    metrics._phases.clear()
+    metrics._counters.update(dict.fromkeys(metrics.COUNTERS, 0))
+
+
+@pytest.fixture
+def display(mocker: MockerFixture) -> None:
+    mocker.patch.dict(os.environ, {"DISPLAY": ":1"})
+    mocker.patch.object(metrics, "get_user", return_value="user")
+
+
+def test_phase_adds_up_the_time_spent_in_each_phase(mocker: MockerFixture) -> None:
+    mocker.patch("time.monotonic", side_effect=[0, 1, 5, 7.5])
+
+    with metrics.phase("tree"):
+        pass
+    with metrics.phase("tree"):
+        pass
+
+    assert metrics._phases == {"tree": 3.5}
+
+
+def test_subprocesses_are_counted() -> None:
+    metrics.increment("containers", 2)
+    subprocess.run([sys.executable, "-c", ""], check=True)
+
+    assert metrics._counters["containers"] == 2
+    assert metrics._counters["subprocesses"] == 1
+
+    # Audit hooks aren't traced by coverage, so the hook is also called directly
+    metrics._count_subprocesses("subprocess.Popen", ())
+    metrics._count_subprocesses("open", ())
+    assert metrics._counters["subprocesses"] == 2
+
+
+def test_get_bytes_written_only_counts_files_written_since_the_start(
+    tmp_path: pathlib.Path,
+) -> None:
+    old_file = tmp_path / "old"
+    old_file.write_text("old")
+    os.utime(old_file, (0, 0))
+    (tmp_path / "new").write_text("new file")
+
+    assert metrics.get_bytes_written(str(tmp_path), 100) == len("new file")
+    assert metrics.get_bytes_written(str(tmp_path / "missing"), 100) == 0
+
+
+@pytest.mark.usefixtures("display")
+def test_write_metrics_writes_the_textfile_collector_format(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch("time.time", return_value=1000)
+    metrics._phases["tree"] = 0.5
+    metrics.increment("workspaces", 3)
+
+    metrics.write_metrics(str(tmp_path / "metrics"), "save", True, 998, str(tmp_path))
+
+    metrics_files = list((tmp_path / "metrics").iterdir())
+    assert [file.name for file in metrics_files] == ["i3_restore_save_user_1.prom"]
+    lines = metrics_files[0].read_text().splitlines()
+
+    labels = 'program="save",user="user",display=":1"'
+    assert "# TYPE i3_restore_success gauge" in lines
+    assert f"i3_restore_success{{{labels}}} 1" in lines
+    assert f"i3_restore_duration_seconds{{{labels}}} 2" in lines
+    assert f'i3_restore_phase_duration_seconds{{{labels},phase="tree"}} 0.5' in lines
+    assert f"i3_restore_workspaces{{{labels}}} 3" in lines
+    assert f"i3_restore_plugin_failures{{{labels}}} 0" in lines
+    assert f"i3_restore_last_success_timestamp_seconds{{{labels}}} 1000" in lines
+
+
+@pytest.mark.usefixtures("display")
+def test_write_metrics_keeps_the_last_success_when_the_run_fails(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mock_time = mocker.patch("time.time", return_value=1000)
+    for _ in range(2):
+        metrics.write_metrics(str(tmp_path), "save", False, 1000, str(tmp_path))
+        assert "last_success" not in (tmp_path / "i3_restore_save_user_1.prom").read_text()
+
+    metrics.write_metrics(str(tmp_path), "save", True, 1000, str(tmp_path))
+    mock_time.return_value = 2000
+    metrics.write_metrics(str(tmp_path), "save", False, 2000, str(tmp_path))
+
+    lines = (tmp_path / "i3_restore_save_user_1.prom").read_text().splitlines()
+    labels = 'program="save",user="user",display=":1"'
+    assert f"i3_restore_success{{{labels}}} 0" in lines
+    assert f"i3_restore_last_run_timestamp_seconds{{{labels}}} 2000" in lines
+    assert f"i3_restore_last_success_timestamp_seconds{{{labels}}} 1000.0" in lines
+
+
+def test_write_metrics_does_nothing_without_a_metrics_directory(mocker: MockerFixture) -> None:
+    mock_get_metrics_file = mocker.patch.object(metrics, "get_metrics_file")
+    metrics.write_metrics(None, "save", True, 0, "/i3")
+    mock_get_metrics_file.assert_not_called()
+
+
+@pytest.mark.usefixtures("display")
+def test_write_metrics_does_not_fail_the_run(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "file").touch()
+    metrics.write_metrics(str(tmp_path / "file"), "restore", True, 0, str(tmp_path))
+
+
+def test_get_user_gets_the_name_of_the_current_user() -> None:
+    assert metrics.get_user() == pwd.getpwuid(os.getuid()).pw_name
+
+
+def test_format_labels_escapes_values() -> None:
+    assert metrics.format_labels({"a": 'x"y\\z\n'}) == '{a="x\\"y\\\\z\\n"}'
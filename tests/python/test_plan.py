@@ -0,0 +1,110 @@
+import json
+import pathlib
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import plan
+
+from programs import constants, tree
+
+
+@pytest.fixture(autouse=True)
+def i3_path(mocker: MockerFixture, tmp_path: pathlib.Path) -> pathlib.Path:
+    mocker.patch.object(plan.utils, "i3_PATH", str(tmp_path))
+    return tmp_path
+
+
+def plan_workspace(name: str) -> dict[str, str]:
+    return {"name": name, "layout_command": f"layout {name}"}
+
+
+def test_compile_workspace_builds_every_command() -> None:
+    workspace = tree.Node({"name": '1: "code"'})
+    workspace.output = "HDMI-1"
+    workspace.visible = workspace.focused_workspace = True
+    launch_scripts = [pathlib.Path("/i3/container 0.sh"), pathlib.Path("/i3/container_1.sh")]
+
+    compiled = plan.compile_workspace(
+        workspace,
+        pathlib.Path("/i3/layout.json"),
+        launch_scripts,
+        ["kitty", None],
+        "hash",
+        ["urxvtd -q -o -f"],
+        ["/usr/bin/kitty", "/usr/lib/libc.so.6"],
+    )
+
+    focus_command = 'workspace --no-auto-back-and-forth "1: \\"code\\""'
+    assert compiled == {
+        "name": '1: "code"',
+        "output": "HDMI-1",
+        "focused": True,
+        "visible": True,
+        "output_command": f'{focus_command}; move workspace to output "HDMI-1"',
+        "layout_command": f'{focus_command}; append_layout "/i3/layout.json"',
+        "launch_commands": [
+            f"{focus_command}; exec \"'/i3/container 0.sh'\"",
+            f'{focus_command}; exec "/i3/container_1.sh"',
+        ],
+        "launch_classes": ["kitty", None],
+        "server_commands": ["urxvtd -q -o -f"],
+        "prefetch_files": ["/usr/bin/kitty", "/usr/lib/libc.so.6"],
+        "hash": "hash",
+    }
+
+
+def test_save_plan_saves_all_workspaces(i3_path: pathlib.Path) -> None:
+    plan_file = plan.save_plan([plan_workspace("1"), plan_workspace("2")])
+
+    assert plan_file == i3_path / constants.RESTORE_PLAN_FILE_NAME
+    saved_plan = json.loads(plan_file.read_text())
+    assert saved_plan["version"] == constants.RESTORE_PLAN_VERSION
+    assert [workspace["name"] for workspace in saved_plan["workspaces"]] == ["1", "2"]
+
+
+def test_save_plan_merges_selected_workspaces_into_existing_plan() -> None:
+    plan.save_plan([plan_workspace("1"), plan_workspace("2"), plan_workspace("3")])
+
+    # Workspace 2 was saved again, workspace 3 is now empty, and workspace 4 is new
+    new_workspace_2 = {"name": "2", "layout_command": "new layout"}
+    plan.save_plan([new_workspace_2, plan_workspace("4")], ["2", "3", "4"])
+
+    assert plan.load_plan()["workspaces"] == [
+        plan_workspace("1"),
+        new_workspace_2,
+        plan_workspace("4"),
+    ]
+
+
+def test_save_plan_keeps_workspaces_in_existing_plan() -> None:
+    plan.save_plan([plan_workspace("1"), plan_workspace("2"), plan_workspace("3")])
+
+    # Workspace 2 is kept even though it was saved again, and workspace 3 is gone
+    plan.save_plan([plan_workspace("1"), {"name": "2"}], keep_workspaces=["2"])
+
+    assert plan.load_plan()["workspaces"] == [plan_workspace("1"), plan_workspace("2")]
+
+
+def test_load_plan_returns_empty_plan_when_not_saved() -> None:
+    assert plan.load_plan() == {"version": constants.RESTORE_PLAN_VERSION, "workspaces": []}
+
+
+def test_load_plan_raises_error_on_unsupported_version(i3_path: pathlib.Path) -> None:
+    (i3_path / constants.RESTORE_PLAN_FILE_NAME).write_text('{"version": 0, "workspaces": []}')
+
+    with pytest.raises(ValueError, match="not supported"):
+        plan.load_plan()
+
+
+def test_save_lazy_workspaces_saves_and_removes_lazy_workspaces(i3_path: pathlib.Path) -> None:
+    assert plan.load_lazy_workspaces() == []
+
+    plan.save_lazy_workspaces(["1", "2"])
+    assert plan.load_lazy_workspaces() == ["1", "2"]
+
+    plan.save_lazy_workspaces([])
+    assert not (i3_path / constants.LAZY_WORKSPACES_FILE_NAME).exists()
@@ -0,0 +1,38 @@
+import pathlib
+from unittest import mock
+
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import prefetch
+
+
+def test_start_prefetch_prefetches_each_file_once(mocker: MockerFixture) -> None:
+    mock_prefetch_file = mocker.patch.object(prefetch, "prefetch_file")
+
+    executor = prefetch.start_prefetch(["/usr/bin/kitty", "/usr/lib/libc.so.6", "/usr/bin/kitty"])
+    executor.shutdown()
+
+    assert mock_prefetch_file.call_args_list == [
+        mock.call("/usr/bin/kitty"),
+        mock.call("/usr/lib/libc.so.6"),
+    ]
+
+
+def test_prefetch_file_reads_the_file_into_the_page_cache(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mock_fadvise = mocker.patch("os.posix_fadvise")
+    file = tmp_path / "program"
+    file.write_text("program")
+
+    prefetch.prefetch_file(str(file))
+
+    mock_fadvise.assert_called_once_with(mock.ANY, 0, 0, prefetch.os.POSIX_FADV_WILLNEED)
+
+
+def test_prefetch_file_skips_missing_files(mocker: MockerFixture, tmp_path: pathlib.Path) -> None:
+    mock_fadvise = mocker.patch("os.posix_fadvise")
+    prefetch.prefetch_file(str(tmp_path / "missing"))
+    mock_fadvise.assert_not_called()
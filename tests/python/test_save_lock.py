@@ -0,0 +1,232 @@
+import fcntl
+import json
+import pathlib
+import time
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import save_lock
+
+
+@pytest.fixture(autouse=True)
+def i3_path(mocker: MockerFixture, tmp_path: pathlib.Path) -> pathlib.Path:
+    mocker.patch.object(save_lock.utils, "i3_PATH", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def executor() -> Iterator[ThreadPoolExecutor]:
+    with ThreadPoolExecutor() as executor:
+        yield executor
+
+
+def lock_file(path: pathlib.Path, contents: str) -> IO[str]:
+    """Lock a file like another save would"""
+    file = path.open("a+")
+    fcntl.flock(file, fcntl.LOCK_EX)
+    save_lock.write_file(file, contents)
+    return file
+
+
+def assert_waiting(future: Future[None]) -> None:
+    time.sleep(0.1)
+    assert not future.done()
+
+
+def test_single_flight_saves_the_session(i3_path: pathlib.Path) -> None:
+    save = mock.Mock()
+    save_lock.single_flight(save)
+
+    save.assert_called_once()
+    lock_path = i3_path / save_lock.constants.SAVE_LOCK_FILE_NAME
+    assert json.loads(lock_path.read_text()) == {"1": "succeeded"}
+    queue_path = i3_path / save_lock.constants.SAVE_QUEUE_FILE_NAME
+    assert json.loads(queue_path.read_text()) == {"generation": 1, "request": None}
+
+
+def test_single_flight_numbers_the_saves(i3_path: pathlib.Path) -> None:
+    save = mock.Mock()
+    for _ in range(save_lock.constants.SAVE_RESULTS_KEPT + 1):
+        save_lock.single_flight(save)
+
+    results = json.loads((i3_path / save_lock.constants.SAVE_LOCK_FILE_NAME).read_text())
+    assert len(results) == save_lock.constants.SAVE_RESULTS_KEPT
+    assert "1" not in results
+    assert results[str(save_lock.constants.SAVE_RESULTS_KEPT + 1)] == "succeeded"
+
+
+def test_single_flight_records_failed_saves(i3_path: pathlib.Path) -> None:
+    with pytest.raises(RuntimeError):
+        save_lock.single_flight(mock.Mock(side_effect=RuntimeError))
+
+    lock_path = i3_path / save_lock.constants.SAVE_LOCK_FILE_NAME
+    assert json.loads(lock_path.read_text()) == {"1": "failed"}
+
+
+def test_single_flight_saves_again_after_the_running_save(
+    i3_path: pathlib.Path, executor: ThreadPoolExecutor
+) -> None:
+    running_save = lock_file(
+        i3_path / save_lock.constants.SAVE_LOCK_FILE_NAME, json.dumps({"1": "running"})
+    )
+    save = mock.Mock()
+
+    future = executor.submit(save_lock.single_flight, save, ["1"], True)
+    assert_waiting(future)
+    save.assert_not_called()
+
+    running_save.close()
+    future.result(timeout=5)
+    save.assert_called_once()
+
+
+def test_single_flight_stops_waiting_for_the_running_save_at_the_deadline(
+    i3_path: pathlib.Path,
+) -> None:
+    running_save = lock_file(
+        i3_path / save_lock.constants.SAVE_LOCK_FILE_NAME, json.dumps({"1": "running"})
+    )
+    save = mock.Mock()
+
+    with save_lock.utils.deadline(0.2), pytest.raises(save_lock.SaveError):
+        save_lock.single_flight(save)
+
+    save.assert_not_called()
+    running_save.close()
+
+    # The save that timed out isn't queued anymore
+    save_lock.single_flight(save)
+    save.assert_called_once()
+
+
+def test_single_flight_stops_waiting_for_the_queued_save_at_the_deadline(
+    i3_path: pathlib.Path,
+) -> None:
+    request = {"workspaces": None, "force": False}
+    queued_save = lock_file(
+        i3_path / save_lock.constants.SAVE_QUEUE_FILE_NAME,
+        json.dumps({"generation": 1, "request": request}),
+    )
+
+    with save_lock.utils.deadline(0.2), pytest.raises(save_lock.SaveError):
+        save_lock.single_flight(mock.Mock())
+
+    queued_save.close()
+
+
+@pytest.mark.parametrize(
+    ("results", "result"),
+    [
+        # A newer save started after the queued save finished
+        ({"4": "succeeded", "5": "succeeded", "6": "running"}, "succeeded"),
+        ({"5": "failed"}, "failed"),
+        # The queued save was killed
+        ({"5": "running"}, "saved"),
+        ({}, "saved"),
+    ],
+)
+def test_single_flight_shares_the_result_of_the_queued_save(
+    i3_path: pathlib.Path, executor: ThreadPoolExecutor, results: save_lock.JSON, result: str
+) -> None:
+    queue_path = i3_path / save_lock.constants.SAVE_QUEUE_FILE_NAME
+    request = {"workspaces": None, "force": False}
+    queued_save = lock_file(queue_path, json.dumps({"generation": 5, "request": request}))
+    running_save = lock_file(
+        i3_path / save_lock.constants.SAVE_LOCK_FILE_NAME, json.dumps({"4": "running"})
+    )
+    save = mock.Mock()
+
+    future = executor.submit(save_lock.single_flight, save, ["1"])
+    assert_waiting(future)
+
+    # The queued save starts once the running save finishes
+    save_lock.write_file(queued_save, json.dumps({"generation": 5, "request": None}))
+    queued_save.close()
+    assert_waiting(future)
+
+    save_lock.write_file(running_save, json.dumps(results))
+    running_save.close()
+
+    if result == "failed":
+        with pytest.raises(save_lock.SaveError):
+            future.result(timeout=5)
+    else:
+        future.result(timeout=5)
+
+    if result == "saved":
+        save.assert_called_once()
+        assert json.loads(queue_path.read_text())["generation"] == 6
+    else:
+        save.assert_not_called()
+
+
+def test_single_flight_queues_behind_a_queued_save_of_other_workspaces(
+    i3_path: pathlib.Path, executor: ThreadPoolExecutor
+) -> None:
+    queue_path = i3_path / save_lock.constants.SAVE_QUEUE_FILE_NAME
+    request = {"workspaces": ["1"], "force": False}
+    queued_save = lock_file(queue_path, json.dumps({"generation": 1, "request": request}))
+    save = mock.Mock()
+
+    future = executor.submit(save_lock.single_flight, save, ["1", "2"])
+    assert_waiting(future)
+
+    queued_save.close()
+    future.result(timeout=5)
+    save.assert_called_once()
+    assert json.loads(queue_path.read_text())["generation"] == 2
+
+
+def test_single_flight_queues_behind_a_started_save(
+    i3_path: pathlib.Path, executor: ThreadPoolExecutor
+) -> None:
+    queue_path = i3_path / save_lock.constants.SAVE_QUEUE_FILE_NAME
+    started_save = lock_file(queue_path, json.dumps({"generation": 1, "request": None}))
+    save = mock.Mock()
+
+    future = executor.submit(save_lock.single_flight, save)
+    assert_waiting(future)
+
+    started_save.close()
+    future.result(timeout=5)
+    save.assert_called_once()
+
+
+def test_read_queue_ignores_saves_that_are_not_written_yet(i3_path: pathlib.Path) -> None:
+    with (i3_path / "queue").open("a+") as queue_file:
+        assert save_lock.read_queue(queue_file) is None
+
+        save_lock.write_file(queue_file, '{"generation": 1, "request": null}')
+        assert save_lock.read_queue(queue_file) == {"generation": 1, "request": None}
+
+
+def test_read_results_ignores_results_that_are_not_written_yet(i3_path: pathlib.Path) -> None:
+    with (i3_path / "lock").open("a+") as lock_file:
+        assert save_lock.read_results(lock_file) == {}
+
+        save_lock.write_file(lock_file, '{"1": "succeeded"}')
+        assert save_lock.read_results(lock_file) == {"1": "succeeded"}
+
+
+@pytest.mark.parametrize(
+    ("queued_request", "requested", "covers"),
+    [
+        ({"workspaces": None, "force": False}, {"workspaces": ["1"], "force": False}, True),
+        ({"workspaces": None, "force": True}, {"workspaces": None, "force": False}, True),
+        ({"workspaces": None, "force": False}, {"workspaces": None, "force": True}, False),
+        ({"workspaces": ["1", "2"], "force": False}, {"workspaces": ["2"], "force": False}, True),
+        ({"workspaces": ["1"], "force": False}, {"workspaces": ["1", "2"], "force": False}, False),
+        ({"workspaces": ["1"], "force": False}, {"workspaces": None, "force": False}, False),
+    ],
+)
+def test_covers_request(
+    queued_request: save_lock.JSON, requested: save_lock.JSON, covers: bool
+) -> None:
+    assert save_lock.covers_request(queued_request, requested) == covers
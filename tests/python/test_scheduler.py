@@ -0,0 +1,273 @@
+import pathlib
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+with mock.patch("utils.get_logger"):
+    # Don't log messages to a file
+    from programs import scheduler
+
+
+@pytest.fixture(autouse=True)
+def i3_path(mocker: MockerFixture, tmp_path: pathlib.Path) -> pathlib.Path:
+    mocker.patch.object(scheduler.utils, "i3_PATH", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def mock_connection(mocker: MockerFixture) -> mock.Mock:
+    return mocker.patch.object(scheduler.ipc, "Connection").return_value
+
+
+@pytest.fixture
+def mock_time(mocker: MockerFixture) -> mock.Mock:
+    return mocker.patch("time.monotonic", return_value=0)
+
+
+def window_event(window_class: str, change: str = "new", window: int = 100) -> tuple[int, dict]:
+    return scheduler.ipc.WINDOW_EVENT, {
+        "change": change,
+        "container": {"window": window, "window_properties": {"class": window_class}},
+    }
+
+
+def test_get_pressure_reads_pressure_stall_information(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    mocker.patch.object(scheduler.constants, "PRESSURE_DIR", str(tmp_path))
+    (tmp_path / "cpu").write_text(
+        "some avg10=12.50 avg60=3.00 avg300=1.00 total=100\n"
+        "full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+    )
+    (tmp_path / "io").write_text("invalid\n")
+
+    assert scheduler.get_pressure("cpu") == 12.5
+    assert scheduler.get_pressure("io") is None
+    assert scheduler.get_pressure("memory") is None
+
+
+@pytest.mark.parametrize(
+    ("load", "pressure", "expected_limit"),
+    [
+        (0.5, None, 8),
+        (0.5, 5.0, 8),
+        (8.0, None, 4),
+        (0.5, 20.0, 4),
+        (16.0, None, 1),
+        (0.5, 50.0, 1),
+    ],
+)
+def test_get_launch_limit_adapts_to_load_and_pressure(
+    mocker: MockerFixture, load: float, pressure: float | None, expected_limit: int
+) -> None:
+    mocker.patch("os.cpu_count", return_value=8)
+    mocker.patch("os.getloadavg", return_value=(load, 0, 0))
+    mocker.patch.object(scheduler, "get_pressure", return_value=pressure)
+
+    assert scheduler.get_launch_limit() == expected_limit
+
+
+def test_launch_scheduler_subscribes_to_window_events(mock_connection: mock.Mock) -> None:
+    launch_scheduler = scheduler.LaunchScheduler({})
+    mock_connection.subscribe.assert_called_once_with(["window"])
+
+    launch_scheduler.close()
+    mock_connection.close.assert_called_once()
+
+
+@pytest.mark.usefixtures("mock_time")
+def test_wait_for_slot_limits_launches_by_load(
+    mocker: MockerFixture, mock_connection: mock.Mock
+) -> None:
+    mocker.patch.object(scheduler, "get_launch_limit", return_value=1)
+    mock_connection.receive_event.side_effect = [window_event("other"), window_event("kitty")]
+    launch_scheduler = scheduler.LaunchScheduler({})
+
+    launch_scheduler.wait_for_slot("kitty")
+    launch_scheduler.add("kitty")
+    launch_scheduler.wait_for_slot("firefox")
+
+    # The window of another class doesn't finish the kitty launch
+    assert mock_connection.receive_event.call_count == 2
+    assert launch_scheduler.in_flight == []
+
+
+@pytest.mark.usefixtures("mock_time")
+def test_wait_for_slot_limits_launches_by_class(
+    mocker: MockerFixture, mock_connection: mock.Mock
+) -> None:
+    mocker.patch.object(scheduler, "get_launch_limit", return_value=8)
+    mock_connection.receive_event.side_effect = [
+        window_event("firefox", change="title"),
+        window_event("firefox"),
+    ]
+    launch_scheduler = scheduler.LaunchScheduler({"kitty": 2})
+
+    launch_scheduler.add("firefox")
+    launch_scheduler.add("kitty")
+    # Other classes aren't limited by the firefox launch, and kitty is configured to launch two
+    # containers at once
+    launch_scheduler.wait_for_slot("kitty")
+    launch_scheduler.wait_for_slot("idea")
+    mock_connection.receive_event.assert_not_called()
+
+    # Containers of the same class are launched one at a time by default
+    launch_scheduler.wait_for_slot("firefox")
+    assert mock_connection.receive_event.call_count == 2
+    assert [launch[0] for launch in launch_scheduler.in_flight] == ["kitty"]
+
+
+@pytest.mark.usefixtures("mock_time")
+def test_wait_for_slot_finishes_launches_of_unknown_classes_with_any_window(
+    mocker: MockerFixture, mock_connection: mock.Mock
+) -> None:
+    mocker.patch.object(scheduler, "get_launch_limit", return_value=8)
+    mock_connection.receive_event.side_effect = [window_event("kitty"), window_event("firefox")]
+    launch_scheduler = scheduler.LaunchScheduler({})
+
+    launch_scheduler.add("kitty")
+    launch_scheduler.add(None)
+    launch_scheduler.wait_for_slot(None)
+
+    # The kitty window finishes the kitty launch, and the next window finishes the other launch
+    assert mock_connection.receive_event.call_count == 2
+    assert launch_scheduler.in_flight == []
+    assert list(launch_scheduler.startup_times) == ["kitty"]
+
+
+def test_wait_for_all_expires_launches_without_windows(
+    mock_connection: mock.Mock, mock_time: mock.Mock
+) -> None:
+    mock_connection.receive_event.return_value = None
+    launch_scheduler = scheduler.LaunchScheduler({})
+    launch_scheduler.add("kitty")
+
+    mock_time.return_value = scheduler.constants.LAUNCH_TIMEOUT
+    launch_scheduler.wait_for_all()
+
+    mock_connection.receive_event.assert_called_once_with(0)
+    assert launch_scheduler.in_flight == []
+    assert [launch[0] for launch in launch_scheduler.expired] == ["kitty"]
+
+
+@pytest.mark.usefixtures("mock_time")
+def test_wait_for_window_records_the_window_of_each_launch(mock_connection: mock.Mock) -> None:
+    mock_connection.receive_event.side_effect = [
+        window_event("kitty", window=201),
+        window_event("firefox", window=202),
+        window_event("kitty", window=203),
+    ]
+    launch_scheduler = scheduler.LaunchScheduler({"kitty": 2})
+    launch_scheduler.add("kitty", ("1", 0))
+    launch_scheduler.add("firefox")
+    launch_scheduler.add("kitty", ("1", 2))
+
+    launch_scheduler.wait_for_all()
+
+    # Windows finish the oldest launch of their class
+    assert launch_scheduler.windows == {("1", 0): 201, ("1", 2): 203}
+
+
+def test_wait_for_late_windows_waits_for_launches_that_timed_out(
+    mock_connection: mock.Mock, mock_time: mock.Mock
+) -> None:
+    launch_scheduler = scheduler.LaunchScheduler({})
+    launch_scheduler.wait_for_late_windows()
+    mock_connection.receive_event.assert_not_called()
+
+    mock_connection.receive_event.return_value = None
+    launch_scheduler.add("kitty", ("1", 0))
+    mock_time.return_value = scheduler.constants.LAUNCH_TIMEOUT
+    launch_scheduler.wait_for_all()
+
+    mock_connection.receive_event.reset_mock(return_value=True)
+    mock_connection.receive_event.side_effect = [window_event("kitty", window=201)]
+    launch_scheduler.wait_for_late_windows()
+
+    mock_connection.receive_event.assert_called_once_with(scheduler.constants.LATE_WINDOW_TIMEOUT)
+    assert launch_scheduler.windows == {("1", 0): 201}
+    assert launch_scheduler.expired == []
+
+
+def test_wait_for_window_learns_how_long_each_class_takes_to_start(
+    mock_connection: mock.Mock, mock_time: mock.Mock
+) -> None:
+    mock_connection.receive_event.side_effect = [
+        window_event("kitty"),
+        (scheduler.ipc.WINDOW_EVENT, {"change": "new", "container": {}}),
+        window_event("kitty"),
+    ]
+    launch_scheduler = scheduler.LaunchScheduler({})
+    launch_scheduler.add("kitty")
+    launch_scheduler.add(None)
+
+    mock_time.return_value = 1
+    launch_scheduler.wait_for_all()
+    # Windows without a class aren't learned
+    assert launch_scheduler.startup_times == {"kitty": 1}
+
+    # New measurements are averaged with the learned time
+    launch_scheduler.add("kitty")
+    mock_time.return_value = 3
+    launch_scheduler.wait_for_all()
+    assert launch_scheduler.startup_times == {"kitty": 1 + scheduler.constants.STARTUP_TIME_WEIGHT}
+
+
+@pytest.mark.usefixtures("mock_time")
+def test_wait_for_window_waits_until_the_next_launch_times_out(
+    mock_connection: mock.Mock,
+) -> None:
+    mock_connection.receive_event.return_value = None
+    launch_scheduler = scheduler.LaunchScheduler({})
+    launch_scheduler._wait_for_window()
+    mock_connection.receive_event.assert_called_once_with(0)
+
+    launch_scheduler.startup_times = {"idea": 4}
+    launch_scheduler.add("idea")
+    launch_scheduler.add("kitty")
+    launch_scheduler._wait_for_window()
+    # The kitty launch times out first as its startup time isn't known yet
+    mock_connection.receive_event.assert_called_with(scheduler.constants.LAUNCH_TIMEOUT)
+
+
+@pytest.mark.usefixtures("mock_connection")
+@pytest.mark.parametrize(
+    ("startup_time", "timeout"),
+    [(None, 5), (0.05, 2), (2, 6), (20, 30)],
+)
+def test_get_launch_timeout_depends_on_the_startup_time(
+    startup_time: float | None, timeout: float
+) -> None:
+    launch_scheduler = scheduler.LaunchScheduler({})
+    if startup_time is not None:
+        launch_scheduler.startup_times = {"kitty": startup_time}
+
+    assert launch_scheduler.get_launch_timeout("kitty") == timeout
+
+
+@pytest.mark.usefixtures("mock_connection")
+def test_get_launch_order_launches_slow_programs_first() -> None:
+    launch_scheduler = scheduler.LaunchScheduler({})
+    launch_scheduler.startup_times = {"kitty": 0.1, "idea": 4}
+
+    order = launch_scheduler.get_launch_order(["kitty", "firefox", "idea", "kitty", None])
+
+    # Containers of the same class keep their order
+    assert order == [2, 0, 3, 1, 4]
+
+
+@pytest.mark.usefixtures("mock_connection")
+def test_startup_times_are_kept_across_restores(i3_path: pathlib.Path) -> None:
+    launch_scheduler = scheduler.LaunchScheduler({})
+    assert launch_scheduler.startup_times == {}
+    launch_scheduler.startup_times = {"kitty": 0.1}
+    launch_scheduler.save_startup_times()
+
+    assert scheduler.LaunchScheduler({}).startup_times == {"kitty": 0.1}
+    assert [file.name for file in i3_path.iterdir()] == [
+        scheduler.constants.STARTUP_TIMES_FILE_NAME
+    ]
+
+    (i3_path / scheduler.constants.STARTUP_TIMES_FILE_NAME).write_text("{")
+    assert scheduler.load_startup_times() == {}
@@ -0,0 +1,109 @@
+import json
+
+from programs import tree
+
+I3_TREE = {
+    "id": 1,
+    "type": "root",
+    "rect": {"x": 0, "y": 0, "width": 1920, "height": 1080},
+    "gaps": {"inner": 0, "outer": 0},
+    "nodes": [
+        {
+            "id": 2,
+            "type": "workspace",
+            "name": "1",
+            "nodes": [
+                {"id": 3, "window": 101, "nodes": []},
+                {
+                    "id": 4,
+                    "nodes": [{"id": 5, "window": 102, "nodes": []}],
+                    "floating_nodes": [],
+                },
+            ],
+            "floating_nodes": [
+                {
+                    "id": 6,
+                    "type": "floating_con",
+                    "rect": {"x": 5, "y": 5, "width": 10, "height": 10},
+                    "nodes": [{"id": 7, "window": 103, "nodes": []}],
+                }
+            ],
+        }
+    ],
+}
+
+
+def test_parse_tree_creates_a_node_for_each_container() -> None:
+    root = tree.parse_tree(json.dumps(I3_TREE))
+
+    assert isinstance(root, tree.Node)
+    workspace = root.nodes[0]
+    assert workspace.name == "1"
+    assert [node.id for node in workspace.nodes] == [3, 4]
+    assert workspace.floating_nodes[0].nodes[0].window == 103
+
+
+def test_parse_tree_only_keeps_used_properties() -> None:
+    root = tree.parse_tree(json.dumps(I3_TREE))
+    assert not hasattr(root, "gaps")
+    assert not hasattr(root, "__dict__")
+
+    # Only the position of floating containers is kept
+    assert root.rect is None
+    assert root.nodes[0].floating_nodes[0].rect == {"x": 5, "y": 5, "width": 10, "height": 10}
+
+
+def test_node_keeps_only_window_properties_used_for_swallowing() -> None:
+    node = tree.Node({"window_properties": {"class": "kitty", "transient_for": None}})
+    assert node.window_properties == {"class": "kitty"}
+
+    assert tree.Node({"window_properties": None}).window_properties == {}
+
+
+def test_to_node_keeps_objects_that_are_not_containers() -> None:
+    assert tree.to_node({"x": 0}) == {"x": 0}
+
+
+def test_node_repr_does_not_include_children() -> None:
+    node = tree.Node({"type": "workspace", "name": "1", "nodes": [tree.Node({"name": "child"})]})
+    assert repr(node) == (
+        "Node(type='workspace', name='1', window=None, nodes=1, floating_nodes=0)"
+    )
+
+
+def test_iter_nodes_iterates_in_tree_order() -> None:
+    root = tree.parse_tree(json.dumps(I3_TREE))
+    assert [node.id for node in tree.iter_nodes(root)] == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_iter_leaves_iterates_over_tiling_leaves() -> None:
+    root = tree.parse_tree(json.dumps(I3_TREE))
+    assert [node.id for node in tree.iter_leaves(root.nodes[0])] == [3, 5]
+
+
+def test_iter_leaves_handles_deeply_nested_trees() -> None:
+    # Deeper than the recursion limit
+    node = tree.Node({"id": 0, "nodes": []})
+    for i in range(1, 5000):
+        node = tree.Node({"id": i, "nodes": [node]})
+
+    assert [leaf.id for leaf in tree.iter_leaves(node)] == [0]
+    assert len(list(tree.iter_nodes(node))) == 5000
+
+
+def test_merkle_hash_changes_when_any_node_changes() -> None:
+    def get_content(node: tree.Node) -> bytes:
+        return str(node.window).encode()
+
+    root_hash = tree.merkle_hash(tree.parse_tree(json.dumps(I3_TREE)), get_content)
+    assert tree.merkle_hash(tree.parse_tree(json.dumps(I3_TREE)), get_content) == root_hash
+
+    changed_root = tree.parse_tree(json.dumps(I3_TREE))
+    changed_root.nodes[0].nodes[1].nodes[0].window = 104
+    assert tree.merkle_hash(changed_root, get_content) != root_hash
+
+    # Moving a container from the tiling to the floating nodes changes the hash too
+    moved_root = tree.parse_tree(json.dumps(I3_TREE))
+    workspace = moved_root.nodes[0]
+    workspace.floating_nodes.insert(0, workspace.nodes.pop())
+    assert tree.merkle_hash(moved_root, get_content) != root_hash
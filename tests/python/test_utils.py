@@ -1,6 +1,9 @@
 import logging
 import os
+import pathlib
+from unittest import mock
 
+import psutil
 import pytest
 from pytest_mock import MockerFixture
 
@@ -9,24 +12,81 @@ from programs import utils
 
 def test_get_workspaces_parses_tree_correctly(mocker: MockerFixture) -> None:
     tree = b"""{
+    "type": "root",
+    "focus": [2, 1],
     "nodes": [
-        {},
-        {"nodes": [{"type": "con", "nodes": ["ws1"]}, {"type": ""}]},
-        {"nodes": [{"type": "con", "nodes": ["ws2", "ws3"]}]}
+        {"type": "output", "name": "__i3", "nodes": []},
+        {
+            "id": 1,
+            "type": "output",
+            "name": "out1",
+            "current_workspace": "ws1",
+            "nodes": [
+                {"type": "con", "nodes": [{"type": "workspace", "name": "ws1", "nodes": []}]},
+                {"type": "dockarea", "nodes": []}
+            ]
+        },
+        {
+            "id": 2,
+            "type": "output",
+            "name": "out2",
+            "current_workspace": "ws3",
+            "nodes": [
+                {
+                    "type": "con",
+                    "nodes": [
+                        {"type": "workspace", "name": "ws2", "nodes": []},
+                        {"type": "workspace", "name": "ws3", "nodes": []}
+                    ]
+                }
+            ]
+        }
     ]
 }"""
     mocker.patch("subprocess.check_output", return_value=tree)
 
     workspaces = utils.get_workspaces()
-    assert workspaces == ["ws1", "ws2", "ws3"]
+    assert [(ws.name, ws.output) for ws in workspaces] == [
+        ("ws1", "out1"),
+        ("ws2", "out2"),
+        ("ws3", "out2"),
+    ]
+    assert [ws.visible for ws in workspaces] == [True, False, True]
+    assert [ws.focused_workspace for ws in workspaces] == [False, False, True]
 
 
 def test_get_tree_retrieves_the_current_i3_tree(mocker: MockerFixture) -> None:
-    expected_tree = b'{"tree": "i3"}'
-    mocker.patch("subprocess.check_output", return_value=expected_tree)
+    mocker.patch("subprocess.check_output", return_value=b'{"type": "root", "nodes": []}')
 
     tree = utils.get_tree()
-    assert tree == {"tree": "i3"}
+    assert tree.type == "root"
+
+
+def test_write_script_writes_an_executable_script(tmp_path: pathlib.Path) -> None:
+    script = tmp_path / "script.sh"
+    utils.write_script(script, "echo test\n")
+
+    assert script.read_text() == "#!/usr/bin/env bash\necho test\n"
+    assert os.access(script, os.X_OK)
+
+
+def test_get_version_reads_the_version_file(mocker: MockerFixture) -> None:
+    mocker.patch("builtins.open", mocker.mock_open(read_data="1.2.3\n"))
+    assert utils.get_version() == "i3-restore v1.2.3"
+
+
+@pytest.mark.parametrize(("show_log_buttons", "num_args"), [(False, 5), (True, 11)])
+def test_display_error_displays_error_in_nagbar(
+    mocker: MockerFixture, show_log_buttons: bool, num_args: int
+) -> None:
+    mock_popen = mocker.patch("subprocess.Popen")
+
+    utils.display_error("test error", show_log_buttons)
+
+    args = mock_popen.call_args[0][0]
+    assert args[0] == "i3-nagbar"
+    assert "i3-restore: test error" in args
+    assert len(args) == num_args
 
 
 @pytest.mark.parametrize(
@@ -41,6 +101,285 @@ def test_get_logger_initializes_the_logger_correctly(
     )
     logger = utils.get_logger()
 
-    assert len(logger.handlers) == 2
-    assert logger.handlers[0].baseFilename == "/dev/null"
-    assert logger.handlers[1].level == log_level
+    # Records are only queued by the logger. The listener writes them to the actual handlers
+    assert len(logger.handlers) == 1
+    assert logger.handlers[0].level == min(logging.INFO, log_level)
+
+    file_handler, stream_handler = utils._log_listener.handlers
+    assert file_handler.baseFilename == "/dev/null"
+    assert stream_handler.level == log_level
+
+
+def test_get_logger_rotates_the_log_into_the_old_log(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    log_file = tmp_path / "i3-restore.log"
+    old_log_file = tmp_path / "i3-restore-old.log"
+    mocker.patch.dict(
+        os.environ,
+        {"I3_RESTORE_LOG_FILE": str(log_file), "I3_RESTORE_LOG_FILE_OLD": str(old_log_file)},
+    )
+    mocker.patch.object(utils.constants, "LOG_FILE_MAX_BYTES", 10)
+
+    logger = utils.get_logger()
+    logger.info("first message")
+    logger.info("second message")
+    utils.stop_log_listener()
+
+    assert "first message" in old_log_file.read_text()
+    assert "second message" in log_file.read_text()
+
+
+def test_shared_rotating_file_handler_reopens_logs_rotated_by_other_processes(
+    tmp_path: pathlib.Path,
+) -> None:
+    log_file = tmp_path / "i3-restore.log"
+    old_log_file = tmp_path / "i3-restore-old.log"
+    handlers = []
+    for _ in range(2):
+        handler = utils._SharedRotatingFileHandler(log_file, maxBytes=30, backupCount=1)
+        handler.namer = lambda _: str(old_log_file)
+        handlers.append(handler)
+
+    def log(handler: logging.Handler, message: str) -> None:
+        handler.handle(logging.LogRecord("test", logging.INFO, "", 0, message, None, None))
+
+    log(handlers[0], "first message")
+    log(handlers[1], "second message")
+    # Rotates the log with both messages
+    log(handlers[0], "third message")
+    # The log was already rotated, so it is only reopened
+    log(handlers[1], "fourth message")
+    for handler in handlers:
+        handler.close()
+
+    assert old_log_file.read_text() == "first message\nsecond message\n"
+    assert log_file.read_text() == "third message\nfourth message\n"
+
+
+def test_shared_rotating_file_handler_does_not_rotate_logs_rotated_since_checking(
+    tmp_path: pathlib.Path,
+) -> None:
+    log_file = tmp_path / "i3-restore.log"
+    log_file.write_text("first message\n")
+    old_log_file = tmp_path / "i3-restore-old.log"
+    handlers = []
+    for _ in range(2):
+        handler = utils._SharedRotatingFileHandler(log_file, maxBytes=30, backupCount=1)
+        handler.namer = lambda _: str(old_log_file)
+        handlers.append(handler)
+
+    # Both processes decided to rotate the log at the same time
+    handlers[0].doRollover()
+    handlers[1].doRollover()
+    for handler in handlers:
+        handler.close()
+
+    assert old_log_file.read_text() == "first message\n"
+
+
+def test_shared_rotating_file_handler_opens_delayed_logs(tmp_path: pathlib.Path) -> None:
+    log_file = tmp_path / "i3-restore.log"
+    handler = utils._SharedRotatingFileHandler(log_file, maxBytes=100, delay=True)
+    handler.handle(logging.LogRecord("test", logging.INFO, "", 0, "message", None, None))
+    handler.close()
+
+    assert log_file.read_text() == "message\n"
+
+
+def test_shared_rotating_file_handler_reopens_removed_logs(tmp_path: pathlib.Path) -> None:
+    log_file = tmp_path / "i3-restore.log"
+    handler = utils._SharedRotatingFileHandler(log_file, maxBytes=100, backupCount=1)
+    handler.handle(logging.LogRecord("test", logging.INFO, "", 0, "first message", None, None))
+    log_file.unlink()
+
+    handler.handle(logging.LogRecord("test", logging.INFO, "", 0, "second message", None, None))
+    handler.close()
+
+    assert log_file.read_text() == "second message\n"
+
+
+def test_get_logger_replaces_the_previous_listener(mocker: MockerFixture) -> None:
+    mocker.patch.dict(os.environ, {"I3_RESTORE_LOG_FILE": "/dev/null"})
+
+    utils.get_logger()
+    old_listener = utils._log_listener
+    utils.get_logger()
+
+    assert utils._log_listener is not old_listener
+    assert old_listener._thread is None, "The previous listener should be stopped"
+
+
+def test_forked_processes_log_through_the_forked_log_listener(
+    mocker: MockerFixture, tmp_path: pathlib.Path
+) -> None:
+    log_file = tmp_path / "i3-restore.log"
+    mocker.patch.dict(os.environ, {"I3_RESTORE_LOG_FILE": str(log_file)})
+    logger = utils.get_logger()
+    listener = utils._log_listener
+
+    log_queue = utils.start_forked_log_listener()
+    # This is what a forked process does. Its records are written by the forked log listener.
+    utils.log_to_queue(log_queue)
+    logger.info("forked message")
+    assert utils._log_listener is None
+    assert logger.handlers[0].level == logging.INFO
+
+    utils.stop_forked_log_listener()
+    utils._log_listener = listener
+    utils.stop_log_listener()
+
+    assert "forked message" in log_file.read_text()
+
+
+def test_stop_log_listener_does_nothing_without_a_listener(mocker: MockerFixture) -> None:
+    mocker.patch.object(utils, "_log_listener", None)
+    utils.stop_log_listener()
+    assert utils._log_listener is None
+
+
+def test_log_payload_does_not_truncate_small_payloads() -> None:
+    assert str(utils.LogPayload("small payload")) == "small payload"
+    assert str(utils.LogPayload({"key": [1, 2]})) == "{'key': [1, 2]}"
+
+
+def test_log_payload_truncates_large_payloads(mocker: MockerFixture) -> None:
+    mocker.patch.object(utils.constants, "LOG_PAYLOAD_MAX_CHARS", 5)
+    assert str(utils.LogPayload("a" * 10)) == "aaaaa... (5 more characters)"
+
+
+def test_log_payload_limits_nested_payloads() -> None:
+    tree = {"nodes": [{"nodes": list(range(1000))}]}
+    assert len(str(utils.LogPayload(tree))) < len(str(tree))
+
+
+def test_get_timeout_returns_none_without_a_deadline() -> None:
+    with utils.deadline(None):
+        assert utils.get_timeout() is None
+
+
+def test_deadline_uses_the_earliest_deadline(mocker: MockerFixture) -> None:
+    mocker.patch("time.monotonic", return_value=100)
+
+    with utils.deadline(5):
+        assert utils.get_timeout() == 5
+        with utils.deadline(10):
+            assert utils.get_timeout() == 5
+        with utils.deadline(2):
+            assert utils.get_timeout() == 2
+
+    assert utils.get_timeout() is None
+
+
+def test_get_timeout_does_not_return_negative_timeouts(mocker: MockerFixture) -> None:
+    mock_time = mocker.patch("time.monotonic", return_value=100)
+
+    with utils.deadline(5):
+        mock_time.return_value = 110
+        assert utils.get_timeout() == 0
+
+
+def test_get_essential_timeout_gives_essential_commands_a_minimum_timeout(
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch("time.monotonic", return_value=100)
+    assert utils.get_essential_timeout() is None
+
+    with utils.deadline(0.5):
+        assert utils.get_essential_timeout() == utils.constants.ESSENTIAL_COMMAND_TIMEOUT
+    with utils.deadline(10):
+        assert utils.get_essential_timeout() == 10
+
+
+def test_budget_does_nothing_without_a_budget() -> None:
+    with utils.budget(None):
+        assert utils.get_timeout() is None
+        assert not utils.should_skip("scrollback")
+
+
+def test_budget_skips_work_in_order_as_the_budget_runs_out(mocker: MockerFixture) -> None:
+    mock_logger = mocker.patch.object(utils, "_logger")
+    mock_time = mocker.patch("time.monotonic", return_value=100)
+
+    with utils.budget(10):
+        assert utils.get_timeout() == 10
+        assert not utils.should_skip("scrollback")
+
+        # 4 seconds are left
+        mock_time.return_value = 106
+        assert utils.should_skip("scrollback")
+        assert utils.should_skip("scrollback")
+        assert not utils.should_skip("plugin sessions")
+
+        # 1 second is left
+        mock_time.return_value = 109
+        assert utils.should_skip("plugin sessions")
+        assert utils.should_skip("subprocess detection")
+
+        assert utils.has_skipped_work()
+
+    # Each skipped kind of work is logged once, followed by a summary
+    assert mock_logger.warning.call_count == 4
+    assert mock_logger.warning.call_args[0][2] == (
+        "scrollback, plugin sessions, subprocess detection"
+    )
+    assert utils.get_timeout() is None
+    assert not utils.should_skip("subprocess detection")
+
+
+def test_budget_does_not_log_a_summary_when_nothing_was_skipped(mocker: MockerFixture) -> None:
+    mock_logger = mocker.patch.object(utils, "_logger")
+
+    with utils.budget(10):
+        assert not utils.has_skipped_work()
+
+    mock_logger.warning.assert_not_called()
+
+
+def mock_process(mocker: MockerFixture, pid: int, ppid: int, create_time: float = 0) -> mock.Mock:
+    process = mocker.Mock(pid=pid, info={"ppid": ppid, "name": f"process{pid}"})
+    process.create_time.return_value = create_time
+    return process
+
+
+def test_get_children_uses_psutil_without_a_snapshot(mocker: MockerFixture) -> None:
+    mocker.patch.dict(utils._process_children, clear=True)
+    process = mocker.Mock()
+
+    assert utils.get_children(process, recursive=True) == process.children.return_value
+    process.children.assert_called_once_with(recursive=True)
+
+
+def test_get_children_looks_up_children_in_the_snapshot(mocker: MockerFixture) -> None:
+    parent = mock_process(mocker, 10, 1, create_time=5)
+    child1 = mock_process(mocker, 11, 10, create_time=6)
+    child2 = mock_process(mocker, 12, 10, create_time=6)
+    grandchild = mock_process(mocker, 13, 11, create_time=7)
+    # Reused the PID of the parent's exited child
+    old_child = mock_process(mocker, 14, 10, create_time=1)
+    exited_child = mock_process(mocker, 15, 10)
+    exited_child.create_time.side_effect = psutil.NoSuchProcess(15)
+    processes = [parent, child1, child2, grandchild, old_child, exited_child]
+    mocker.patch.dict(utils._process_children, clear=True)
+    mocker.patch.object(utils.psutil, "process_iter", return_value=processes)
+
+    assert utils.snapshot_processes() == processes
+
+    # Same order as psutil.Process.children
+    assert utils.get_children(parent) == [child1, child2]
+    assert utils.get_children(parent, recursive=True) == [child1, child2, grandchild]
+    parent.children.assert_not_called()
+
+
+def test_get_children_uses_psutil_for_processes_missing_from_the_snapshot(
+    mocker: MockerFixture,
+) -> None:
+    parent = mock_process(mocker, 10, 1)
+    mocker.patch.dict(utils._process_children, clear=True)
+    mocker.patch.object(utils.psutil, "process_iter", return_value=[parent])
+    utils.snapshot_processes()
+
+    # Started after the snapshot was taken
+    process = mock_process(mocker, 20, 1)
+    assert utils.get_children(process) == process.children.return_value
+    assert utils.get_children(parent) == []
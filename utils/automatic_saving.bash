@@ -1,10 +1,10 @@
 # Automatically save i3 layouts + programs on an interval
 # Functions can only be called after common.sh is sourced.
 
-I3_RESTORE_SAVE_FILE="$(dirname "$0")/i3-save"
+I3_RESTORE_AUTO_SAVE_SCRIPT="$(dirname "$0")/programs/auto_save.py"
 DEFAULT_INTERVAL_TIME=10
 
-readonly I3_RESTORE_SAVE_FILE DEFAULT_INTERVAL_TIME
+readonly I3_RESTORE_AUTO_SAVE_SCRIPT DEFAULT_INTERVAL_TIME
 
 #####################################
 # Get the sleep time (in seconds) from the
@@ -35,45 +35,22 @@ get_sleep_time() {
     echo "$sleep_time"
 }
 
-#####################################
-# Ensure the same i3 process that
-# automatic saving was started with
-# is still running. Otherwise, i3-msg
-# will fail to connect even when a new
-# i3 process is started.
-#
-# If the original i3 process is not alive,
-# the script will exit.
-# Arguments:
-#   Original i3 PID
-#####################################
-check_i3_alive() {
-    if ! ps --pid "$1" | grep --quiet "i3"; then
-        local message="Original i3 process is not alive anymore. "
-        message+="Exiting automatic scheduling"
-        log "$message"
-        exit 0
-    fi
-}
-
 #####################################
 # Save the current i3wm session automatically
-# on an interval.
+# on an interval until i3 exits. The interval
+# adapts to how much the session changes, and
+# saves run at idle priority and are deferred
+# while the system is busy (see
+# programs/auto_save.py).
 # Globals:
-#   I3_RESTORE_SAVE_FILE
+#   I3_RESTORE_AUTO_SAVE_SCRIPT
 #   I3_RESTORE_INTERVAL_MINUTES
+#   I3_RESTORE_VERBOSE
 #####################################
 start_save_interval() {
-    local sleep_time i3_pid
-
+    local sleep_time
     sleep_time="$(get_sleep_time "$I3_RESTORE_INTERVAL_MINUTES")"
-    i3_pid="$(pidof i3)"
 
-    log "Starting automatic saving on an interval of $sleep_time seconds"
-    while true; do
-        sleep "$sleep_time"
-        check_i3_alive "$i3_pid"
-        echo "Automatically saving current i3wm session"
-        "$I3_RESTORE_SAVE_FILE"
-    done
+    I3_RESTORE_VERBOSE="$I3_RESTORE_VERBOSE" python3 "$I3_RESTORE_AUTO_SAVE_SCRIPT" --interval "$sleep_time" ||
+        error "An error occurred saving the session automatically. View the logs for more details" 1
 }
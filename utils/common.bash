@@ -1,13 +1,21 @@
-# Contains all functions that are used in both the
-# i3-save and i3-restore scripts.
+# Contains all common variables and functions used by
+# the i3-restore script. i3-save is handled entirely in
+# Python (programs/i3_save.py).
 
 LOG_DIR="$ROOT_DIR/logs"
 I3_RESTORE_LOG_FILE="$LOG_DIR/i3-restore.log"
 I3_RESTORE_LOG_FILE_OLD="$LOG_DIR/i3-restore-old.log"
-LOG_FILE_SIZE=1000
+# The size (in bytes) of the log before it is rotated. Must match LOG_FILE_MAX_BYTES in
+# programs/constants.py
+LOG_FILE_SIZE=262144
 
 I3_RESTORE_VERBOSE=0
 I3_RESTORE_INTERVAL=0
+I3_RESTORE_LAZY=0
+I3_RESTORE_BATCH_LAYOUTS=0
+I3_RESTORE_RESUME=0
+# The workspaces selected with --workspace. When empty, every workspace is used
+I3_RESTORE_WORKSPACES=()
 
 # shellcheck disable=SC2034
 readonly LOG_DIR I3_RESTORE_LOG_FILE I3_RESTORE_LOG_FILE_OLD LOG_FILE_SIZE
@@ -30,30 +38,21 @@ version() {
 # Display the script's usage
 #####################################
 usage() {
-    local cmd="$1" spaces
     version
     echo
     echo "Usage:"
-    if [[ "$(basename "$cmd")" == "i3-save" ]]; then
-        spaces=""
-        echo "    i3-save [options]   Save your current i3 session"
-    else
-        # More spaces should be added for the restore usage screen to line up all of the
-        # descriptions for the flags
-        spaces="        "
-        echo "    i3-restore [options]        Restore your last saved i3 session"
-    fi
+    echo "    i3-restore [options]        Restore your last saved i3 session"
     echo
     echo "Options:"
-
-    if [[ "$(basename "$cmd")" == "i3-restore" ]]; then
-        echo "    --save-interval <minutes>   Automatically save your session on an interval (default is 10 minutes)"
-    fi
-
-    echo "    -v, -vv            $spaces Increase the verbosity of the script. One v prints debug messages and"
-    echo "                       $spaces two v's print all commands executed too"
-    echo "    -h, --help         $spaces Display this help and exit"
-    echo "    -V, --version      $spaces Display version information and exit"
+    echo "    --save-interval <minutes>   Automatically save your session on an interval (default is 10 minutes)"
+    echo "    --workspace <name>          Only restore the given workspace. Can be passed multiple times"
+    echo "    --lazy                      Only restore the programs of each workspace when it is first focused"
+    echo "    --batch-layouts             Launch every workspace's programs first, then restore all layouts at once"
+    echo "    --resume                    Continue the last restore from where it stopped instead of starting over"
+    echo "    -v, -vv                     Increase the verbosity of the script. One v prints debug messages and"
+    echo "                                two v's print all commands executed too"
+    echo "    -h, --help                  Display this help and exit"
+    echo "    -V, --version               Display version information and exit"
     echo
     echo "For more information, check out https://github.com/jdholtz/i3-restore#readme"
 }
@@ -68,8 +67,7 @@ parse_flags() {
     while [[ $# != 0 ]]; do
         case "$1" in
         --help | -h)
-            local cmd="${0##*/}"
-            usage "$cmd"
+            usage
             exit
             ;;
         --version | -V)
@@ -96,11 +94,31 @@ parse_flags() {
                 shift
             fi
             ;;
+        --lazy)
+            # shellcheck disable=SC2034
+            I3_RESTORE_LAZY=1
+            ;;
+        --batch-layouts)
+            # shellcheck disable=SC2034
+            I3_RESTORE_BATCH_LAYOUTS=1
+            ;;
+        --resume)
+            # shellcheck disable=SC2034
+            I3_RESTORE_RESUME=1
+            ;;
+        --workspace)
+            if [[ $# -lt 2 ]]; then
+                echo "Error: --workspace requires a workspace name"
+                exit 2
+            fi
+
+            I3_RESTORE_WORKSPACES+=("$2")
+            shift
+            ;;
         -*)
             echo "Error: Unrecognized flag: $1"
             echo
-            local cmd="${0##*/}"
-            usage "$cmd"
+            usage
             exit 2
             ;;
         esac
@@ -121,10 +139,4 @@ check_dependencies() {
             exit 1
         fi
     done
-
-    # Check for perl-anyevent-i3 by seeing if i3-save-tree fails
-    if [[ "$(i3-save-tree 2>&1)" == "Can't locate AnyEvent/I3.pm"* ]]; then
-        error "perl-anyevent-i3 is required for i3-restore!"
-        exit 1
-    fi
 }
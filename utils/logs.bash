@@ -21,6 +21,8 @@ init_log() {
 # (remove the old log file). Saving old
 # logs makes it easier to debug sessions
 # without the potential of them being erased.
+# The log is rotated by size (in bytes), the
+# same way the Python logger rotates it.
 # Globals:
 #   I3_RESTORE_LOG_FILE
 #   I3_RESTORE_LOG_FILE_OLD
@@ -28,10 +30,10 @@ init_log() {
 #####################################
 rotate_log() {
     local current_log_size
-    current_log_size="$(wc <"$I3_RESTORE_LOG_FILE" --lines)"
+    # Only the file's metadata is read, so this doesn't get slower as the log grows
+    current_log_size="$(stat --format=%s "$I3_RESTORE_LOG_FILE")"
     if [[ $current_log_size -gt $LOG_FILE_SIZE ]]; then
-        cp "$I3_RESTORE_LOG_FILE" "$I3_RESTORE_LOG_FILE_OLD"
-        rm "$I3_RESTORE_LOG_FILE"
+        mv --force "$I3_RESTORE_LOG_FILE" "$I3_RESTORE_LOG_FILE_OLD"
     fi
 }
 
@@ -45,7 +47,8 @@ rotate_log() {
 #####################################
 log() {
     local time
-    time="$(date +"%F %T")"
+    # Use printf's builtin time formatting so no process is forked for every line logged
+    printf -v time "%(%F %T)T" -1
 
     echo -e "$time: $1" >>"$I3_RESTORE_LOG_FILE"
 